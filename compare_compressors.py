@@ -14,11 +14,22 @@ Tests various HTTP header compression algorithms, to compare them.
 
 from collections import defaultdict
 from importlib import import_module
+from itertools import islice
 import locale
+import multiprocessing
 import optparse
+import os
+import re
+import sys
 
-from lib.harfile import read_har_file
+from lib.bench import Benchmark, check_corpus, compare_results, \
+  print_comparison, read_results, write_results
+from lib.ingest import expand_inputs, iter_parsed_files
 from lib.processors import Processors
+from lib.sampling import StreamSampler
+from lib.stream import TotalStream
+from lib.sweep import Sweep, expand_sweep
+from lib.writers import ResultWriter
 
 
 class CompressionTester(object):
@@ -40,40 +51,190 @@ class CompressionTester(object):
     self.tsv_out = defaultdict(list)  # accumulator for TSV output
     self.processors = Processors(self.options, self.msg_types, output)
     self.streamify = self.load_streamifier(self.options.streamifier)
+    self.sampler = None
+    if self.options.sample is not None or \
+       self.options.sample_streams is not None:
+      self.sampler = StreamSampler(self.options.sample,
+                                   self.options.sample_streams)
     self.run()
 
   def run(self):
     "Let's do this thing."
-    sessions = []
-    for filename in self.args:
-      har_requests, har_responses = read_har_file(filename)
-      messages = zip(har_requests, har_responses)
-      sessions.extend(self.streamify(messages))
-    for session in sessions:
-      if self.options.verbose > 0:
-        session.print_header(self.output)
-      self.processors.process_session(session)
-      if self.options.verbose > 0:
-        session.print_summary(self.output, self.options.baseline)
+    files = iter_parsed_files(expand_inputs(self.args),
+                              self.options.cache_dir,
+                              self.options.parse_jobs, self.options.prefetch)
+    if self.options.bench or self.options.bench_compare:
+      self.run_bench(self.read_sessions(files))
+      return
+    if self.options.sweep:
+      self.run_sweep(self.read_sessions(files))
+      return
+    procs = [p.name for p in self.processors.processors['req']]
+    self.totals = dict([(msg_type, TotalStream("TOTAL", msg_type, procs))
+                        for msg_type in self.msg_types])
+    self.writers = self.open_writers(procs)
+    if self.options.jobs > 1:
+      self.processors.process_sessions(self.read_sessions(files),
+                                       self.options.jobs, self.session_done)
+    else:
+      # each file's sessions are processed while the next files are parsed
+      idx = 0
+      for sessions in self.session_batches(files):
+        for file_idx, session in enumerate(sessions):
+          self.processors.process_session(
+            session, idx, islice(sessions, file_idx + 1, None))
+          self.session_done(session)
+          idx += 1
     self.processors.done()
+    for writer in sum(self.writers.values(), []):
+      writer.close()
+    if self.sampler:
+      self.sampler.print_summary(self.output)
     for msg_type in self.msg_types:
-      ttl_stream = sum([s for s in sessions if s.msg_type == msg_type])
-      ttl_stream.name = "TOTAL"
+      ttl_stream = self.totals[msg_type]
       ttl_stream.print_header(self.output)
-      ttl_stream.print_summary(self.output, self.options.baseline)
-    if self.options.tsv:
-      out = {}
+      ttl_stream.print_summary(self.output, self.options.baseline,
+                               self.sampler is not None)
+      ttl_stream.print_timings(self.output)
+      self.processors.print_counters(msg_type, self.output)
+    if self.options.histograms:
+      self.write_histograms("%shistograms.tsv" % self.options.prefix)
+    self.report_profiles()
+
+  def write_histograms(self, filename):
+    "Write the histograms of the totals' results to filename as TSV."
+    fhandle = open(filename, 'w')
+    try:
+      fhandle.write("msg_type\tcodec\tmeasure\tlow\thigh\tcount\n")
       for msg_type in self.msg_types:
-        out[msg_type] = [
-          open("%s%s" % (self.options.prefix, "%s.tsv" % msg_type), 'w'),
-          0
-        ]
-        sessions[0].print_tsv_header(out[msg_type][0].write)
-      for session in sessions:
-        tsvfh, tsv_count = out[session.msg_type]
-        out[session.msg_type][1] = session.print_tsv(tsvfh.write, tsv_count)
-      for fh, count in out.values():
-        fh.close()
+        for row in self.totals[msg_type].histograms():
+          fhandle.write("\t".join([msg_type] + [str(j) for j in row]))
+          fhandle.write("\n")
+    finally:
+      fhandle.close()
+
+  def session_done(self, session):
+    """
+    Report on a session once it has been processed, and add it to the
+    totals; only they keep its results afterwards.
+    """
+    if self.options.verbose > 0:
+      session.print_header(self.output)
+      session.print_summary(self.output, self.options.baseline)
+    for writer in self.writers[session.msg_type]:
+      writer.write(session)
+    self.totals[session.msg_type] += session
+    session.release_results()
+
+  def open_writers(self, procs):
+    "Return a dictionary of msg_type to the ResultWriters for it."
+    formats = []
+    if self.options.tsv:
+      formats.append('tsv')
+    if self.options.ndjson:
+      formats.append('ndjson')
+    writers = {}
+    for msg_type in self.msg_types:
+      writers[msg_type] = [
+        ResultWriter("%s%s.%s" % (self.options.prefix, msg_type, fmt), fmt,
+                     self.options.gzip, msg_type, procs)
+        for fmt in formats]
+    return writers
+
+  def run_bench(self, sessions):
+    """
+    Benchmark the codecs over sessions, instead of comparing them. When
+    comparing to a baseline benchmark, exit with 1 if any codec regressed.
+    """
+    baseline = None
+    bench = Benchmark(self.processors, sessions, self.output)
+    if self.options.bench_compare:
+      try:
+        baseline = read_results(self.options.bench_compare)
+        check_corpus(baseline, bench.num_messages, bench.num_bytes)
+      except EnvironmentError as oops:
+        sys.stderr.write("Can't compare to %s: %s.\n" %
+                         (self.options.bench_compare, oops.strerror))
+        sys.exit(1)
+      except ValueError as oops:
+        sys.stderr.write("Can't compare to %s: %s.\n" %
+                         (self.options.bench_compare, oops))
+        sys.exit(1)
+    if self.sampler:
+      self.sampler.print_summary(self.output)
+    results = bench.run(self.options.bench_reps, self.options.bench_warmup)
+    self.processors.done()
+    bench.print_results(results)
+    filename = "%sbench.json" % self.options.prefix
+    if self.options.bench_compare and os.path.realpath(filename) == \
+       os.path.realpath(self.options.bench_compare):
+      # the baseline is kept, so that later runs are compared to it too
+      self.output("  not writing %s over the baseline\n\n" % filename)
+    else:
+      write_results(results, filename)
+    self.report_profiles()
+    if baseline is not None:
+      rows = compare_results(baseline, results,
+                             self.options.bench_threshold / 100.0)
+      if print_comparison(rows, self.output):
+        sys.exit(1)
+
+  def report_profiles(self):
+    "Print and save the codec profiles, if --profile was given."
+    profiler = self.processors.profiler
+    if profiler is None:
+      return
+    profiler.print_stats(self.output, self.options.profile_top)
+    for filename in profiler.dump(self.options.prefix):
+      self.output("  wrote %s\n" % filename)
+    self.output("\n")
+
+  def run_sweep(self, sessions):
+    """
+    Run each configuration given by --sweep (and each codec given by -c)
+    over sessions, instead of comparing them all at once.
+    """
+    self.processors.done()
+    configs = []
+    for spec in self.options.sweep:
+      configs.extend(expand_sweep(spec))
+    configs.extend([name for name in self.options.processor_names
+                    if name != self.options.baseline])
+    if self.sampler:
+      self.sampler.print_summary(self.output)
+    sweep = Sweep(self.options, self.msg_types, sessions, self.output)
+    rows = sweep.run(configs, self.options.jobs)
+    sweep.print_results(rows)
+    sweep.write_csv(rows, "%ssweep.csv" % self.options.prefix)
+
+  def session_batches(self, files):
+    """
+    Yield lists of the sessions in files, from iter_parsed_files(), sampled
+    if --sample or --sample-streams was given; one per file, unless the
+    sample has to be taken from all of them at once.
+    """
+    batch = []
+    for filename, messages in files:
+      batch.extend(self.streamify(messages))
+      del messages
+      if not (self.sampler and self.sampler.needs_all):
+        yield self.sample(batch)
+        batch = []
+    if batch:
+      yield self.sample(batch)
+
+  def sample(self, sessions):
+    "Return the sessions that are sampled, or all of them if not sampling."
+    if self.sampler:
+      return self.sampler.select(sessions)
+    return sessions
+
+  def read_sessions(self, files):
+    "Return a list of all of the sessions in session_batches(files)."
+    sessions = []
+    for batch in self.session_batches(files):
+      sessions.extend(batch)
+    return sessions
 
   def load_streamifier(self, name):
     "Load the streamifier specified in the options."
@@ -113,16 +274,171 @@ class CompressionTester(object):
                   dest="tsv",
                   help="output TSV.",
                   default=False)
+    optp.add_option('--ndjson',
+                  action="store_true",
+                  dest="ndjson",
+                  help="output newline-delimited JSON.",
+                  default=False)
+    optp.add_option('--gzip',
+                  action="store_true",
+                  dest="gzip",
+                  help="gzip TSV and JSON output.",
+                  default=False)
     optp.add_option('-s', '--streamifier',
                   dest="streamifier",
                   help="streamifier module to use (default: %default).",
                   default="public_suffix")
+    optp.add_option('-j', '--jobs',
+                  type='int',
+                  dest="jobs",
+                  help="number of worker processes to compress sessions "
+                  "with (default: %default).",
+                  default=1,
+                  metavar='N')
+    optp.add_option('--verify',
+                  dest="verify",
+                  help="which messages to check decompress correctly: "
+                  "'all', every Nth session with 'sample:N', 'all' in a "
+                  "separate process with 'async', or 'off' "
+                  "(default: %default).",
+                  default='all',
+                  metavar='MODE')
+    optp.add_option('--sweep',
+                  action='append',
+                  dest="sweep",
+                  help="run a codec once for each combination of parameter "
+                  "values, e.g. 'http2:buffer_size=1024..65536*2', and "
+                  "report on each, writing sweep.csv. Values can also be "
+                  "'a..b', 'a..b+step' or 'a|b|c'. Configurations are run "
+                  "in parallel with -j.",
+                  default=[],
+                  metavar='SPEC')
+    optp.add_option('--sample',
+                  type='float',
+                  dest="sample",
+                  help="only compress this fraction of the streams, "
+                  "chosen evenly by direction and size, and show "
+                  "confidence intervals for the ratios.",
+                  default=None,
+                  metavar='FRACTION')
+    optp.add_option('--sample-streams',
+                  type='int',
+                  dest="sample_streams",
+                  help="like --sample, but choose N streams in all.",
+                  default=None,
+                  metavar='N')
+    optp.add_option('--cache',
+                  action="store",
+                  dest="cache_dir",
+                  help="directory to cache parsed HAR files in, so that "
+                  "later runs over them are faster.",
+                  default=None,
+                  metavar='DIR')
+    optp.add_option('--histograms',
+                  action="store_true",
+                  dest="histograms",
+                  help="write histograms of each codec's per-message ratios "
+                  "and compress times to histograms.tsv.",
+                  default=False)
+    optp.add_option('--parse-jobs',
+                  type='int',
+                  dest="parse_jobs",
+                  help="number of worker processes to parse input files "
+                  "with (default: one per CPU).",
+                  default=multiprocessing.cpu_count(),
+                  metavar='N')
+    optp.add_option('--prefetch',
+                  type='int',
+                  dest="prefetch",
+                  help="most input files to parse ahead of those being "
+                  "compressed (default: %default).",
+                  default=4,
+                  metavar='N')
+    optp.add_option('--bench',
+                  action="store_true",
+                  dest="bench",
+                  help="benchmark codec throughput instead of comparing "
+                  "sizes, writing the results to bench.json.",
+                  default=False)
+    optp.add_option('--bench-reps',
+                  type='int',
+                  dest="bench_reps",
+                  help="timed passes over the input per codec when "
+                  "benchmarking (default: %default).",
+                  default=5,
+                  metavar='N')
+    optp.add_option('--bench-warmup',
+                  type='int',
+                  dest="bench_warmup",
+                  help="untimed passes over the input per codec before "
+                  "benchmarking (default: %default).",
+                  default=1,
+                  metavar='N')
+    optp.add_option('--bench-compare',
+                  action="store",
+                  dest="bench_compare",
+                  help="benchmark, and exit with an error if any codec is "
+                  "slower than in the given bench.json file.",
+                  default=None,
+                  metavar='FILE')
+    optp.add_option('--bench-threshold',
+                  type='float',
+                  dest="bench_threshold",
+                  help="smallest slowdown, in percent, that --bench-compare "
+                  "counts as a regression; noisier results need more "
+                  "(default: %default).",
+                  default=5.0,
+                  metavar='PERCENT')
+    optp.add_option('--profile',
+                  dest="profile",
+                  help="profile the compress and decompress methods of "
+                  "the given codecs (or, with no value, all of them), "
+                  "e.g. --profile=delta2,http2; see --profile-top.",
+                  default=None,
+                  metavar='CODECS')
+    optp.add_option('--profile-top',
+                  type='int',
+                  dest="profile_top",
+                  help="functions to show for each profile, by cumulative "
+                  "time (default: %default).",
+                  default=15,
+                  metavar='N')
     optp.add_option('--prefix',
                   action="store",
                   dest="prefix",
-                  help="Prefix for TSV file output.",
+                  help="Prefix for TSV, JSON, benchmark, profile, sweep and "
+                  "histogram file output.",
                   default="")
-    return optp.parse_args()
+    # --profile's value is optional, which optparse doesn't support
+    argv = ['--profile=' if arg == '--profile' else arg
+            for arg in sys.argv[1:]]
+    options, args = optp.parse_args(argv)
+    if not re.match(r"^(all|async|off|sample:[1-9][0-9]*)$", options.verify):
+      optp.error("--verify must be all, sample:N, async or off.")
+    if options.verify == 'async' and options.jobs > 1:
+      optp.error("--verify=async can't be used with -j.")
+    if options.sample is not None and not 0 < options.sample <= 1:
+      optp.error("--sample must be more than 0, and at most 1.")
+    if options.sample_streams is not None and options.sample_streams < 1:
+      optp.error("--sample-streams must be at least 1.")
+    if options.sample is not None and options.sample_streams is not None:
+      optp.error("--sample and --sample-streams can't both be used.")
+    if options.profile is not None and options.jobs > 1:
+      optp.error("--profile can't be used with -j.")
+    if options.profile is not None and options.sweep:
+      optp.error("--profile can't be used with --sweep.")
+    if options.bench_reps < 1:
+      optp.error("--bench-reps must be at least 1.")
+    if options.bench_warmup < 0:
+      optp.error("--bench-warmup can't be negative.")
+    if options.sweep and (options.bench or options.bench_compare):
+      optp.error("--sweep can't be used with --bench.")
+    for spec in options.sweep:
+      try:
+        expand_sweep(spec)
+      except ValueError as oops:
+        optp.error("bad --sweep: %s." % oops)
+    return options, args
 
 
 if __name__ == "__main__":
@@ -8,6 +8,8 @@ Base class and common functions for compressor implementations.
 
 class BaseProcessor(object):
   "Base class for compression processors."
+  lookahead = 0 # see prepare_session()
+
   def __init__(self, options, is_request, params):
     self.options = options
     self.is_request = is_request
@@ -42,8 +44,78 @@ class BaseProcessor(object):
     Return value is a header dictionary, as described above.
     """
     raise NotImplementedError
+
+  def context_bytes(self):
+    """
+    Return value is how many bytes of compression context the processor
+    keeps for a connection on the compressing side (as of the last
+    message), or None if it doesn't say.
+    """
+    return None
+
+  def context_entries(self):
+    """
+    Return value is how many entries (e.g., headers) that context holds,
+    or None if it doesn't say, or isn't made of entries.
+    """
+    return None
+
+  def counters(self):
+    """
+    Return value is a dictionary of names to counts of things that the
+    processor keeps count of over the whole run (e.g., cache hits), which
+    are reported at the end of it. The default is empty.
+    """
+    return {}
+
+  def prepare_session(self, messages):
+    """
+    'messages' is a list of the (in_headers, host) tuples that compress()
+    will be called with next, in order. Processors that work better in
+    bulk (e.g., by batching requests to another process) can compress
+    them all here, keeping the results for compress() and decompress() to
+    return.
+
+    Return value is True if the messages were prepared; the time taken is
+    then shared out between them. The default does nothing.
+
+    If 'lookahead' is more than zero, the messages of up to that many
+    later sessions may be prepared too, before compress() is called on
+    these; e.g., so that they can be worked on concurrently.
+    """
+    return False
+
+  def reset(self):
+    """
+    Return the processor to the state it was in when freshly constructed,
+    discarding any compression context, so that it can be reused for a new
+    session.
+
+    The default re-runs __init__; processors with expensive set-up should
+    override this with something cheaper.
+    """
+    self.__init__(self.options, self.is_request, self.params)
     
     
+def deflate_context_bytes(window_bits=15, mem_level=8):
+  """
+  Return the memory that zlib allocates for a deflate stream with the given
+  parameters, according to zconf.h; it is all allocated up front.
+  """
+  return (1 << (window_bits + 2)) + (1 << (mem_level + 9))
+
+
+def strip_conn_headers(hdrs):
+  """
+  Remove connection-specific headers (and any headers that the connection
+  header nominates) from the header dictionary 'hdrs', returning a new one.
+  """
+  ignore_hdrs = ['connection', 'keep-alive', 'proxy-connection']
+  if 'connection' in hdrs:
+    ignore_hdrs.extend([x.strip(' ') for x in hdrs['connection'].split(',')])
+  return dict([(k, v) for (k, v) in hdrs.iteritems() if k not in ignore_hdrs])
+
+
 def format_http1(frame, 
                  delimiter="\r\n", 
                  valsep=": ", 
@@ -0,0 +1,348 @@
+# Copyright (c) 2012 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+The BitBucket shared by the delta and bohe families of compressors (each
+of which imports it from its own bit_bucket module).
+
+Bits are kept in a bytearray, most-significant bit first, with the last
+byte holding any partial byte (padded with zeros). Each store combines the
+partial byte and the new bits in an integer and appends the result as
+whole bytes, and each read takes the bytes it spans as an integer, rather
+than working a bit or a byte at a time.
+"""
+
+from binascii import hexlify, unhexlify
+import struct
+import sys
+
+
+def FormatAsBits(output_and_bits):
+  """ Takes as input a tuple representing (array_of_bytes, number_of_bits),
+  and formats it as binary, with byte-boundaries marked"""
+  (output, bits) = output_and_bits
+  retval = []
+  if not bits:
+    total_bits = len(output) * 8
+  elif bits % 8:
+    total_bits = (len(output) - 1) * 8 + (bits % 8)
+  else:
+    total_bits = len(output) * 8
+  idx = 0
+  while total_bits >= 8:
+    c = output[idx]
+    idx += 1
+    retval.append('|')
+    retval.append('{0:08b}'.format(c))
+    total_bits -= 8
+  if (bits % 8) != 0:
+    retval.append('|')
+    retval.append('{0:08b}'.format(output[idx])[0:(bits % 8)])
+  retval.extend([' [%d]' % bits])
+  return ''.join(retval)
+
+
+class BitBucket(object):
+  """
+  This class allows for bit-level manipulations of a list of bits.
+  In particular, it allows for the storage of bits (or sets of bits), and
+  it allows for the fetching of those stored bits (effectively in a FIFO manner)
+  """
+  def __init__(self):
+    self.Clear()
+
+  def Clear(self):
+    """
+    Clears out all data and resets the BitBucket to like-new state
+    """
+    self.data = bytearray()
+    self.out_boff = 0 # bits used in the last byte of data, if it is partial
+    self.idx_byte = 0
+    self.idx_boff = 0
+
+  @property
+  def output(self):
+    """ The stored bytes, as a list of ints (as the BitBucket used to keep
+    them) """
+    return list(self.data)
+
+  @property
+  def out_byte(self):
+    """ The number of whole bytes stored """
+    return len(self.data) - (self.out_boff != 0)
+
+  def PadToByteBoundary(self):
+    """
+    Inserts enough '0's to ensure that the number of bits stored % 8 == 0
+    """
+    # the partial byte is already padded with zeros
+    self.out_boff = 0
+
+  def AdvanceReadPtrToByteBoundary(self):
+    """
+    Moves the read ptr up to the next byte boundary.
+    If already on a byte boundary, does nothing.
+    """
+    if self.idx_boff:
+      self.idx_boff = 0
+      self.idx_byte += 1
+
+  AdvanceToByteBoundary = AdvanceReadPtrToByteBoundary
+
+  def StoreInt(self, val, num_bits):
+    """
+    Stores the num_bits least-significant-bits of val, most-significant first
+    """
+    if num_bits <= 0:
+      return
+    val &= (1 << num_bits) - 1
+    data = self.data
+    boff = self.out_boff
+    if boff:
+      val |= (data.pop() >> (8 - boff)) << num_bits
+      num_bits += boff
+    boff = num_bits & 7
+    if boff:
+      val <<= 8 - boff
+      num_bits += 8 - boff
+    self.out_boff = boff
+    if num_bits == 8:
+      data.append(val)
+    elif num_bits == 16:
+      data.append(val >> 8)
+      data.append(val & 255)
+    elif num_bits <= 32:
+      data.extend(struct.pack(">L", val)[4 - (num_bits >> 3):])
+    else:
+      data.extend(unhexlify("%0*x" % (num_bits >> 2, val)))
+
+  def StoreBytes(self, val):
+    """
+    Stores all of the bytes of the string val
+    """
+    if not val:
+      return
+    if self.out_boff:
+      self.StoreInt(int(hexlify(val), 16), len(val) * 8)
+    else:
+      self.data.extend(val)
+
+  def StoreBit(self, bit):
+    """
+    Stores a single bit.
+    """
+    if bit:
+      self.StoreInt(1, 1)
+    else:
+      self.StoreInt(0, 1)
+
+  def StoreBits4(self, val):
+    """
+    Stores the 4 least-significant-bits from val
+    """
+    self.StoreInt(val, 4)
+
+  def StoreBits8(self, val):
+    """
+    Stores the 8 least-significant-bits from val
+    """
+    self.StoreInt(val, 8)
+
+  def StoreBits16(self, val):
+    """
+    Stores the 16 least-significant-bits from val in network order (big endian)
+    """
+    self.StoreInt(val, 16)
+
+  def StoreBits22(self, val):
+    """
+    Stores the 22 least-significant bits from val in network order (big endian)
+    """
+    # This has always stored the 32-bit value less its last two bits (i.e.,
+    # 30 bits); bohe's output depends on that.
+    self.StoreInt(val >> 2, 30)
+
+  def StoreBits32(self, val):
+    """
+    Stores the 32 least-significant-bits from val in network order (big endian)
+    """
+    self.StoreInt(val, 32)
+
+  def StoreBits(self, input_tuple):
+    """
+    (inp_bytes, inp_bits) = input_tuple
+    Stores inp_bits from inp_bytes. When inp_bits < len(inp_bytes)*8, the
+    most-significant-bits (this is opposite the other StoreBits) of the last
+    element of inp_bytes are used.
+    """
+    (inp_bytes, inp_bits) = input_tuple
+    if not inp_bytes:
+      return
+    # All of the bytes but the last are stored, whatever inp_bits says.
+    leftover_bits = inp_bits % 8 or 8
+    if len(inp_bytes) == 1:
+      # e.g., a Huffman code; this is StoreInt, done in place since it's
+      # the most common case.
+      data = self.data
+      boff = self.out_boff
+      val = inp_bytes[0] & ~(255 >> leftover_bits)
+      if not boff:
+        data.append(val)
+        self.out_boff = leftover_bits & 7
+      else:
+        val = (data.pop() << 8) | (val << (8 - boff))
+        boff += leftover_bits
+        if boff > 8:
+          data.append(val >> 8)
+          data.append(val & 255)
+        else:
+          data.append(val >> 8)
+        self.out_boff = boff & 7
+      return
+    if leftover_bits == 8 and not self.out_boff:
+      self.data.extend(inp_bytes)
+      return
+    if len(inp_bytes) == 2:
+      val = (inp_bytes[0] << 8) | inp_bytes[1]
+    else:
+      val = int(hexlify(bytearray(inp_bytes)), 16)
+    self.StoreInt(val >> (8 - leftover_bits),
+                  (len(inp_bytes) - 1) * 8 + leftover_bits)
+
+  def getvalue(self):
+    """ Returns the stored bits as a string, with the last byte padded with
+    zeros """
+    return str(self.data)
+
+  def GetAllBits(self):
+    """ Returns a tuple containing (list-of-bytes, number-of-bits)
+    When number-of-bits % 8 != 0, the last byte in list-of-bytes
+    will have the remaining bits (number-of-bits % 8) stored
+    from the most-significant bit onward towards the least-significant bit
+    """
+    return (list(self.data), self.NumBits())
+
+  def NumBits(self):
+    """
+    Returns the number of bits stored into this BitBucket
+    """
+    return 8 * len(self.data) - ((8 - self.out_boff) & 7)
+
+  def BytesOfStorage(self):
+    """
+    Returns the number of bytes necessary to hold all of the bits which have
+    been stored into this BitBucket
+    """
+    return len(self.data)
+
+  def BitsRemaining(self):
+    """
+    Returns the number of unread/unconsumed bits.
+    """
+    return self.NumBits() - (8*self.idx_byte + self.idx_boff) - 1
+
+  def AllConsumed(self):
+    """ Returns true if all stored bits were consumed, else returns false"""
+    return self.NumBits() <= (8*self.idx_byte + self.idx_boff)
+
+  def GetInt(self, num_bits):
+    """
+    Gets the next num_bits unconsumed bits from the BitBucket and returns
+    them as an int
+    """
+    if num_bits <= 0:
+      return 0
+    first = self.idx_byte
+    end = (first << 3) + self.idx_boff + num_bits
+    if end > self.NumBits():
+      print "num_bits: %d but bits_available: %d" % (
+          num_bits, self.NumBits() - (first << 3) - self.idx_boff)
+      raise StandardError()
+    last = (end + 7) >> 3
+    data = self.data
+    if last - first == 1:
+      val = data[first]
+    elif last - first == 2:
+      val = (data[first] << 8) | data[first + 1]
+    else:
+      val = int(hexlify(data[first:last]), 16)
+    self.idx_byte = end >> 3
+    self.idx_boff = end & 7
+    return (val >> ((last << 3) - end)) & ((1 << num_bits) - 1)
+
+  def GetBit(self):
+    # GetInt(1), done in place, as the Huffman decoders read a bit at a time
+    idx_byte = self.idx_byte
+    idx_boff = self.idx_boff
+    if idx_byte >= len(self.data) - 1 and \
+       (idx_byte << 3) + idx_boff >= self.NumBits():
+      return self.GetInt(1) # raises
+    if idx_boff == 7:
+      self.idx_byte = idx_byte + 1
+      self.idx_boff = 0
+    else:
+      self.idx_boff = idx_boff + 1
+    return (self.data[idx_byte] >> (7 - idx_boff)) & 1
+
+  def GetBits4(self):
+    """
+    Gets the next 4 unconsumed bits from the BitBucket and returns that as
+    an int
+    """
+    return self.GetInt(4)
+
+  def GetBits8(self):
+    """
+    Gets the next 8 unconsumed bits from the BitBucket and returns that as
+    an int
+    """
+    return self.GetInt(8)
+
+  def GetBits16(self):
+    """
+    Gets the next 16 unconsumed bits from the BitBucket and returns that as an
+    int
+    """
+    return self.GetInt(16)
+
+  def GetBits32(self):
+    """
+    Gets the next 32 unconsumed bits from the BitBucket and returns that as an
+    int
+    """
+    return self.GetInt(32)
+
+  def GetBits(self, num_bits):
+    """
+    Gets the specified number of unconsumed bits and returns it as a list of
+    ints (all of which are < 256)
+    """
+    if num_bits <= 0:
+      return ([], num_bits)
+    if not self.idx_boff and not num_bits & 7:
+      first = self.idx_byte
+      last = first + (num_bits >> 3)
+      if (last << 3) <= self.NumBits():
+        self.idx_byte = last
+        return (list(self.data[first:last]), num_bits)
+    pad = -num_bits & 7
+    val = self.GetInt(num_bits) << pad
+    if num_bits + pad == 8:
+      return ([val], num_bits)
+    return (list(bytearray(unhexlify("%0*x" % ((num_bits + pad) >> 2, val)))),
+            num_bits)
+
+  def DebugFormat(self):
+    """
+    Prints out (to stdout) a representation intended to help with debugging
+    """
+    print FormatAsBits((self.data, self.out_boff))
+    for i in xrange(self.idx_byte*8 + self.idx_boff - 1):
+      if not i % 8:
+        sys.stdout.write("|")
+      sys.stdout.write("-")
+    print "^"
+
+  def __repr__(self):
+    return FormatAsBits((self.data, self.out_boff))
@@ -11,6 +11,7 @@ import common_utils
 
 from huffman import Huffman
 from .. import BaseProcessor
+from ..huffman_cache import load_huffman
 from bit_bucket import BitBucket
 
 
@@ -24,9 +25,10 @@ class Processor(BaseProcessor):
   def __init__(self, options, is_request, params):
     BaseProcessor.__init__(self, options, is_request, params)
     if is_request:
-      self.huff = huffman.Huffman(header_freq_tables.request_freq_table)
+      freq_table = header_freq_tables.request_freq_table
     else:
-      self.huff = huffman.Huffman(header_freq_tables.response_freq_table)
+      freq_table = header_freq_tables.response_freq_table
+    self.huff = load_huffman(huffman, freq_table, options.cache_dir)
 
   def compress(self, inp_headers, host):
     data = BitBucket()
@@ -57,7 +59,7 @@ class Processor(BaseProcessor):
         data.StoreBits( (val_as_list, len_in_bits) )
       else:
         data.StoreBits8(128 | len(k))
-        data.StoreBits((common_utils.StrToList(k), len(k)*8))
+        data.StoreBytes(k)
         data.StoreBit(0) # assume not binary value for now
         if '\u00' in v:
           data.StoreBit(1)
@@ -66,7 +68,17 @@ class Processor(BaseProcessor):
         val_as_list, len_in_bits = self.do_huff(self.huff, v)
         data.StoreBits22(len(val_as_list))
         data.StoreBits((val_as_list, len_in_bits))
-    return ''.join(common_utils.ListToStr(data.GetAllBits()[0]))
+    return data.getvalue()
+
+  def reset(self):
+    # each message is encoded on its own; there is no context to discard.
+    pass
+
+  def context_bytes(self):
+    return 0
+
+  def context_entries(self):
+    return 0
 
   def do_huff(self, huff, val):
     val_as_list = common_utils.StrToList(val)
@@ -10,6 +10,7 @@ import spdy4_codec_impl
 import huffman
 import common_utils
 from .. import BaseProcessor
+from ..huffman_cache import load_huffman
 
 # There are a number of TODOS in the spdy4
 #      have near indices. Possibly renumber whever something is referenced)
@@ -25,19 +26,23 @@ class Processor(BaseProcessor):
   """
   def __init__(self, options, is_request, params):
     BaseProcessor.__init__(self, options, is_request, params)
-    self.compressor   = spdy4_codec_impl.Spdy4CoDe(params)
-    self.decompressor = spdy4_codec_impl.Spdy4CoDe(params)
+    # The huffman table isn't modified by coding, so it is built once and
+    # shared between the compressor and the decompressor (and processors).
+    if is_request:
+      freq_table = header_freq_tables.request_freq_table
+    else:
+      freq_table = header_freq_tables.response_freq_table
+    self.huffman_table = load_huffman(huffman, freq_table, options.cache_dir)
+    self.reset()
+
+  def reset(self):
+    self.compressor   = spdy4_codec_impl.Spdy4CoDe(self.params)
+    self.decompressor = spdy4_codec_impl.Spdy4CoDe(self.params)
+    self.compressor.huffman_table = self.huffman_table
+    self.decompressor.huffman_table = self.huffman_table
     self.hosts = {}
     self.group_ids = common_utils.IDStore(255)
     self.wf = self.compressor.wf
-    if is_request:
-      request_freq_table = header_freq_tables.request_freq_table
-      self.compressor.huffman_table = huffman.Huffman(request_freq_table)
-      self.decompressor.huffman_table = huffman.Huffman(request_freq_table)
-    else:
-      response_freq_table = header_freq_tables.response_freq_table
-      self.compressor.huffman_table = huffman.Huffman(response_freq_table)
-      self.decompressor.huffman_table = huffman.Huffman(response_freq_table)
 
   def PrintOps(self, ops):
     for op in ops:
@@ -12,6 +12,9 @@ class Huffman(object):
   This class takes in a frequency table, constructs a huffman code, and
   then allows for encoding and decoding of strings.
   """
+  # the tables built from the frequency table; see huffman_cache.py
+  table_fields = ('code_tree', 'code_table')
+
   def __init__(self, freq_table):
     self.code_tree = None
     self.code_table = []
@@ -137,7 +140,7 @@ class Huffman(object):
     while bits_to_decode < 0 or total_bits < bits_to_decode:
       root = self.code_tree
       while root[1] is None:
-        bit = bb.GetBits(1)[0][0] >> 7
+        bit = bb.GetBit()
         root = root[2][bit]
         total_bits += 1
       if includes_eof and root[1] is not None and root[1] == 256:
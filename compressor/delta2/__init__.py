@@ -10,13 +10,11 @@ import spdy4_codec_impl
 import huffman
 import common_utils
 from .. import BaseProcessor
+from ..huffman_cache import load_huffman
 
 # There are a number of TODOS in the spdy4
 #      have near indices. Possibly renumber whever something is referenced)
 
-request_huffman = huffman.Huffman(header_freq_tables.request_freq_table)
-response_huffman = huffman.Huffman(header_freq_tables.response_freq_table)
-
 class Processor(BaseProcessor):
   """
   This class formats header frames in SPDY4 wire format, and then reads the
@@ -28,19 +26,50 @@ class Processor(BaseProcessor):
   """
   def __init__(self, options, is_request, params):
     BaseProcessor.__init__(self, options, is_request, params)
+    # The huffman table isn't modified by coding, so it is built once and
+    # shared between the compressor and the decompressor (and processors).
+    if is_request:
+      freq_table = header_freq_tables.request_freq_table
+    else:
+      freq_table = header_freq_tables.response_freq_table
+    self.huffman = load_huffman(huffman, freq_table, options.cache_dir)
+    # with the huffman_cache parameter, encoded strings are cached across
+    # sessions; see reset()
+    self.huffman_cache = None
+    self.reset()
+
+  def reset(self):
     description = "request"
-    if not is_request:
+    if not self.is_request:
       description = "response"
-    self.compressor   = spdy4_codec_impl.Spdy4CoDe(params, description, options)
-    self.decompressor = spdy4_codec_impl.Spdy4CoDe(params, description, options)
+    self.compressor   = spdy4_codec_impl.Spdy4CoDe(self.params, description,
+                                                   self.options)
+    self.decompressor = spdy4_codec_impl.Spdy4CoDe(self.params, description,
+                                                   self.options)
     self.hosts = {}
     self.group_ids = common_utils.IDStore(255)
-    if is_request:
-      self.compressor.huffman = request_huffman
-      self.decompressor.huffman = request_huffman
-    else:
-      self.compressor.huffman = response_huffman
-      self.decompressor.huffman = response_huffman
+    self.compressor.huffman = self.huffman
+    self.decompressor.huffman = self.huffman
+    if self.huffman_cache is None and self.compressor.huffman_cache_size:
+      self.huffman_cache = huffman.EncodeCache(
+          self.huffman, self.compressor.huffman_cache_size)
+    self.compressor.huffman_cache = self.huffman_cache
+
+  def context_bytes(self):
+    # the table's keys and values, as counted against max_byte_size, and a
+    # two-byte index for each reference to them from a header group.
+    refs = sum([len(group.hg_store)
+                for group in self.compressor.header_groups.values()])
+    return self.compressor.storage.lru_storage.byte_size + 2 * refs
+
+  def context_entries(self):
+    return len(self.compressor.storage.lru_storage)
+
+  def counters(self):
+    if not self.huffman_cache:
+      return {}
+    return {'huffman cache hits': self.huffman_cache.hits,
+            'huffman cache misses': self.huffman_cache.misses}
 
   def PrintOps(self, ops):
     for op in ops:
@@ -5,6 +5,7 @@
 # found in the LICENSE file.
 
 from bit_bucket import BitBucket
+import random
 import unittest
 
 def RunTestCase(bb, testcase):
@@ -44,6 +45,15 @@ def StoreBitsFromString(bb, expected_bits_str):
       bb.StoreBit(0)
   return bb
 
+def IntToBits(val, num_bits):
+  return [(val >> (num_bits - 1 - i)) & 1 for i in xrange(num_bits)]
+
+def BitsToStr(bits):
+  """ Packs a list of bits into a string, padding the last byte with 0s """
+  padded = bits + [0] * (-len(bits) % 8)
+  return ''.join([chr(int(''.join(map(str, padded[i:i+8])), 2))
+                  for i in xrange(0, len(padded), 8)])
+
 class TestBitBucket(unittest.TestCase):
   def test_StoreBitsa(self):
     bb = BitBucket()
@@ -287,6 +297,103 @@ class TestBitBucket(unittest.TestCase):
         assert bb.idx_boff == 0
         assert bb.idx_byte == (old_idx_byte + 1)
 
+  # The tests below compare the BitBucket with a list of the bits which
+  # were stored, over random sequences of operations, so as to cover each of
+  # its fast paths at every bit offset.
+
+  def CheckStored(self, bb, bits):
+    self.assertEqual(bb.NumBits(), len(bits))
+    self.assertEqual(bb.getvalue(), BitsToStr(bits))
+    self.assertEqual(bb.GetAllBits(),
+                     ([ord(c) for c in BitsToStr(bits)], len(bits)))
+
+  def test_StoreInt(self):
+    rand = random.Random(1)
+    for _ in xrange(200):
+      bb = BitBucket()
+      bits = []
+      for _ in xrange(rand.randint(1, 20)):
+        num_bits = rand.choice([0, 1, 3, 7, 8, 9, 15, 16, 17, 31, 32, 33, 70])
+        val = rand.getrandbits(num_bits + 3)  # the extra bits are ignored
+        bb.StoreInt(val, num_bits)
+        bits += IntToBits(val, num_bits)
+        self.CheckStored(bb, bits)
+
+  def test_StoreBytes(self):
+    rand = random.Random(2)
+    for offset in xrange(16):
+      for length in [0, 1, 2, 5, 40]:
+        bb = BitBucket()
+        bb.StoreInt(0x5555, offset)
+        val = ''.join([chr(rand.randint(0, 255)) for _ in xrange(length)])
+        bb.StoreBytes(val)
+        bits = IntToBits(0x5555, offset)
+        for c in val:
+          bits += IntToBits(ord(c), 8)
+        self.CheckStored(bb, bits)
+
+  def test_StoreBitsTuples(self):
+    # (list-of-bytes, bits) with the bits at the most-significant end of the
+    # last byte; one byte (a Huffman code) and two are done specially.
+    rand = random.Random(3)
+    for offset in xrange(16):
+      for num_bytes in [1, 2, 3, 6]:
+        for leftover in xrange(1, 9):
+          bb = BitBucket()
+          bb.StoreInt(0x3333, offset)
+          inp = [rand.randint(0, 255) for _ in xrange(num_bytes)]
+          num_bits = (num_bytes - 1) * 8 + leftover
+          bb.StoreBits((inp, num_bits))
+          bits = IntToBits(0x3333, offset)
+          for byte in inp:
+            bits += IntToBits(byte, 8)
+          self.CheckStored(bb, bits[:offset + num_bits])
+
+  def test_GetInt(self):
+    rand = random.Random(4)
+    for _ in xrange(200):
+      bits = [rand.randint(0, 1) for _ in xrange(rand.randint(0, 200))]
+      bb = BitBucket()
+      for bit in bits:
+        bb.StoreBit(bit)
+      self.CheckStored(bb, bits)
+      pos = 0
+      while True:
+        num_bits = rand.choice([0, 1, 2, 7, 8, 9, 16, 23, 32, 45])
+        if pos + num_bits > len(bits):
+          break
+        val = bb.GetInt(num_bits)
+        expected = int(''.join(map(str, bits[pos:pos + num_bits])) or '0', 2)
+        self.assertEqual(val, expected)
+        pos += num_bits
+        self.assertEqual(bb.idx_byte * 8 + bb.idx_boff, pos)
+        self.assertEqual(bb.AllConsumed(), pos == len(bits))
+      self.assertRaises(StandardError, bb.GetInt, num_bits)
+
+  def test_GetBitAndGetBits(self):
+    rand = random.Random(5)
+    for _ in xrange(100):
+      bits = [rand.randint(0, 1) for _ in xrange(rand.randint(1, 100))]
+      bb = BitBucket()
+      for bit in bits:
+        bb.StoreBit(bit)
+      pos = 0
+      while pos < len(bits):
+        if rand.randint(0, 1):
+          self.assertEqual(bb.GetBit(), bits[pos])
+          pos += 1
+          continue
+        # whole bytes from a byte boundary are sliced out
+        num_bits = rand.choice([1, 5, 8, 16, 24])
+        if pos + num_bits > len(bits):
+          continue
+        chunk = bits[pos:pos + num_bits]
+        self.assertEqual(bb.GetBits(num_bits),
+                         ([ord(c) for c in BitsToStr(chunk)], num_bits))
+        pos += num_bits
+      self.assertRaises(StandardError, bb.GetBit)
+      self.assertRaises(StandardError, bb.GetBits, 8)
+
 unittest.main()
 
 
@@ -1,8 +1,9 @@
 # Copyright (c) 2012 The Chromium Authors. All rights reserved.
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
+from binascii import hexlify, unhexlify
 import heapq
-from collections import deque
+from collections import deque, OrderedDict
 from bit_bucket import BitBucket
 from common_utils import FormatAsBits
 import string
@@ -12,11 +13,18 @@ class Huffman(object):
   This class takes in a frequency table, constructs a huffman code, and
   then allows for encoding and decoding of strings.
   """
+  # the number of bits looked up at once when decoding
+  decode_bits = 8
+  # the tables built from the frequency table; see huffman_cache.py
+  table_fields = ('code_tree', 'code_table', 'canonical_code_table',
+                  'int_code_table', 'decode_table', 'decode_width')
+
   def __init__(self, freq_table):
     self.code_tree = None
     self.code_table = []
-    self.branches = []
+    self.int_code_table = []
     self.decode_table = []
+    self.decode_width = 0
     divisor = 1
     while True:
       max_code_len = self.BuildCodeTree(freq_table, divisor)
@@ -142,6 +150,8 @@ class Huffman(object):
     for sym in xrange(len(canonical_code_table)):
       self.canonical_code_table.append(canonical_code_table[sym])
     self.code_table = [x for x,_ in self.canonical_code_table]
+    self.int_code_table = [(code, code_len) for ((_, code_len), code)
+                           in self.canonical_code_table]
 
   def RebuildDecodeTreeFromCanonicalCodes(self):
     root = [None, None, 0, [None, None]]
@@ -151,7 +161,7 @@ class Huffman(object):
       bb.StoreBits(code)
       curr = root
       while not bb.AllConsumed():
-        bit = bb.GetBits(1)[0][0] >> 7
+        bit = bb.GetBit()
         if curr[3][bit] is None:
           curr[3][bit] = [None, None, curr[2]+1, [None, None]]
         curr = curr[3][bit]
@@ -159,97 +169,65 @@ class Huffman(object):
       curr[3] = []
     self.code_tree = root
 
-  @staticmethod
-  def Equivalent(sorted_by_code, idx1, idx2, msb, bw):
-    #print "msb: %d, bw: %d " % (msb, bw),
-    #print "FOO", sorted_by_code[idx1][1], "BAR", sorted_by_code[idx2][1]
-    cur_code = sorted_by_code[idx1][0]
-    nxt_code = sorted_by_code[idx2][0]
-    #print (cur_code, nxt_code)
-    #print (cur_code << msb, nxt_code << msb)
-    #print (((cur_code << msb) & 0xFFFFFFFF),
-    #       ((nxt_code << msb) & 0xFFFFFFFF))
-    #print ((((cur_code << msb) & 0xFFFFFFFF) >> (32 - bw)),
-    #       (((nxt_code << msb) & 0xFFFFFFFF) >> (32 - bw)))
-
-    cur_idx = ((cur_code << msb) & 0xFFFFFFFF) >> (32 - bw)
-    nxt_idx = ((nxt_code << msb) & 0xFFFFFFFF) >> (32 - bw)
-    return cur_idx == nxt_idx
-
-  @staticmethod
-  def MakeBranchEntry(base_idx, branch_idx, msb, bw):
-    mask = ((0xFFFFFFFF << (32 - bw)) & 0xFFFFFFFF) >> msb
-    shift = 32 - min(msb + bw, 32)
-    return (base_idx, branch_idx, mask, shift)
+  def BuildDecodeTable(self):
+    """
+    Builds the tables used by DecodeFromBB from the canonical codes. The
+    first decode_bits bits of a code index the primary table; codes which
+    are longer than that continue in secondary tables (of at most
+    decode_bits bits each), all of which are kept in the one flat list.
+    Entries are (sym, bits-consumed) or, for a secondary table,
+    (-1 - offset-of-table, bits-in-its-index).
+    """
+    codes = []  # (code, code_len, sym)
+    for sym in xrange(len(self.canonical_code_table)):
+      ((_, code_len), code) = self.canonical_code_table[sym]
+      codes.append( (code, code_len, sym) )
+    self.decode_table = []
+    (_, self.decode_width) = self.BuildDecodeTableHelper(codes, 0)
+    if None in self.decode_table:
+      # the code isn't complete, which a huffman code always is
+      raise StandardError()
+    #self.PrintDecodeTable()
 
-  def BuildDecodeTableHelper(self, sorted_by_code, decode_table,
-                             branches, begin, end, msb, bw):
-    branch_idx = len(branches)
-    branches.append(Huffman.MakeBranchEntry(len(decode_table), branch_idx, msb, bw))
-    decode_table_idx = len(decode_table)
-    #print "BW: ", bw
-    decode_table += [(0,0,0) for i in xrange(0x1 << bw)]
-    run_start = begin
-    run_end = begin
-    while run_end < end:
-      while Huffman.Equivalent(sorted_by_code, run_start, run_end, msb, bw):
-        run_end += 1
-        if run_end == end:
-          break
-      dist = run_end - run_start
-      cur_code = sorted_by_code[run_start][0]
-      cur_idx = ((cur_code << msb) & 0xFFFFFFFF) >> (32 - bw)
-      if dist == 1:
-        sym = sorted_by_code[run_start][1]
-        decode_table[decode_table_idx + cur_idx] = (sym, branch_idx, 1)
+  def BuildDecodeTableHelper(self, codes, prefix_len):
+    """
+    Appends a table for decoding 'codes', which share their first
+    'prefix_len' bits, to the decode_table, along with any secondary tables
+    it needs, and returns (offset-of-table, bits-in-its-index).
+    """
+    width = min(self.decode_bits,
+                max([code_len for (_, code_len, _) in codes]) - prefix_len)
+    base = len(self.decode_table)
+    self.decode_table.extend([None] * (1 << width))
+    subtables = {}
+    for (code, code_len, sym) in codes:
+      rest = code_len - prefix_len
+      if rest <= width:
+        # fill in every entry which starts with this code
+        idx = (code & ((1 << rest) - 1)) << (width - rest)
+        for i in xrange(idx, idx + (1 << (width - rest))):
+          self.decode_table[base + i] = (sym, rest)
       else:
-        sym = sorted_by_code[run_end - 1][1]
-        nxt_code_len = self.canonical_code_table[sym][0][1]
-        #print "nxt_code_len: ", nxt_code_len
-        #print "sym: ", sym
-        nxt_bit_len = nxt_code_len - (msb + bw)
-        #print "NBL: ", nxt_bit_len
-        decode_table[decode_table_idx + cur_idx] = (0, 0, 0)
-        #print "NBW: ", min(bw, nxt_bit_len)
-        self.BuildDecodeTableHelper(sorted_by_code, decode_table, branches,
-                                    run_start, run_end,
-                                    msb + bw, min(bw, nxt_bit_len))
-      run_start = run_end
-
-  def BuildDecodeTable(self):
-    lookup_bits = 8
-    self.branches = []  # (base_idx, ref, mask, shift)
-    self.decode_table = []  # (sym, next_table, valid)
-    sorted_by_code = []  # (code, sym)
-    for i in xrange(len(self.canonical_code_table)):
-      sym = i
-      code = self.canonical_code_table[i][1]
-      code <<= (32 - self.canonical_code_table[i][0][1])
-      sorted_by_code.append( (code, sym) )
-    sorted_by_code.sort()
-    #print sorted_by_code
-    self.BuildDecodeTableHelper(sorted_by_code,
-                                self.decode_table, self.branches,
-                                0, len(sorted_by_code), 0, lookup_bits)
-    for i in xrange(len(self.decode_table)):
-      if not self.decode_table[i][2]:
-        self.decode_table[i] = self.decode_table[i-1]
-    #Huffman.PrintDecodeTableAndBranches(self.decode_table, self.branches)
+        idx = (code >> (rest - width)) & ((1 << width) - 1)
+        subtables.setdefault(idx, []).append( (code, code_len, sym) )
+    for idx in sorted(subtables):
+      (sub_base, sub_width) = self.BuildDecodeTableHelper(subtables[idx],
+                                                          prefix_len + width)
+      self.decode_table[base + idx] = (-1 - sub_base, sub_width)
+    return (base, width)
 
-  @staticmethod
-  def PrintDecodeTableAndBranches(decode_table, branches):
+  def PrintDecodeTable(self):
     print "decode_table: "
-    for (sym, branch_idx, valid) in decode_table:
-      if sym < 127 and \
+    for (sym, bits) in self.decode_table:
+      if sym < 0:
+        print '\t-> %5d' % (-1 - sym),
+      elif sym < 127 and \
          chr(sym) in (string.digits + string.letters
                     + string.punctuation + ' ' + '\t'):
         print '\t%5s' % repr(chr(sym)),
       else:
           print '\t(%4d)' % sym,
-      print branch_idx
-    print "branches: "
-    print '\n\t'.join([''] + [repr((a,b,'{0:032b}'.format(c),d))
-                              for (a,b,c,d) in branches])
+      print bits
 
   def BuildCodeTable(self, code_tree):
     """ Given a code-tree as constructed in BuildCodeTree, construct a table
@@ -258,7 +236,7 @@ class Huffman(object):
     binary representation of the huffman encoding for each symbol.
     """
     self.BuildCanonicalCodeTable()
-    #self.BuildDecodeTable()
+    self.BuildDecodeTable()
     self.RebuildDecodeTreeFromCanonicalCodes()
     return
 
@@ -282,20 +260,47 @@ class Huffman(object):
         raise StandardError()
       self.code_table.append(self.BinaryStringToBREP(binary_string))
 
+  def EncodeToInt(self, text, include_eof):
+    """
+    Encodes 'text' (a string, or a list of ints) using the pre-computed
+    huffman coding, and returns it as a tuple of (code-as-int,
+    number-of-bits-as-int). If 'include_eof' is true, then an EOF will be
+    encoded at the end.
+    """
+    if isinstance(text, str):
+      text = bytearray(text)
+    codes = self.int_code_table
+    val = 0
+    num_bits = 0
+    head = bytearray()  # whole bytes which have been moved out of val
+    for start in xrange(0, len(text), 256):
+      for c in text[start:start + 256]:
+        (code, code_len) = codes[c]
+        val = (val << code_len) | code
+        num_bits += code_len
+      if num_bits > 1024:
+        # shifting val costs as much as its length, so it isn't left to grow
+        # with long strings
+        spare = num_bits & 7
+        head.extend(unhexlify("%0*x" % ((num_bits >> 3) * 2, val >> spare)))
+        val &= (1 << spare) - 1
+        num_bits = spare
+    if include_eof:
+      (code, code_len) = codes[256]
+      val = (val << code_len) | code
+      num_bits += code_len
+    if head:
+      val |= int(hexlify(head), 16) << num_bits
+      num_bits += len(head) * 8
+    return (val, num_bits)
+
   def EncodeToBB(self, bb, text, include_eof):
     """
     Given a BitBucket 'bb', and a string 'text', encode the string using the
     pre-computed huffman codings and store them into the BitBucket. if
     'include_eof' is true, then an EFO will also be encoded at the end.
     """
-    for c in text:
-      try:
-        bb.StoreBits(self.code_table[c])
-      except:
-        print "code_table:", self.code_table
-        raise
-    if include_eof:
-      bb.StoreBits(self.code_table[256])
+    bb.StoreInt(*self.EncodeToInt(text, include_eof))
 
   def Encode(self, text, include_eof):
     """
@@ -315,6 +320,83 @@ class Huffman(object):
     is allowed to be false, and that many bits will be consumed from the
     BitBucket
     """
+    if not includes_eof and bits_to_decode <= 0:
+      # That can't work.
+      raise StandardError()
+    # Rather than going through the BitBucket a bit at a time, this reads its
+    # bytes into an int, and looks up the next decode_width bits of it in the
+    # decode_table (and then in secondary tables, for long codes).
+    data = bb.data
+    num_bits = bb.NumBits()
+    start = (bb.idx_byte << 3) + bb.idx_boff
+    table = self.decode_table
+    width = self.decode_width
+    mask = (1 << width) - 1
+    eof = 256 if includes_eof else -1
+    if bits_to_decode > 0:
+      stop = start + bits_to_decode
+    else:
+      stop = num_bits + 1  # i.e., only the EOF stops it
+    output = bytearray()
+    next_byte = bb.idx_byte  # the next byte of data to read into acc
+    acc = 0
+    acc_bits = 0  # the number of unconsumed bits in acc
+    if bb.idx_boff:
+      acc = data[next_byte] & (0xff >> bb.idx_boff)
+      acc_bits = 8 - bb.idx_boff
+      next_byte += 1
+    while True:
+      while acc_bits < width:
+        try:
+          acc = (acc << 8) | data[next_byte]
+        except IndexError:
+          acc <<= 8  # past the end: any code using these bits fails below
+        next_byte += 1
+        acc_bits += 8
+      (sym, bits) = table[(acc >> (acc_bits - width)) & mask]
+      if sym < 0:
+        acc_bits -= width
+        while True:
+          # a secondary table, indexed by the next 'bits' bits
+          sub_width = bits
+          while acc_bits < sub_width:
+            try:
+              acc = (acc << 8) | data[next_byte]
+            except IndexError:
+              acc <<= 8
+            next_byte += 1
+            acc_bits += 8
+          (sym, bits) = table[-1 - sym + ((acc >> (acc_bits - sub_width)) &
+                                          ((1 << sub_width) - 1))]
+          if sym >= 0:
+            break
+          acc_bits -= sub_width
+      acc_bits -= bits
+      acc &= (1 << acc_bits) - 1
+      pos = (next_byte << 3) - acc_bits
+      if pos > num_bits:
+        raise StandardError("decoding past the end: %d bits available" %
+                            (num_bits - start))
+      if sym == eof:
+        break
+      output.append(sym)
+      if pos >= stop:
+        break
+    if bits_to_decode > 0 and pos < stop:
+      # (only on reaching the EOF) the rest of the bits are consumed too
+      pos = stop
+      if pos > num_bits:
+        raise StandardError()
+    bb.idx_byte = pos >> 3
+    bb.idx_boff = pos & 7
+    return str(output)
+
+  def DecodeFromBBByTree(self, bb, includes_eof, bits_to_decode):
+    """
+    As DecodeFromBB, but walks the code_tree a bit at a time, reading each
+    with GetBits(1). This is how decoding used to be done, and is kept to
+    compare against (see huffman_bench.py).
+    """
     output = []
     total_bits = 0
     if not includes_eof and bits_to_decode <= 0:
@@ -336,7 +418,7 @@ class Huffman(object):
         raise StandardError()
     if bits_to_decode > 0 and total_bits < bits_to_decode:
       bb.GetBits(bits_to_decode - total_bits)
-    return output
+    return str(bytearray(output))
 
   def FormatCodeTable(self):
     """
@@ -368,3 +450,42 @@ class Huffman(object):
     output.append(']')
     return ''.join(output)
 
+
+class EncodeCache(object):
+  """
+  Keeps the encodings of the most recently encoded strings (at most
+  'max_entries' of them), as header values such as user-agents and cookies
+  are repeated a lot, and counts how often it has them. It can be used in
+  place of the Huffman object 'huff' for encoding with EncodeToInt.
+  """
+  def __init__(self, huff, max_entries):
+    self.huff = huff
+    self.max_entries = max_entries
+    self.entries = OrderedDict()  # (text, include_eof) to (code, bits)
+    self.hits = 0
+    self.misses = 0
+
+  def EncodeToInt(self, text, include_eof):
+    """
+    Returns huff.EncodeToInt(text, include_eof), from the cache if it is
+    there. 'text' must be a string.
+    """
+    key = (text, include_eof)
+    try:
+      retval = self.entries.pop(key)
+      self.hits += 1
+    except KeyError:
+      retval = self.huff.EncodeToInt(text, include_eof)
+      self.misses += 1
+      if len(self.entries) >= self.max_entries:
+        self.entries.popitem(last=False)
+    self.entries[key] = retval  # as the most recently used
+    return retval
+
+  def HitRate(self):
+    """ Returns the fraction of the strings encoded which were cached """
+    return self.hits * 1.0 / max(self.hits + self.misses, 1)
+
+  def __repr__(self):
+    return "%d hits, %d misses (%.1f%% hit rate), %d entries" % (
+        self.hits, self.misses, 100 * self.HitRate(), len(self.entries))
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+
+# Copyright (c) 2012 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+Measures how fast Huffman.DecodeFromBB decodes, in MB (of decoded text) per
+second, compared to decoding a bit at a time by walking the code tree and
+reading each bit with GetBits(1), as DecodeFromBB used to (and
+DecodeFromBBByTree still does). Both read from the current BitBucket.
+
+  python -m compressor.delta2.huffman_bench [file ...]
+
+(from the top of the tree, so that it's imported as part of the package).
+
+Each line of the files is encoded as a string to decode; without any, a
+sample of typical header values is used.
+"""
+
+import sys
+import timeit
+
+from huffman import Huffman
+from bit_bucket import BitBucket
+import header_freq_tables
+
+sample_data = [
+    "GET",
+    "/",
+    "www.example.com",
+    "https://www.example.com/images/2012/12/logo.png?v=3",
+    "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "gzip,deflate,sdch",
+    "en-US,en;q=0.8",
+    "ISO-8859-1,utf-8;q=0.7,*;q=0.3",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_8_2) AppleWebKit/537.11 "
+    "(KHTML, like Gecko) Chrome/23.0.1271.97 Safari/537.11",
+    "__utma=1.1234567890.1355000000.1355000000.1355000000.1; "
+    "__utmz=1.1355000000.1.1.utmcsr=(direct)|utmccn=(direct)|utmcmd=(none)",
+    "max-age=0",
+    "Tue, 11 Dec 2012 23:59:59 GMT",
+    "\"3e8f2-4d0c5a16b2c80\"",
+    ]
+
+def Bench(decode, encoded, length, reps):
+  """ Returns the MB/s (the best of 'reps' passes) that 'decode' decodes the
+  (list-of-bytes, number-of-bits) tuples in 'encoded' at; 'length' is the
+  total length of the decoded strings """
+  buckets = []
+  for e in encoded:
+    bb = BitBucket()
+    bb.StoreBits(e)
+    buckets.append(bb)
+  def DecodeAll():
+    for bb in buckets:
+      bb.idx_byte = bb.idx_boff = 0
+      decode(bb, True, 0)
+  secs = min(timeit.repeat(DecodeAll, number=1, repeat=reps))
+  return length / secs / 1e6
+
+def main():
+  data = sample_data
+  if len(sys.argv) > 1:
+    data = []
+    for filename in sys.argv[1:]:
+      data.extend([line.rstrip('\r\n') for line in open(filename)])
+  length = sum([len(s) for s in data])
+  reps = max(3, 200000 / max(length, 1))
+  print "%d strings, %d bytes, best of %d passes" % (len(data), length, reps)
+  for name in ['request_freq_table', 'response_freq_table']:
+    h = Huffman(getattr(header_freq_tables, name))
+    encoded = [h.Encode([ord(c) for c in s], True) for s in data]
+    for s, e in zip(data, encoded):
+      bb = BitBucket()
+      bb.StoreBits(e)
+      if h.DecodeFromBB(bb, True, 0) != s:
+        print "difference found decoding %s" % repr(s)
+        sys.exit(1)
+    before = Bench(h.DecodeFromBBByTree, encoded, length, reps)
+    after = Bench(h.DecodeFromBB, encoded, length, reps)
+    print "%-20s  tree, GetBits(1): %6.2f MB/s  table (%d bits): %6.2f MB/s" \
+        "  (%.1fx)" % (
+        name, before, h.decode_bits, after, after / before)
+
+main()
@@ -4,7 +4,12 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-from huffman import Huffman
+from cStringIO import StringIO
+import random
+import string
+import sys
+
+from huffman import Huffman, EncodeCache
 from bit_bucket import BitBucket
 from common_utils import FormatAsBits
 from common_utils import ListToStr
@@ -117,6 +122,146 @@ def MakeReadableString(val):
       out.append("0x%02x " % ord(c))
   return ''.join(out)
 
+failures = []
+
+def Check(ok, description):
+  """ Records a failure, described by 'description', unless 'ok' """
+  if not ok:
+    print "FAILED:", description
+    failures.append(description)
+
+def BrepToBits(brep):
+  """ Returns the (list-of-bytes, number-of-bits) 'brep' as a string of 0s
+  and 1s """
+  (data, num_bits) = brep
+  return ''.join([bin(b)[2:].zfill(8) for b in data])[:num_bits]
+
+def IntToBits(val, num_bits):
+  """ Returns the low 'num_bits' bits of 'val' as a string of 0s and 1s """
+  if not num_bits:
+    return ''
+  return bin(val)[2:].zfill(num_bits)[-num_bits:]
+
+def TestEncodeToInt(h):
+  """ EncodeToInt should give each character's code in turn, whether it's
+  given a string or a list, and however long the string is (as whole bytes
+  are moved out of the integer every 256 characters) """
+  rand = random.Random(0)
+  texts = test_data + [
+      "",
+      "\xff" * 300,  # long codes
+      ''.join([chr(rand.randint(0, 255)) for _ in xrange(1000)]),
+      ''.join([rand.choice(string.letters) for _ in xrange(2049)]),
+      ]
+  for text in texts:
+    for include_eof in [True, False]:
+      expected = ''.join([BrepToBits(h.code_table[ord(c)]) for c in text])
+      if include_eof:
+        expected += BrepToBits(h.code_table[256])
+      (val, num_bits) = h.EncodeToInt(text, include_eof)
+      Check(num_bits == len(expected) and val >> num_bits == 0 and
+            IntToBits(val, num_bits) == expected,
+            "EncodeToInt(%r, %s)" % (text[:20], include_eof))
+      Check(h.EncodeToInt([ord(c) for c in text], include_eof) ==
+            (val, num_bits), "EncodeToInt of a list (%r)" % text[:20])
+      bb = BitBucket()
+      h.EncodeToBB(bb, text, include_eof)
+      Check(BrepToBits(bb.GetAllBits()) == expected,
+            "EncodeToBB(%r, %s)" % (text[:20], include_eof))
+      if include_eof:
+        Check(ListToStr(h.DecodeFromBB(bb, True, -1)) == text,
+              "round trip of %r" % text[:20])
+
+def TestEncodeCache(h):
+  """ EncodeCache should encode as the Huffman object does, counting hits
+  and misses, and keep only the most recently used strings """
+  cache = EncodeCache(h, 2)
+  steps = [  # text, include_eof, whether it is a hit
+      ("a", True, False),
+      ("b", True, False),
+      ("a", True, True),
+      ("a", False, False),  # include_eof is part of the key
+      ("b", True, False),  # evicted by ("a", False)
+      ("a", False, True),
+      ("a", True, False),  # evicted by ("b", True)
+      ]
+  hits = misses = 0
+  for (text, include_eof, hit) in steps:
+    Check(cache.EncodeToInt(text, include_eof) ==
+          h.EncodeToInt(text, include_eof),
+          "EncodeCache.EncodeToInt(%r, %s)" % (text, include_eof))
+    if hit:
+      hits += 1
+    else:
+      misses += 1
+    Check((cache.hits, cache.misses) == (hits, misses),
+          "EncodeCache counts after %r: %r" % ((text, include_eof), cache))
+    Check(len(cache.entries) <= 2, "EncodeCache size: %r" % cache)
+  Check(cache.HitRate() == 2.0 / 7, "EncodeCache.HitRate: %r" % cache)
+  Check(EncodeCache(h, 10).HitRate() == 0, "HitRate when unused")
+
+def MakeBB(bits):
+  """ Returns a BitBucket holding 'bits', a string of 0s and 1s """
+  bb = BitBucket()
+  if bits:
+    bb.StoreInt(int(bits, 2), len(bits))
+  return bb
+
+def Decode(decode, bits, skip, includes_eof, bits_to_decode):
+  """ Returns the result of 'decode' (DecodeFromBB or DecodeFromBBByTree) on
+  a BitBucket holding 'bits' which has had its first 'skip' bits read, as a
+  tuple of (text, bits-read), or None if it raises """
+  bb = MakeBB(bits)
+  bb.GetInt(skip)
+  stdout = sys.stdout
+  sys.stdout = StringIO()  # the BitBucket prints why it fails
+  try:
+    text = decode(bb, includes_eof, bits_to_decode)
+  except StandardError:
+    return None
+  finally:
+    sys.stdout = stdout
+  return (text, (bb.idx_byte << 3) + bb.idx_boff)
+
+def TestDecoders(h):
+  """ DecodeFromBB (with its tables) should decode just as walking the code
+  tree does, wherever the text starts in the BitBucket, with or without an
+  EOF, and for codes longer than the first table (decode_bits) too; both
+  should fail on truncated input """
+  code_lens = [code_len for (_, code_len) in h.code_table]
+  long_codes = ''.join([chr(c) for c in xrange(256)
+                        if code_lens[c] > h.decode_bits])
+  Check(long_codes and max(code_lens) > 2 * h.decode_bits,
+        "the codes are long enough to need secondary tables")
+  rand = random.Random(1)
+  texts = test_data + ["", "\0", long_codes, ''.join(map(chr, xrange(256)))]
+  for _ in xrange(100):
+    alphabet = rand.choice([string.letters, long_codes, map(chr, xrange(256))])
+    texts.append(''.join([rand.choice(alphabet)
+                          for _ in xrange(rand.randint(1, 40))]))
+  for text in texts:
+    skip = rand.randint(0, 15)
+    junk = ''.join([rand.choice('01') for _ in xrange(skip)])
+    for includes_eof in [True, False][:1 + bool(text)]:
+      # (without an EOF, there has to be something to decode)
+      bits = junk + IntToBits(*h.EncodeToInt(text, includes_eof))
+      # as delta2 does without an EOF, give the length (and some bits
+      # after it, which mustn't be read)
+      bits_to_decode = -1 if includes_eof else len(bits) - skip
+      padded = bits + ('' if includes_eof else '1011')
+      results = [Decode(decode, padded, skip, includes_eof, bits_to_decode)
+                 for decode in [h.DecodeFromBB, h.DecodeFromBBByTree]]
+      Check(results[0] == results[1] == (text, len(bits)),
+            "decoding %r (eof %s): %r" % (text[:20], includes_eof, results))
+      # without its end, neither should return anything
+      for end in set([skip, rand.randint(skip, len(bits) - 1),
+                      len(bits) - 1]):
+        for decode in [h.DecodeFromBB, h.DecodeFromBBByTree]:
+          Check(Decode(decode, bits[:end], skip, includes_eof,
+                       bits_to_decode) is None,
+                "%s of %r (eof %s) truncated to %d bits" % (
+                    decode.__name__, text[:20], includes_eof, end - skip))
+
 def main():
   h = Huffman(request_freq_table)
   for s in test_data:
@@ -127,12 +272,18 @@ def main():
     print "      e_result: ", FormatAsBits(e_result.GetAllBits())
 
     d_result = ListToStr(h.DecodeFromBB(e_result, True, -1))
-    if d_result != s:
-      print "difference found: d_result(%s) vs orig(%s)" % (repr(d_result),
-                                                            repr(s))
-    else:
+    Check(d_result == s, "difference found: d_result(%s) vs orig(%s)" % (
+        repr(d_result), repr(s)))
+    if d_result == s:
       print "It worked: ", s
     print
+  TestEncodeToInt(h)
+  TestEncodeCache(h)
+  TestDecoders(h)
+  if failures:
+    print "%d checks failed" % len(failures)
+    sys.exit(1)
+  print "All checks passed"
 
 main()
 
@@ -1,5 +1,4 @@
 #!/usr/bin/python
-from collections import deque
 
 class RefCntString:
   def __init__(self, x):
@@ -57,15 +56,88 @@ class KV:
     return "{(%r, %s) %r %r %r}" % \
         (repr(self.key_), repr(self.val_), self.seq_num, self.khash, self.kvhash)
 
+def Index(index, key, item):
+  # Entries are stored newest last, so item is the newest for key.
+  entry = index.get(key)
+  if entry is None:
+    index[key] = [1, item]
+  else:
+    entry[0] += 1
+    entry[1] = item
+
+def Unindex(index, key):
+  # Entries are popped oldest first, so the newest for key only goes with
+  # the last of them.
+  entry = index[key]
+  if entry[0] == 1:
+    del index[key]
+  else:
+    entry[0] -= 1
+
+class Ring(object):
+  # A circular array of entries, oldest first. Unlike a deque, indexing
+  # anywhere in it is O(1). It is preallocated to hold capacity entries,
+  # and grows if more are appended.
+  def __init__(self, capacity=None):
+    self.slots = [None] * max(capacity or 0, 16)
+    self.head = 0
+    self.count = 0
+
+  def __len__(self):
+    return self.count
+
+  def __getitem__(self, idx):
+    if idx < 0:
+      idx += self.count
+    if not 0 <= idx < self.count:
+      raise IndexError("ring index out of range")
+    idx += self.head
+    if idx >= len(self.slots):
+      idx -= len(self.slots)
+    return self.slots[idx]
+
+  def __iter__(self):
+    for i in xrange(self.count):
+      yield self[i]
+
+  def append(self, item):
+    if self.count == len(self.slots):
+      self.slots = list(self) + [None] * len(self.slots)
+      self.head = 0
+    idx = self.head + self.count
+    if idx >= len(self.slots):
+      idx -= len(self.slots)
+    self.slots[idx] = item
+    self.count += 1
+
+  def popleft(self):
+    if not self.count:
+      raise IndexError("pop from an empty ring")
+    item = self.slots[self.head]
+    self.slots[self.head] = None
+    self.head += 1
+    if self.head == len(self.slots):
+      self.head = 0
+    self.count -= 1
+    return item
+
+  def __repr__(self):
+    return repr(list(self))
+
 class LruStorage:
   def __init__(self, max_bytes=None, max_items=None, max_seq_num=None,
                offset=None):
-    self.ring = deque()
+    self.ring = Ring(max_items)
     self.byte_size = 0
     self.max_items = max_items
     self.max_bytes = max_bytes
     self.max_seq_num = max_seq_num
 
+    # key -> [count, newest entry], and the same for (key, val), for the
+    # entries in the ring; see FindKeyValEntries.
+    self.key_index = {}
+    self.kv_index = {}
+
     self.pop_cb = None
     self.offset = offset
     if offset is None:
@@ -93,6 +165,9 @@ class LruStorage:
       return 0
     item = self.ring.popleft()
     self.byte_size -= item.ByteSize()
+    key = item.key()
+    Unindex(self.key_index, key)
+    Unindex(self.kv_index, (key, item.val()))
     item.done()
     #print "POPPING: ", item.seq_num
     if self.pop_cb is not None:
@@ -116,10 +191,16 @@ class LruStorage:
       self.seq_num = self.offset
     self.byte_size += item_byte_size
     self.ring.append(item)
+    key = item.key()
+    Index(self.key_index, key, item)
+    Index(self.kv_index, (key, item.val()), item)
 
   def SeqNumToIdxFromLeft(self, seq_num):
     #print "\tlen(ring): ", len(self.ring),
-    first_seq_num = self.ring[0].seq_num
+    ring = self.ring
+    if not ring.count:
+      raise IndexError("Empty ring")
+    first_seq_num = ring.slots[ring.head].seq_num
     if seq_num < self.offset:
       raise IndexError("Negative indices unsupported: ", seq_num)
     if first_seq_num > seq_num:
@@ -140,15 +221,16 @@ class LruStorage:
   def Lookup(self, seq_num):
     lru_idx = self.SeqNumToIdxFromLeft(seq_num)
     #print "Looking up: ", lru_idx
-    try:
-      entry = self.ring[lru_idx]
-    except IndexError:
-      print self.ring
-      print "len(ring): ", len(self.ring)
+    ring = self.ring
+    if not 0 <= lru_idx < ring.count:
+      print ring
+      print "len(ring): ", len(ring)
       print "lru_idx: ", lru_idx
       print "seq_num requested:", seq_num
-      print "first_seq_num:", self.ring[0].seq_num
-      raise
+      print "first_seq_num:", ring[0].seq_num
+      raise IndexError("ring index out of range")
+    # the same as ring[lru_idx], without the method call
+    entry = ring.slots[(ring.head + lru_idx) % len(ring.slots)]
     if entry.seq_num != seq_num:
       print "Something strange has happened"
       print "entry: ", entry
@@ -160,20 +242,15 @@ class LruStorage:
     return entry
 
   def FindKeyValEntries(self, key, val):
-    # Looks for key/vals starting from the last entry
-    (khash, kvhash) = ComputeKVHash(key, val)
-    ke = None
-    for i in xrange(len(self.ring) - 1, -1, -1):
-      item = self.ring[i]
-      if khash == item.khash and item.key() == key:
-        ke = item
-        if kvhash == item.kvhash and item.val() == val:
-          return (item.seq_num, item.seq_num)
-        for j in xrange(i - 1, -1, -1):
-          item = self.ring[j]
-          if kvhash == item.kvhash and item.key() == key and item.val() == val:
-            return (item.seq_num, item.seq_num)
-        return (ke.seq_num, None)
+    # Finds what a scan from the last entry would: the newest entry with
+    # both key and val, or else the newest with key.
+    kv_entry = self.kv_index.get((key, val))
+    if kv_entry is not None:
+      seq_num = kv_entry[1].seq_num
+      return (seq_num, seq_num)
+    k_entry = self.key_index.get(key)
+    if k_entry is not None:
+      return (k_entry[1].seq_num, None)
     return (None, None)
 
   def __len__(self):
@@ -3,8 +3,24 @@
 from lrustorage import LruStorage
 from lrustorage import KV
 from lrustorage import RefCntString
+from lrustorage import Ring
+from collections import deque
+import random
 import unittest
 
+def ScanForKeyVal(s, key, val):
+  # What FindKeyValEntries used to do: scan from the newest entry for the
+  # newest with both key and val, or else the newest with key.
+  ke = None
+  for i in xrange(len(s.ring) - 1, -1, -1):
+    item = s.ring[i]
+    if item.key() == key:
+      if item.val() == val:
+        return (item.seq_num, item.seq_num)
+      if ke is None:
+        ke = item.seq_num
+  return (ke, None)
+
 class TestLruStorage(unittest.TestCase):
   def test_BasicFunctionality(self):
     max_items = 10
@@ -79,6 +95,37 @@ class TestLruStorage(unittest.TestCase):
     self.assertEqual(ve.key(), "key_001")
     self.assertEqual(ve.val(), "val_001")
 
+  def test_FindKeyValEntriesMatchesScan(self):
+    # The indices should find what a linear scan would, as entries with the
+    # same keys (and values) are stored, evicted and stored again.
+    rand = random.Random(0)
+    keys = ["k%d" % i for i in xrange(6)]
+    vals = ["v%d" % i for i in xrange(4)]
+    for (max_items, max_byte_size, max_seq_num) in [(8, 1000, None),
+                                                    (100, 40, None),
+                                                    (5, 1000, 12)]:
+      s = LruStorage(max_byte_size, max_items, max_seq_num)
+      for _ in xrange(500):
+        if rand.random() < 0.1:
+          s.PopOne()
+        else:
+          kv = KV(rand.choice(keys), rand.choice(vals))
+          s.Reserve(kv, 1)
+          s.Store(kv)
+        for key in keys + ["missing"]:
+          for val in vals + [""]:
+            self.assertEqual(s.FindKeyValEntries(key, val),
+                             ScanForKeyVal(s, key, val))
+        # and they don't hold on to evicted entries
+        counts = {}
+        for item in s.ring:
+          counts[item.key()] = counts.get(item.key(), 0) + 1
+        self.assertEqual(dict([(key, entry[0])
+                               for key, entry in s.key_index.items()]),
+                         counts)
+        self.assertEqual(sum([entry[0] for entry in s.kv_index.values()]),
+                         len(s.ring))
+
   def test_PopOne(self):
     caught_error = 0
 
@@ -212,5 +259,81 @@ class TestLruStorage(unittest.TestCase):
     self.assertEqual(ref3.refcnt(), 1)
     self.assertEqual(len(ref3), len(orig))
 
+class TestRing(unittest.TestCase):
+  def assertMatches(self, ring, expected):
+    self.assertEqual(len(ring), len(expected))
+    self.assertEqual(list(ring), list(expected))
+    for i in xrange(len(expected)):
+      self.assertEqual(ring[i], expected[i])
+      self.assertEqual(ring[i - len(expected)], expected[i - len(expected)])
+    for i in [len(expected), -len(expected) - 1]:
+      self.assertRaises(IndexError, ring.__getitem__, i)
+
+  def test_Empty(self):
+    ring = Ring()
+    self.assertMatches(ring, [])
+    self.assertRaises(IndexError, ring.__getitem__, 0)
+    self.assertRaises(IndexError, ring.__getitem__, -1)
+    self.assertRaises(IndexError, ring.popleft)
+    self.assertFalse(ring)
+
+  def test_Wraparound(self):
+    # once full, popping one and appending one moves the head all the way
+    # around the slots, more than once
+    ring = Ring(16)
+    expected = deque()
+    for i in xrange(16):
+      ring.append(i)
+      expected.append(i)
+    for i in xrange(16, 16 * 3 + 5):
+      self.assertEqual(ring.popleft(), expected.popleft())
+      ring.append(i)
+      expected.append(i)
+      self.assertMatches(ring, expected)
+      self.assertEqual(len(ring.slots), 16)
+    while expected:
+      self.assertEqual(ring.popleft(), expected.popleft())
+      self.assertMatches(ring, expected)
+    self.assertRaises(IndexError, ring.popleft)
+    self.assertEqual(ring.slots, [None] * 16)  # nothing is held on to
+
+  def test_Growth(self):
+    # appending to a full ring (wherever its head is) doubles it, keeping
+    # the entries in order
+    for head in [0, 1, 15]:
+      ring = Ring(16)
+      expected = deque()
+      for i in xrange(head):
+        ring.append(None)
+        ring.popleft()
+      for i in xrange(40):
+        ring.append(i)
+        expected.append(i)
+        self.assertMatches(ring, expected)
+      self.assertEqual(len(ring.slots), 64)
+      for i in xrange(40, 200):
+        if i % 3:
+          ring.append(i)
+          expected.append(i)
+        else:
+          self.assertEqual(ring.popleft(), expected.popleft())
+        self.assertMatches(ring, expected)
+
+  def test_RandomOperations(self):
+    rand = random.Random(0)
+    ring = Ring(rand.choice([None, 1, 16, 20]))
+    expected = deque()
+    for i in xrange(2000):
+      if expected and rand.random() < 0.45:
+        self.assertEqual(ring.popleft(), expected.popleft())
+      else:
+        ring.append(i)
+        expected.append(i)
+      self.assertEqual(len(ring), len(expected))
+      if expected:
+        idx = rand.randint(-len(expected), len(expected) - 1)
+        self.assertEqual(ring[idx], expected[idx])
+    self.assertMatches(ring, expected)
+
 unittest.main()
 
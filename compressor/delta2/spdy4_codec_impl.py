@@ -5,8 +5,8 @@
 # found in the LICENSE file.
 
 import string
-import struct
 import copy
+import sys
 
 from bit_bucket import BitBucket
 from collections import defaultdict
@@ -123,23 +123,7 @@ def UnpackInt(inp_stream, bitlen, huff):
 
   'huff' is unused.
   """
-  raw_in_stream = inp_stream.GetBits(bitlen)[0]
-  rshift = 0
-  if bitlen <= 8:
-    arg = '%c%c%c%c' % (0,0, 0,raw_in_stream[0])
-    rshift = 8 - bitlen
-  elif bitlen <= 16:
-    arg = '%c%c%c%c' % (0,0, raw_in_stream[0], raw_in_stream[1])
-    rshift = 16 - bitlen
-  elif bitlen <= 24:
-    arg = '%c%c%c%c' % (0,raw_in_stream[0], raw_in_stream[1], raw_in_stream[2])
-    rshift = 24 - bitlen
-  else:
-    arg = '%c%c%c%c' % (raw_in_stream[0], raw_in_stream[1],
-                        raw_in_stream[2], raw_in_stream[3])
-    rshift = 32 - bitlen
-  retval = (struct.unpack('>L', arg)[0] >> rshift)
-  return retval
+  return inp_stream.GetInt(bitlen)
 
 def UnpackVarInt(inp_stream, bitlen, huff):
   # unpacks a varint encoded int.
@@ -195,9 +179,10 @@ def UnpackStr(input_data, params, huff):
       if c == 0:
         break
       retval.append(c)
+    retval = common_utils.ListToStr(retval)
   if pad_to_byte_boundary:
     input_data.AdvanceReadPtrToByteBoundary()
-  return common_utils.ListToStr(retval)
+  return retval
 
 # this assumes the bits are near the LSB, but must be packed to be close to MSB
 def PackInt8(data, bitlen, val, huff):
@@ -218,15 +203,7 @@ def PackInt(data, bitlen, val, huff):
   if bitlen <= 0 or bitlen > 32 or val != (val & ~(0x1 << bitlen)):
     print 'bitlen: ', bitlen, ' val: ', val
     raise StandardError()
-  if bitlen <= 8:
-    tmp_val = struct.pack('>B', val << (8 - bitlen))
-  elif bitlen <= 16:
-    tmp_val = struct.pack('>H', val << (16 - bitlen))
-  elif bitlen <= 24:
-    tmp_val = struct.pack('>L', val << (24 - bitlen))[1:]
-  else:
-    tmp_val = struct.pack('>L', val << (32 - bitlen))
-  data.StoreBits( (common_utils.StrToList(tmp_val), bitlen) )
+  data.StoreInt(val, bitlen)
 
 def PackVarInt(data, bitlen, val, huff):
   assert val >= 0
@@ -254,17 +231,16 @@ def PackStr(data, params, val, huff):
   pad_to_byte_boundary - if true, then enough bits are written to ensure that
                          the data ends on a byte boundary.
   'val' is the string to be packed
-  'huff' is the Huffman object to be used when doing huffman encoding.
+  'huff' is the Huffman object (or huffman.EncodeCache) to be used when doing
+  huffman encoding.
   """
   (pad_to_byte_boundary, use_huffman) = params
   # if eof, then don't technically need bitlen at all...
-  val_as_list = common_utils.StrToList(val)
-
   if huff and use_huffman:
-    (val_as_list, len_in_bits) = huff.Encode(val_as_list, True)
+    data.StoreInt(*huff.EncodeToInt(val, True))
   else:
-    val_as_list.append(0)
-  data.StoreBits( (val_as_list, len_in_bits) )
+    data.StoreBytes(val)
+    data.StoreBits8(0)
   if pad_to_byte_boundary:
     data.PadToByteBoundary()
 
@@ -784,6 +760,24 @@ def IsTrueWithDefault(param_dict, key, default):
     return 1
   return 0
 
+def ParseHuffmanCache(value):
+  """ Returns the number of entries the huffman_cache parameter's 'value'
+  asks for; with no value, DEFAULT_HUFFMAN_CACHE. Exits if it isn't a
+  number. """
+  if value is None:
+    return DEFAULT_HUFFMAN_CACHE
+  try:
+    size = int(value)
+  except ValueError:
+    size = -1
+  if size < 0:
+    sys.stderr.write("delta2: huffman_cache must be a number of entries, "
+                     "not '%s'.\n" % value)
+    sys.exit(1)
+  return size
+
+DEFAULT_HUFFMAN_CACHE = 1024
+
 class Spdy4CoDe(object):
   def __init__(self, params, description, options):
     self.description = description
@@ -821,10 +815,14 @@ class Spdy4CoDe(object):
     self.refcnt_vals =     IsTrueWithDefault(param_dict, 'refcnt_vals', False)
     self.only_etoggles =   IsTrueWithDefault(param_dict, 'only_etoggles', False)
     self.idx_from_end =    IsTrueWithDefault(param_dict, 'idx_from_end', True)
+    self.huffman_cache_size = 0
+    if 'huffman_cache' in param_dict:
+      self.huffman_cache_size = ParseHuffmanCache(param_dict['huffman_cache'])
 
     self.options = options
     self.header_groups = {}
     self.huffman = None
+    self.huffman_cache = None
     #self.wf = WordFreak()  # for figuring out the letter freq counts
     self.storage = Storage(max_byte_size, max_entries,
                            max_index,self.idx_from_end)
@@ -874,18 +872,19 @@ class Spdy4CoDe(object):
     """ Packs in-memory format operations into wire format"""
     data = BitBucket()
     seder = Spdy4SeDer()
+    huff = self.huffman_cache or self.huffman
 
     data.StoreBits(seder.SerializeInstructions(in_ops,
                                                self.packing_instructions,
-                                               self.huffman,
+                                               huff,
                                                0xffff, header_group,
                                                True, self.options.verbose))
-    return common_utils.ListToStr(data.GetAllBits()[0])
+    return data.getvalue()
 
   def RealOpsToOps(self, realops):
     """ Unpacks wire format operations into in-memory format"""
     bb = BitBucket()
-    bb.StoreBits((common_utils.StrToList(realops), len(realops)*8))
+    bb.StoreBytes(realops)
     seder = Spdy4SeDer()
     (group_id, ops) = seder.DeserializeInstructions(bb,
                                                     self.packing_instructions,
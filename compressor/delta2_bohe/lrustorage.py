@@ -23,6 +23,10 @@ class LruStorage:
     self.max_bytes = max_bytes
     self.max_seq_num = max_seq_num
 
+    # key -> [count, newest entry], for the entries in the ring; see
+    # FindKeyValEntries.
+    self.key_index = {}
+
     self.pop_cb = None
     self.offset = offset
     if offset is None:
@@ -46,6 +50,13 @@ class LruStorage:
   def PopOne(self):
     item = self.ring.popleft()
     self.byte_size -= item.ByteSize()
+    # entries are popped oldest first, so the newest for a key only goes
+    # with the last of them.
+    entry = self.key_index[item.key]
+    if entry[0] == 1:
+      del self.key_index[item.key]
+    else:
+      entry[0] -= 1
     #print "POPPING: ", item.seq_num
     if self.pop_cb is not None:
       self.pop_cb(item)
@@ -63,6 +74,12 @@ class LruStorage:
       self.seq_num = self.offset
     self.byte_size += item_byte_size
     self.ring.append(item)
+    entry = self.key_index.get(item.key)
+    if entry is None:
+      self.key_index[item.key] = [1, item]
+    else:
+      entry[0] += 1
+      entry[1] = item
 
   def Lookup(self, seq_num):
     first_seq_num = self.ring[0].seq_num
@@ -85,20 +102,16 @@ class LruStorage:
     return KV(entry.key, entry.val, entry.seq_num)
 
   def FindKeyValEntries(self, key, val):
-    # Looks for key/vals starting from the last entry
-    ke = None
-    ve = None
-    for i in xrange(len(self.ring)-1, 0, -1):
-      entry = self.ring[i]
-      if entry.key == key:
-        ke = entry
-        for j in xrange(i, 0, -1):
-          entry = self.ring[i]
-          if entry.val == val:
-            ve = entry
-            break
-        break
-    return (ke, ve)
+    # Finds what a scan from the last entry down to (but not including) the
+    # first would: the newest entry with key, and that entry again if it
+    # also has val.
+    entry = self.key_index.get(key)
+    if entry is None or entry[1] is self.ring[0]:
+      return (None, None)
+    ke = entry[1]
+    if ke.val == val:
+      return (ke, ke)
+    return (ke, None)
 
   def __len__(self):
     return len(self.ring)
@@ -2,6 +2,19 @@
 
 from lrustorage import LruStorage
 from lrustorage import KV
+import random
+
+def ScanForKeyVal(s, key, val):
+  # What FindKeyValEntries used to do: scan from the newest entry down to
+  # (but not including) the first for the newest with key, and return it
+  # again if it also has val.
+  for i in xrange(len(s.ring) - 1, 0, -1):
+    entry = s.ring[i]
+    if entry.key == key:
+      if entry.val == val:
+        return (entry, entry)
+      return (entry, None)
+  return (None, None)
 
 def TestBasicFunctionality():
   print "TestBasicFunctionality...",
@@ -176,6 +189,38 @@ def TestRollOver():
     s.Lookup(i % max_seq_num).key == key_str
   print "Success!"
 
+def TestFindKeyValEntriesMatchesScan():
+  print "TestFindKeyValEntriesMatchesScan...",
+  # The index should find what a linear scan would, as entries with the
+  # same keys (and values) are stored, evicted and stored again.
+  rand = random.Random(0)
+  keys = ["k%d" % i for i in xrange(6)]
+  vals = ["v%d" % i for i in xrange(4)]
+  for (max_items, max_byte_size) in [(8, 1000), (100, 40)]:
+    s = LruStorage(max_byte_size, max_items)
+    for _ in xrange(500):
+      if s.ring and rand.random() < 0.1:
+        s.PopOne()
+      else:
+        kv = KV(rand.choice(keys), rand.choice(vals))
+        s.Reserve(kv.ByteSize(), 1)
+        s.Store(kv)
+      if not s.ring:
+        continue
+      for key in keys + ["missing"]:
+        for val in vals + [""]:
+          found = s.FindKeyValEntries(key, val)
+          scanned = ScanForKeyVal(s, key, val)
+          assert found[0] is scanned[0] and found[1] is scanned[1], \
+              (key, val, found, scanned, s.ring)
+      # and it doesn't hold on to evicted entries
+      counts = {}
+      for entry in s.ring:
+        counts[entry.key] = counts.get(entry.key, 0) + 1
+      assert dict([(key, entry[0])
+                   for key, entry in s.key_index.items()]) == counts
+  print "Success!"
+
 def main():
   TestBasicFunctionality()
   TestMaxItemSize()
@@ -184,6 +229,7 @@ def main():
   TestPopOne()
   TestReserve()
   TestRollOver()
+  TestFindKeyValEntriesMatchesScan()
 
 main()
 
@@ -5,7 +5,6 @@
 # found in the LICENSE file.
 
 import string
-import struct
 
 from bit_bucket import BitBucket
 from collections import defaultdict
@@ -151,22 +150,7 @@ def UnpackInt(input, bitlen, huff):
 
   'huff' is unused.
   """
-  raw_input = input.GetBits(bitlen)[0]
-  rshift = 0
-  if bitlen <=8:
-    arg = '%c%c%c%c' % (0,0, 0,raw_input[0])
-    rshift = 8 - bitlen
-  elif bitlen <=16:
-    arg = '%c%c%c%c' % (0,0, raw_input[0], raw_input[1])
-    rshift = 16 - bitlen
-  elif bitlen <=24:
-    arg = '%c%c%c%c' % (0,raw_input[0], raw_input[1], raw_input[2])
-    rshift = 24 - bitlen
-  else:
-    arg = '%c%c%c%c' % (raw_input[0], raw_input[1], raw_input[2], raw_input[3])
-    rshift = 32 - bitlen
-  retval = (struct.unpack('>L', arg)[0] >> rshift)
-  return retval
+  return input.GetInt(bitlen)
 
 def UnpackStr(input, params, huff):
   """
@@ -234,15 +218,7 @@ def PackInt(data, bitlen, val, huff):
   if bitlen <= 0 or bitlen > 32 or val != (val & ~(0x1 << bitlen)):
     print 'bitlen: ', bitlen, ' val: ', val
     raise StandardError()
-  if bitlen <= 8:
-    tmp_val = struct.pack('>B', val << (8 - bitlen))
-  elif bitlen <= 16:
-    tmp_val = struct.pack('>H', val << (16 - bitlen))
-  elif bitlen <= 24:
-    tmp_val = struct.pack('>L', val << (24 - bitlen))[1:]
-  else:
-    tmp_val = struct.pack('>L', val << (32 - bitlen))
-  data.StoreBits( (common_utils.StrToList(tmp_val), bitlen) )
+  data.StoreInt(val, bitlen)
 
 def PackStr(data, params, val, huff):
   """
@@ -712,12 +688,12 @@ class Spdy4CoDe(object):
     data = BitBucket()
     #print FormatOps(in_ops)
     PackOps(data, packing_instructions, in_ops, self.huffman_table, header_group)
-    return common_utils.ListToStr(data.GetAllBits()[0])
+    return data.getvalue()
 
   def RealOpsToOps(self, realops):
     """ Unpacks wire format operations into in-memory format"""
     bb = BitBucket()
-    bb.StoreBits((common_utils.StrToList(realops), len(realops)*8))
+    bb.StoreBytes(realops)
     return UnpackOps(bb, packing_instructions, self.huffman_table)
 
   def Compress(self, realops):
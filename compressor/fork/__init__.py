@@ -2,12 +2,19 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+from collections import deque
 import os
+import Queue
 import subprocess
 import struct
 import sys
+import threading
+import time
 
-from .. import BaseProcessor, format_http1, strip_conn_headers
+from .. import BaseProcessor, format_http1, parse_http1, strip_conn_headers
+
+# framed protocol: a type byte and a payload length, then the payload.
+FRAME = struct.Struct(">cI")
 
 class Processor(BaseProcessor):
   def __init__(self, options, is_request, params):
@@ -16,14 +23,71 @@ class Processor(BaseProcessor):
       self.delimit_binary = True
     else:
       self.delimit_binary = False
-    path = os.path.join(os.getcwd(), params[0])
-    self.process = subprocess.Popen(path,
-                                    #bufsize=-1,
-                                    shell=False,
-                                    stdout=subprocess.PIPE,
-                                     stdin=subprocess.PIPE)
+    self.batch = "batch" in params[1:]
+    self.num_children = 1
+    for param in params[1:]:
+      if param.startswith("children="):
+        self.num_children = int(param.split("=", 1)[1])
+    self.path = os.path.join(os.getcwd(), params[0])
+    # children are only started once there is something to compress, so
+    # that Processors which never do (e.g., those of the parent when -j is
+    # used, or of the asynchronous verifier) don't start any.
+    self.process = None
+    self.children = []
+    self.next_child = 0
+    self.pending = deque() # [child, replies left] for prepared sessions
+    self.current = None # the same, for the session being compressed
+    if self.batch:
+      self.lookahead = self.num_children - 1
+
+  def reset(self):
+    if self.batch:
+      if self.current:
+        child, left = self.current
+        for i in range(left):
+          child.read_reply()
+      self.current = None
+      return
+    # the child has no way to be told to forget its context, so start afresh
+    # (in compress()).
+    self.done()
+
+  def done(self):
+    "Close the child's input, and reap it once it has exited."
+    for child in self.children:
+      child.close()
+    self.children = []
+    if self.process is None:
+      return
+    close_process(self.process)
+    self.process = None
+
+  def prepare_session(self, messages):
+    if not self.batch:
+      return False
+    self.pending.append(self.submit([hdrs for hdrs, host in messages], True))
+    return True
 
   def compress(self, in_headers, host):
+    if self.batch:
+      if self.current is None:
+        if self.pending:
+          self.current = self.pending.popleft()
+        else:
+          self.current = self.submit([in_headers], True)
+      elif not self.current[1]:
+        self.current = self.submit([in_headers], False, self.current[0])
+      self.current[1] -= 1
+      output, decompressed = self.current[0].read_reply()
+      output = Compressed(output)
+      output.decompressed = decompressed
+      return output
+    if self.process is None:
+      self.process = subprocess.Popen(self.path,
+                                      #bufsize=-1,
+                                      shell=False,
+                                      stdout=subprocess.PIPE,
+                                      stdin=subprocess.PIPE)
     http1_msg = format_http1(strip_conn_headers(in_headers))
     self.process.stdin.write(http1_msg)
     if self.delimit_binary:
@@ -38,3 +102,115 @@ class Processor(BaseProcessor):
           break
         output += line
     return output
+
+  def decompress(self, compressed):
+    # only the child can decompress; in batch mode, it sends the result back
+    # along with the compressed message.
+    decompressed = getattr(compressed, 'decompressed', None)
+    if not decompressed:
+      raise NotImplementedError
+    return parse_http1(decompressed, self.is_request)
+
+  def submit(self, headers, new_session, child=None):
+    """
+    Send a list of headers to a child to compress, and return [child,
+    number of replies to read]. If new_session is true, the next child in
+    turn is told to reset its context first; otherwise, child is used.
+    """
+    frames = []
+    if new_session:
+      if not self.children:
+        # kept for the whole run, and told to reset between sessions;
+        # sessions are handed to them in turn.
+        self.children = [Child([self.path, "--batch"])
+                         for i in range(self.num_children)]
+      child = self.children[self.next_child]
+      self.next_child = (self.next_child + 1) % len(self.children)
+      frames.append(frame("R", ""))
+    frames.extend([frame("H", format_http1(strip_conn_headers(hdrs)))
+                   for hdrs in headers])
+    frames.append(frame("F", ""))
+    child.send("".join(frames))
+    return [child, len(headers)]
+
+
+class Compressed(str):
+  """
+  A message as compressed by a child, with what it decompressed it to (as
+  'decompressed'), so that decompress() can be given it by any Processor;
+  e.g., the asynchronous verifier's. As a str, its length is that of the
+  compressed message, and it pickles along with what it decompressed to.
+  """
+
+
+class Child(object):
+  """
+  A child process speaking the framed protocol. Writes to it are queued
+  for a thread, so that a batch can be sent without waiting for the child
+  to read it, and so that several children can work at once.
+  """
+  def __init__(self, args):
+    self.path = args[0]
+    self.process = subprocess.Popen(args,
+                                    shell=False,
+                                    stdout=subprocess.PIPE,
+                                    stdin=subprocess.PIPE)
+    self.writes = Queue.Queue()
+    self.writer = threading.Thread(target=self.write_all)
+    self.writer.daemon = True
+    self.writer.start()
+
+  def send(self, data):
+    "Write data to the child, in the background."
+    self.writes.put(data)
+
+  def write_all(self):
+    while True:
+      data = self.writes.get()
+      if data is None:
+        break
+      try:
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+      except IOError: # it exited; read_frame() will say so
+        break
+
+  def read_reply(self):
+    "Read the reply to a message: (compressed, decompressed)."
+    return self.read_frame("C"), self.read_frame("D")
+
+  def read_frame(self, kind):
+    "Read a frame of type kind from the child, and return its payload."
+    header = self.process.stdout.read(FRAME.size)
+    if len(header) < FRAME.size:
+      sys.stderr.write("%s exited unexpectedly.\n" % self.path)
+      sys.exit(1)
+    frame_kind, length = FRAME.unpack(header)
+    if frame_kind != kind:
+      sys.stderr.write("%s sent a '%s' frame instead of '%s'.\n" %
+                       (self.path, frame_kind, kind))
+      sys.exit(1)
+    return self.process.stdout.read(length)
+
+  def close(self):
+    "Finish writing to the child, and reap it."
+    self.writes.put(None)
+    self.writer.join()
+    close_process(self.process)
+
+
+def close_process(process):
+  "Close the process's input, and reap it once it has exited."
+  process.stdin.close()
+  for i in xrange(100):
+    if process.poll() is not None:
+      break
+    time.sleep(0.01)
+  else:
+    process.terminate()
+    process.wait()
+
+
+def frame(kind, payload):
+  "Return a frame of type kind with payload."
+  return FRAME.pack(kind, len(payload)) + payload
@@ -31,7 +31,7 @@ import zlib
 from headerDiffCodec import HeaderDiffCodec, IndexedHeader
 from headerDiffCodec import DELTA_FULL, DELTA_BOUND, DELTA_MAX
 
-from .. import BaseProcessor,  spdy_dictionary
+from .. import BaseProcessor,  spdy_dictionary, deflate_context_bytes
 
 #####################################################
 ## Class for representing a Header: (name, value)  ##
@@ -136,6 +136,19 @@ class Processor(BaseProcessor):
       huffman=param_dict[HUFFMAN],
       isRequest=is_request,
       )
+
+  def reset(self):
+    self.codec.initCodec()
+
+  def context_bytes(self):
+    # as the codec accounts for it; i.e., the indexed headers' values
+    size = self.codec.headersTableEncoderSize
+    if self.codec.comp is not None:
+      size += deflate_context_bytes(self.codec.windowSize, 8)
+    return size
+
+  def context_entries(self):
+    return len(self.codec.headersTableEncoder)
   
   def compress(self, in_headers, host):
     hdrs = dict(in_headers)
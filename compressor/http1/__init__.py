@@ -9,4 +9,13 @@ class Processor(BaseProcessor):
     return format_http1(in_headers)
 
   def decompress(self, compressed):
-    return parse_http1(compressed, self.is_request)
\ No newline at end of file
+    return parse_http1(compressed, self.is_request)
+
+  def reset(self):
+    pass
+
+  def context_bytes(self):
+    return 0
+
+  def context_entries(self):
+    return 0
\ No newline at end of file
@@ -3,15 +3,23 @@
 # found in the LICENSE file.
 
 import zlib
-from .. import BaseProcessor, spdy_dictionary, format_http1
+from .. import BaseProcessor, spdy_dictionary, format_http1, \
+  deflate_context_bytes
 
 class Processor(BaseProcessor):
   def __init__(self, options, is_request, params):
     BaseProcessor.__init__(self, options, is_request, params)
-    self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
-                                       zlib.DEFLATED, 15, 8, zlib.Z_HUFFMAN_ONLY)
-    self.compressor.compress(spdy_dictionary.spdy_dict);
-    self.compressor.flush(zlib.Z_SYNC_FLUSH)
+    self.primed = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
+                                   zlib.DEFLATED, 15, 8, zlib.Z_HUFFMAN_ONLY)
+    self.primed.compress(spdy_dictionary.spdy_dict);
+    self.primed.flush(zlib.Z_SYNC_FLUSH)
+    self.reset()
+
+  def reset(self):
+    self.compressor = self.primed.copy()
+
+  def context_bytes(self):
+    return deflate_context_bytes(15, 8)
 
   def compress(self, in_headers, host):
     http1_msg = format_http1(in_headers)
@@ -95,6 +95,16 @@ class Processor(BaseProcessor):
     
     codecClass = HTTP2Codec
     self.codec = codecClass(**param_dict)
+
+  def reset(self):
+    self.codec.init_codec()
+
+  def context_bytes(self):
+    # as the codec accounts for it, with 32 bytes of overhead per entry
+    return self.codec.encoder_table_size
+
+  def context_entries(self):
+    return len(self.codec.encoder_table)
   
   def compress(self, in_headers, host):
     headers = split_headers(in_headers)
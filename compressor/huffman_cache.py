@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+"""
+A cache of the Huffman codes built by the delta family of compressors.
+
+Each of them has its own huffman module, whose Huffman class builds code
+(and, for some, decode) tables from a frequency table. The tables don't
+change as messages are coded, so they are built once per process, shared
+by every processor using the same module and frequency table, and, given a
+cache directory, stored there so that later runs just load them. Only the
+fields named by the class's table_fields are stored.
+"""
+
+# pylint: disable=W0311
+
+import hashlib
+import inspect
+import marshal
+import os
+
+CACHE_MAGIC = "HUFFCACHE\x01"
+
+_tables = {} # cache key to Huffman object
+
+
+def load_huffman(huffman_module, freq_table, cache_dir=None):
+  """
+  Return huffman_module.Huffman(freq_table), built once per process, and
+  read from (or written to) cache_dir if that is given.
+
+  Entries are keyed on the frequency table and the source of the huffman
+  module and of the BitBucket it uses, so they are invalidated when either
+  changes. An entry that can't be read or written is rebuilt.
+  """
+  key = cache_key(huffman_module, freq_table)
+  if key in _tables:
+    return _tables[key]
+  path = None
+  if cache_dir:
+    path = os.path.join(cache_dir, "%s.huff" % key)
+  fields = huffman_module.Huffman.table_fields
+  state = None
+  if path and os.path.exists(path):
+    state = read_cache(path)
+  if state is None or sorted(state.keys()) != sorted(fields):
+    huffman = huffman_module.Huffman(freq_table)
+    if path:
+      write_cache(path, dict([(name, getattr(huffman, name))
+                              for name in fields]))
+  else:
+    huffman = huffman_module.Huffman.__new__(huffman_module.Huffman)
+    huffman.__dict__.update(state)
+  _tables[key] = huffman
+  return huffman
+
+
+def cache_key(huffman_module, freq_table):
+  "Return the cache key for the Huffman object built from freq_table."
+  digest = hashlib.sha1(CACHE_MAGIC)
+  for obj in [huffman_module, huffman_module.BitBucket]:
+    source = inspect.getsourcefile(obj)
+    fhandle = open(source, 'rb')
+    try:
+      digest.update(fhandle.read())
+    finally:
+      fhandle.close()
+  digest.update(repr(freq_table))
+  return digest.hexdigest()
+
+
+def read_cache(path):
+  "Return the Huffman state stored at path, or None if it can't be read."
+  try:
+    fhandle = open(path, 'rb')
+    try:
+      data = fhandle.read()
+    finally:
+      fhandle.close()
+  except EnvironmentError:
+    return None
+  if not data.startswith(CACHE_MAGIC):
+    return None
+  try:
+    state = marshal.loads(data[len(CACHE_MAGIC):])
+  except (EOFError, ValueError, TypeError):
+    return None
+  if not isinstance(state, dict):
+    return None
+  return state
+
+
+def write_cache(path, state):
+  """
+  Store the Huffman state at path, and return whether it was. The file
+  only appears once complete.
+  """
+  try:
+    data = CACHE_MAGIC + marshal.dumps(state)
+  except ValueError: # e.g., a field that marshal can't store
+    return False
+  tmp_path = "%s.%d.tmp" % (path, os.getpid())
+  try:
+    cache_dir = os.path.dirname(path)
+    if cache_dir and not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    fhandle = open(tmp_path, 'wb')
+    try:
+      fhandle.write(data)
+    finally:
+      fhandle.close()
+    os.rename(tmp_path, path)
+  except EnvironmentError: # e.g., cache_dir is read-only
+    try:
+      os.remove(tmp_path)
+    except EnvironmentError:
+      pass
+    return False
+  return True
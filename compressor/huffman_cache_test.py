@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""
+Tests for the on-disk cache of Huffman tables in huffman_cache.py.
+"""
+
+# pylint: disable=W0311
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from compressor import huffman_cache
+from compressor.huffman_cache import load_huffman, write_cache
+from compressor.delta import huffman as delta_huffman
+from compressor.delta2 import huffman as delta2_huffman
+from compressor.delta2.bit_bucket import BitBucket
+from compressor.delta2.header_freq_tables import request_freq_table
+
+TEXT = "https://www.example.com/images/logo.png?v=3"
+
+
+class TestHuffmanCache(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.cache_dir = os.path.join(self.tmpdir, "cache")
+    self.builds = 0
+    self.init = delta2_huffman.Huffman.__init__
+    self.built = delta2_huffman.Huffman(request_freq_table)
+    huffman_cache._tables.clear()
+
+  def tearDown(self):
+    delta2_huffman.Huffman.__init__ = self.init
+    huffman_cache._tables.clear()
+    shutil.rmtree(self.tmpdir)
+
+  def count_builds(self, extra=None):
+    "Count the delta2 Huffman objects built, setting extra on each."
+    init = self.init
+    def counting_init(huff, freq_table):
+      self.builds += 1
+      init(huff, freq_table)
+      if extra is not None:
+        huff.extra = extra
+    delta2_huffman.Huffman.__init__ = counting_init
+
+  def load(self, cache_dir=None):
+    "Load the delta2 request table afresh, as another process would."
+    huffman_cache._tables.clear()
+    return load_huffman(delta2_huffman, request_freq_table,
+                        cache_dir or self.cache_dir)
+
+  def cache_files(self):
+    return sorted(os.listdir(self.cache_dir))
+
+  def check_codes(self, huff):
+    "Check that huff encodes and decodes as a freshly built table does."
+    encoded = self.built.Encode([ord(c) for c in TEXT], True)
+    self.assertEqual(huff.Encode([ord(c) for c in TEXT], True), encoded)
+    bb = BitBucket()
+    bb.StoreBits(encoded)
+    self.assertEqual(huff.DecodeFromBB(bb, True, 0), TEXT)
+
+  def test_round_trip(self):
+    self.count_builds()
+    self.load()
+    self.assertEqual(self.builds, 1)
+    self.assertEqual(len(self.cache_files()), 1)
+    loaded = self.load()
+    self.assertEqual(self.builds, 1)
+    self.assertEqual(sorted(loaded.__dict__.keys()),
+                     sorted(delta2_huffman.Huffman.table_fields))
+    for name in delta2_huffman.Huffman.table_fields:
+      self.assertEqual(getattr(loaded, name), getattr(self.built, name))
+    self.check_codes(loaded)
+    # within a process, the table is shared
+    self.assertTrue(load_huffman(delta2_huffman, request_freq_table,
+                                 self.cache_dir) is loaded)
+    # the delta family's other modules have their own entries
+    load_huffman(delta_huffman, request_freq_table, self.cache_dir)
+    self.assertEqual(len(self.cache_files()), 2)
+
+  def test_only_tables_stored(self):
+    # an attribute that marshal can't store isn't a table, so isn't cached
+    self.count_builds(threading.Lock())
+    self.load()
+    loaded = self.load()
+    self.assertEqual(self.builds, 1)
+    self.assertFalse(hasattr(loaded, 'extra'))
+    self.check_codes(loaded)
+
+  def test_bad_entries_rebuilt(self):
+    self.count_builds()
+    self.load()
+    path = os.path.join(self.cache_dir, self.cache_files()[0])
+    for data in ["", "HUFFCACHE\x01garbage", huffman_cache.CACHE_MAGIC]:
+      fhandle = open(path, 'wb')
+      fhandle.write(data)
+      fhandle.close()
+      self.check_codes(self.load())
+    # a state without every table
+    write_cache(path, {'code_table': []})
+    self.check_codes(self.load())
+    self.assertEqual(self.builds, 5)
+    self.check_codes(self.load())
+    self.assertEqual(self.builds, 5)
+
+  def test_write_failures(self):
+    self.count_builds()
+    path = os.path.join(self.tmpdir, "state.huff")
+    self.assertFalse(write_cache(path, {'lock': threading.Lock()}))
+    self.assertFalse(os.path.exists(path))
+    # a cache_dir that can't be made is a miss every time, not an error
+    not_a_dir = os.path.join(self.tmpdir, "file")
+    open(not_a_dir, 'w').close()
+    for _ in range(2):
+      self.check_codes(self.load(os.path.join(not_a_dir, "cache")))
+    self.assertEqual(self.builds, 2)
+    self.assertEqual(os.listdir(self.tmpdir), ["file"])
+
+
+if __name__ == "__main__":
+  unittest.main()
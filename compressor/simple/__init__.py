@@ -87,16 +87,11 @@ class Processor(BaseProcessor):
   
   def __init__(self, options, is_request, params):
     BaseProcessor.__init__(self, options, is_request, params)
-    self.last_c = None
-    self.last_d = None
     self.rev_lookups = {v:k for k, v in self.lookups.items()}
     if "seven" in params:
       self.encode = seven.encode
       self.decode = seven.decode
     elif "huffman" in params:
-      self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
-                        zlib.DEFLATED, 15, 8, zlib.Z_HUFFMAN_ONLY)
-      self.decompressor = zlib.decompressobj()
       self.encode = self.huffman_encode
       self.decode = self.huffman_decode
     else:
@@ -109,6 +104,15 @@ class Processor(BaseProcessor):
     pd = dict([i.split("=", 1) for i in params if "=" in i])
     self.max_entries = int(pd.get('max_entries', self.big))
     assert len(self.lookups) == len(self.rev_lookups)
+    self.reset()
+
+  def reset(self):
+    self.last_c = None
+    self.last_d = None
+    if "huffman" in self.params:
+      self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
+                        zlib.DEFLATED, 15, 8, zlib.Z_HUFFMAN_ONLY)
+      self.decompressor = zlib.decompressobj()
 
   def compress(self, in_headers, host):
     headers = {}
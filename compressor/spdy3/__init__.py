@@ -4,16 +4,23 @@
 
 import zlib
 import struct
-from .. import spdy_dictionary, BaseProcessor
+from .. import spdy_dictionary, BaseProcessor, deflate_context_bytes
 
 class Processor(BaseProcessor):
   def __init__(self, options, is_request, params):
     BaseProcessor.__init__(self, options, is_request, params)
-    self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
-                                       zlib.DEFLATED, 15)
+    self.primed = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
+                                   zlib.DEFLATED, 15)
     if 'dict' in params:
-      self.compressor.compress(spdy_dictionary.spdy_dict);
-      self.compressor.flush(zlib.Z_SYNC_FLUSH)
+      self.primed.compress(spdy_dictionary.spdy_dict);
+      self.primed.flush(zlib.Z_SYNC_FLUSH)
+    self.reset()
+
+  def reset(self):
+    self.compressor = self.primed.copy()
+
+  def context_bytes(self):
+    return deflate_context_bytes(15, 8)
 
   def compress(self, in_headers, host):
     raw_spdy3_frame = self.Spdy3HeadersFormat(in_headers)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+"""
+Benchmarking of codec throughput.
+
+Each codec replays the same corpus of sessions through compress() and
+decompress() a number of times, after one or more untimed warmup passes.
+Results are reported as messages and (HTTP/1 formatted) input megabytes
+per second, with percentiles of per-message latency, and can be written as
+JSON so that later runs can be compared against them.
+"""
+
+# pylint: disable=W0311
+
+from array import array
+import gc
+import json
+import math
+
+from compressor import format_http1
+from lib import clock
+from lib.processors import Processors
+from lib.stats import percentile
+from lib.stream import RunningStats
+
+BENCH_VERSION = 1
+DIRECTIONS = ['compress', 'decompress']
+
+
+class Benchmark(object):
+  """
+  Times the processors in a Processors object over a list of sessions.
+  """
+  def __init__(self, processors, sessions, output):
+    self.processors = processors
+    self.output = output
+    self.corpus = []  # (msg_type, [(filtered_hdrs, host), ...]) per session
+    self.num_messages = 0
+    self.num_bytes = 0
+    for session in sessions:
+      messages = []
+      for hdrs, host in session.messages:
+        filtered_hdrs = Processors.filter_headers(hdrs)
+        messages.append((filtered_hdrs, host))
+        self.num_bytes += len(format_http1(filtered_hdrs))
+      self.num_messages += len(messages)
+      self.corpus.append((session.msg_type, messages))
+
+  def run(self, repetitions, warmup):
+    """
+    Benchmark each codec, and return the results as a dictionary suitable
+    for JSON output.
+    """
+    codecs = {}
+    msg_types = self.processors.msg_types
+    # processors are listed in the same order for each msg_type
+    for codec in zip(*[self.processors.processors[t] for t in msg_types]):
+      procs = dict(zip(msg_types, codec))
+      for _ in range(warmup):
+        self.replay(procs)
+      samples = [self.replay(procs) for _ in range(repetitions)]
+      codecs[codec[0].name] = self.summarise(samples)
+    return {
+      'version': BENCH_VERSION,
+      'messages': self.num_messages,
+      'bytes': self.num_bytes,
+      'repetitions': repetitions,
+      'warmup': warmup,
+      'codecs': codecs,
+    }
+
+  def replay(self, procs):
+    """
+    Pass the corpus through procs (a dictionary of msg_type to processor)
+    once, and return a dictionary of direction to an array of per-message
+    wall-clock nanoseconds; decompress is None if it isn't implemented.
+    """
+    latencies = {'compress': array('l'), 'decompress': array('l')}
+    can_decompress = True
+    gc_enabled = gc.isenabled()
+    gc.disable() # as timeit does; collections would land on random messages
+    try:
+      for msg_type, messages in self.corpus:
+        processor = procs[msg_type]
+        processor.reset()
+        share = 0 # of the time taken by prepare_session, per message
+        start = clock.wall_ns()
+        if messages and processor.prepare_session(messages):
+          share = (clock.wall_ns() - start) // len(messages)
+        for hdrs, host in messages:
+          start = clock.wall_ns()
+          compressed = processor.compress(hdrs, host)
+          latencies['compress'].append(clock.wall_ns() - start + share)
+          if can_decompress:
+            try:
+              start = clock.wall_ns()
+              processor.decompress(compressed)
+              latencies['decompress'].append(clock.wall_ns() - start)
+            except NotImplementedError:
+              can_decompress = False
+    finally:
+      if gc_enabled:
+        gc.enable()
+    if not can_decompress:
+      latencies['decompress'] = None
+    return latencies
+
+  def summarise(self, samples):
+    """
+    Summarise the replay() results in samples, one per repetition, for
+    each direction.
+    """
+    results = {}
+    for direction in DIRECTIONS:
+      if samples[0][direction] is None:
+        results[direction] = None
+        continue
+      seconds = [sum(sample[direction]) / 1e9 for sample in samples]
+      msgs_per_sec = RunningStats()
+      for secs in seconds:
+        msgs_per_sec.add(self.num_messages / max(secs, 1e-9))
+      latencies = sorted(
+        [latency for sample in samples for latency in sample[direction]])
+      results[direction] = {
+        'seconds': seconds,
+        'msgs_per_sec': msgs_per_sec.mean,
+        'msgs_per_sec_stdev': msgs_per_sec.stdev(),
+        'mb_per_sec': msgs_per_sec.mean * self.num_bytes /
+                      self.num_messages / 1e6,
+        'latency_us': dict([
+          ('p%d' % pct, percentile(latencies, pct / 100.0) / 1000.0)
+          for pct in [50, 90, 99]]),
+      }
+    return results
+
+  def print_results(self, results):
+    "Print the results of run() as a table."
+    lname = max([len(name) for name in results['codecs']])
+    self.output("* BENCHMARK: %i messages, %.2f MB, %i repetitions\n" %
+                (results['messages'], results['bytes'] / 1e6,
+                 results['repetitions']))
+    self.output('  %%%ds %%-10s    msgs/s   +/-%%%%   MB/s |'
+                '   p50 us   p90 us   p99 us\n' % lname % ('', ''))
+    fmt = '  %%%ds %%-10s %%9.0f %%6.1f %%6.2f | %%8.1f %%8.1f %%8.1f\n' % \
+          lname
+    for name in sorted(results['codecs']):
+      label = name
+      for direction in DIRECTIONS:
+        result = results['codecs'][name][direction]
+        if result is None:
+          continue
+        latency = result['latency_us']
+        self.output(fmt % (label, direction, result['msgs_per_sec'],
+                           100.0 * result['msgs_per_sec_stdev'] /
+                           result['msgs_per_sec'],
+                           result['mb_per_sec'], latency['p50'],
+                           latency['p90'], latency['p99']))
+        label = ''
+    self.output("\n")
+
+
+def write_results(results, filename):
+  "Write the results of Benchmark.run() to filename as JSON."
+  fhandle = open(filename, 'w')
+  try:
+    json.dump(results, fhandle, indent=2, sort_keys=True,
+              separators=(',', ': '))
+    fhandle.write("\n")
+  finally:
+    fhandle.close()
+
+
+def read_results(filename):
+  "Read the results written by write_results() from filename."
+  fhandle = open(filename)
+  try:
+    results = json.load(fhandle)
+  finally:
+    fhandle.close()
+  if results.get('version') != BENCH_VERSION:
+    raise ValueError("%s is not a version %d benchmark result" %
+                     (filename, BENCH_VERSION))
+  return results
+
+
+def check_corpus(baseline, num_messages, num_bytes):
+  """
+  Raise ValueError unless the benchmark results in baseline were run over
+  a corpus of num_messages messages and num_bytes bytes; throughput over
+  a different corpus (e.g., another sample) can't be compared.
+  """
+  if (baseline['messages'], baseline['bytes']) != (num_messages, num_bytes):
+    raise ValueError("the baseline was run over %d messages (%d bytes), "
+                     "not %d (%d bytes); compare runs over the same input "
+                     "and sample" % (baseline['messages'], baseline['bytes'],
+                                     num_messages, num_bytes))
+
+
+def compare_results(baseline, results, threshold, noise=3.0):
+  """
+  Compare the codecs in results to those in baseline, and return a list of
+  (codec, direction, measure, baseline value, value, change, limit) tuples,
+  where change and limit are fractions; a measure has regressed when its
+  change is worse than -limit. Raises ValueError if they were run over
+  different corpora.
+
+  The measures are msgs/s and p50 latency, with changes signed so that
+  negative is slower. The limit is the larger of threshold and noise times
+  the combined standard error of the two runs' mean msgs/s (relative to
+  it), so that codecs which time erratically need a bigger change to be
+  flagged, and more repetitions make for a tighter limit.
+  """
+  check_corpus(baseline, results['messages'], results['bytes'])
+  rows = []
+  for name in sorted(results['codecs']):
+    if name not in baseline['codecs']:
+      continue
+    for direction in DIRECTIONS:
+      old = baseline['codecs'][name][direction]
+      new = results['codecs'][name][direction]
+      if old is None or new is None:
+        continue
+      variation = math.sqrt(
+        (old['msgs_per_sec_stdev'] / old['msgs_per_sec']) ** 2 /
+        baseline['repetitions'] +
+        (new['msgs_per_sec_stdev'] / new['msgs_per_sec']) ** 2 /
+        results['repetitions'])
+      limit = max(threshold, noise * variation)
+      rows.append((name, direction, 'msgs/s', old['msgs_per_sec'],
+                   new['msgs_per_sec'],
+                   new['msgs_per_sec'] / old['msgs_per_sec'] - 1, limit))
+      old_p50 = old['latency_us']['p50']
+      new_p50 = new['latency_us']['p50']
+      rows.append((name, direction, 'p50 us', old_p50, new_p50,
+                   old_p50 / max(new_p50, 1e-9) - 1, limit))
+  return rows
+
+
+def print_comparison(rows, output):
+  """
+  Print the rows returned by compare_results() to output, and return
+  whether any of them regressed.
+  """
+  if not rows:
+    output("* No codecs in common with the baseline.\n\n")
+    return False
+  lname = max([len(row[0]) for row in rows])
+  output("* COMPARED TO BASELINE:\n")
+  output('  %%%ds %%-10s %%-6s %%10s %%10s %%8s %%7s\n' % lname %
+         ('', '', '', 'baseline', 'now', 'change', 'limit'))
+  fmt = '  %%%ds %%-10s %%-6s %%10.1f %%10.1f %%+7.1f%%%% %%6.1f%%%%%%s\n' % lname
+  regressed = False
+  last_name = last_direction = None
+  for name, direction, measure, old, new, change, limit in rows:
+    flag = ''
+    if change < -limit:
+      flag = '  REGRESSED'
+      regressed = True
+    output(fmt % (name if name != last_name else '',
+                  direction if (name, direction) !=
+                               (last_name, last_direction) else '',
+                  measure, old, new, 100 * change, 100 * limit, flag))
+    last_name, last_direction = name, direction
+  output("\n")
+  return regressed
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""
+Tests for comparing benchmark results in bench.py.
+"""
+
+# pylint: disable=W0311
+
+import math
+import unittest
+
+from lib.bench import compare_results
+
+
+def make_results(msgs_per_sec, stdev, repetitions, messages=600,
+                 num_bytes=124549):
+  "Return benchmark results for one codec, 'http2', as Benchmark.run() does."
+  direction = {
+    'msgs_per_sec': msgs_per_sec,
+    'msgs_per_sec_stdev': stdev,
+    'latency_us': {'p50': 1e6 / msgs_per_sec},
+  }
+  return {
+    'messages': messages,
+    'bytes': num_bytes,
+    'repetitions': repetitions,
+    'codecs': {'http2': {'compress': direction, 'decompress': None}},
+  }
+
+
+class TestCompareResults(unittest.TestCase):
+
+  def test_limit_is_standard_error(self):
+    # a coefficient of variation of 10% in both runs
+    for reps in [1, 4, 25]:
+      rows = compare_results(make_results(1000.0, 100.0, reps),
+                             make_results(900.0, 90.0, reps), 0.01)
+      self.assertEqual([row[2] for row in rows], ['msgs/s', 'p50 us'])
+      limit = 3 * math.sqrt(2 * 0.1 ** 2 / reps)
+      for row in rows:
+        self.assertAlmostEqual(row[5], -0.1)
+        self.assertAlmostEqual(row[6], limit)
+    # the threshold is a floor
+    rows = compare_results(make_results(1000.0, 0.0, 5),
+                           make_results(900.0, 0.0, 5), 0.05)
+    self.assertEqual(rows[0][6], 0.05)
+
+  def test_different_corpus(self):
+    baseline = make_results(1000.0, 10.0, 5)
+    for other in [make_results(1000.0, 10.0, 5, messages=599),
+                  make_results(1000.0, 10.0, 5, num_bytes=124548)]:
+      self.assertRaises(ValueError, compare_results, baseline, other, 0.05)
+    self.assertEqual(len(compare_results(baseline, baseline, 0.05)), 2)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+High-resolution clocks for timing codecs.
+
+cpu_ns() returns the CPU time used by this process, and wall_ns() a
+monotonic wall-clock time, both as integer nanoseconds. Only differences
+between readings are meaningful.
+"""
+
+# pylint: disable=W0311
+
+import ctypes
+import ctypes.util
+import resource
+import sys
+import time
+
+try:
+  from time import process_time_ns as cpu_ns, perf_counter_ns as wall_ns
+except ImportError:
+  cpu_ns = wall_ns = None
+
+
+class _Timespec(ctypes.Structure):
+  _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _posix_clock(clock_id):
+  "Return a function reading the clock_gettime() clock clock_id, or None."
+  for name in ['c', 'rt']:
+    path = ctypes.util.find_library(name)
+    if not path:
+      continue
+    try:
+      clock_gettime = ctypes.CDLL(path).clock_gettime
+    except (OSError, AttributeError):
+      continue
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+    spec = _Timespec()
+    ref = ctypes.byref(spec)
+    def read_clock():
+      clock_gettime(clock_id, ref)
+      return spec.tv_sec * 1000000000 + spec.tv_nsec
+    return read_clock
+  return None
+
+
+def _rusage_cpu_ns():
+  usage = resource.getrusage(resource.RUSAGE_SELF)
+  return int((usage.ru_utime + usage.ru_stime) * 1e9)
+
+def _time_wall_ns():
+  return int(time.time() * 1e9)
+
+
+if cpu_ns is None:
+  if sys.platform.startswith('linux'):
+    CLOCK_MONOTONIC, CLOCK_PROCESS_CPUTIME_ID = 1, 2
+    cpu_ns = _posix_clock(CLOCK_PROCESS_CPUTIME_ID)
+    wall_ns = _posix_clock(CLOCK_MONOTONIC)
+  cpu_ns = cpu_ns or _rusage_cpu_ns
+  wall_ns = wall_ns or _time_wall_ns
+
+
+def stamp():
+  "Return the current (cpu, wall) times."
+  return (cpu_ns(), wall_ns())
+
+def since(start):
+  "Return the (cpu, wall) nanoseconds elapsed since the stamp() start."
+  return (cpu_ns() - start[0], wall_ns() - start[1])
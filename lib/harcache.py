@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""
+An on-disk cache of the header dictionaries read from HAR files, so that
+repeated runs over the same corpus don't have to parse and normalise it
+again.
+"""
+
+# pylint: disable=W0311
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+
+from . import harfile
+
+CACHE_MAGIC = "HDRCACHE\x01"
+RECORD_LEN = struct.Struct(">I")
+
+
+def iter_cached_har_file(filename, cache_dir):
+  """
+  Like harfile.iter_har_file, but read from the cache in cache_dir when
+  it has an entry for filename, and fill it in when it doesn't.
+
+  Entries are keyed on the contents of filename, the source of the harfile
+  module and the versions of Python and marshal, so they are invalidated
+  when any of those changes. An entry that can't be read (e.g., as it's
+  corrupt or truncated) is treated as missing, and written again.
+  """
+  path = os.path.join(cache_dir, "%s.hdrs" % cache_key(filename))
+  if os.path.exists(path):
+    messages = read_cache(path)
+    if messages is not None:
+      return iter(messages)
+  return write_cache(path, harfile.iter_har_file(filename))
+
+
+def cache_key(filename):
+  "Return the cache key for filename."
+  digest = hashlib.sha1(harfile_version())
+  digest.update("%s\0%d\0" % (sys.version, marshal.version))
+  fhandle = open(filename, 'rb')
+  try:
+    while True:
+      chunk = fhandle.read(1024 * 1024)
+      if not chunk:
+        break
+      digest.update(chunk)
+  finally:
+    fhandle.close()
+  return digest.hexdigest()
+
+
+_harfile_version = None
+
+def harfile_version():
+  "Return a digest of the source of the harfile module."
+  global _harfile_version
+  if _harfile_version is None:
+    source = os.path.splitext(harfile.__file__)[0] + ".py"
+    fhandle = open(source, 'rb')
+    try:
+      _harfile_version = hashlib.sha1(fhandle.read()).hexdigest()
+    finally:
+      fhandle.close()
+  return _harfile_version
+
+
+def read_cache(path):
+  """
+  Return the list of (request, response) tuples stored in the cache file at
+  path, or None if it can't be read.
+  """
+  try:
+    fhandle = open(path, 'rb')
+    try:
+      cache = mmap.mmap(fhandle.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+      fhandle.close()
+  except (EnvironmentError, ValueError): # ValueError if it's empty
+    return None
+  try:
+    if cache[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+      return None
+    messages = []
+    offset = len(CACHE_MAGIC)
+    while offset < len(cache):
+      if offset + RECORD_LEN.size > len(cache):
+        return None
+      length = RECORD_LEN.unpack_from(cache, offset)[0]
+      offset += RECORD_LEN.size
+      if offset + length > len(cache):
+        return None
+      message = marshal.loads(cache[offset:offset + length])
+      if not isinstance(message, tuple) or len(message) != 2:
+        return None
+      messages.append(message)
+      offset += length
+    return messages
+  except (EOFError, ValueError, TypeError):
+    return None
+  finally:
+    cache.close()
+
+
+def write_cache(path, messages):
+  """
+  Pass through the (request, response) tuples in messages, storing them in
+  a cache file at path. The file only appears once all of them have been
+  stored.
+  """
+  cache_dir = os.path.dirname(path)
+  if cache_dir and not os.path.isdir(cache_dir):
+    os.makedirs(cache_dir)
+  tmp_path = "%s.%d.tmp" % (path, os.getpid())
+  fhandle = open(tmp_path, 'wb')
+  try:
+    fhandle.write(CACHE_MAGIC)
+    for message in messages:
+      record = marshal.dumps(message)
+      fhandle.write(RECORD_LEN.pack(len(record)))
+      fhandle.write(record)
+      yield message
+    fhandle.close()
+    os.rename(tmp_path, path)
+  finally:
+    fhandle.close()
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""
+Tests for the on-disk cache of parsed HAR headers in harcache.py.
+"""
+
+# pylint: disable=W0311
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib import harcache, harfile
+
+
+def make_har(paths):
+  "Return the text of a HAR file with a GET of each of paths."
+  entries = []
+  for path in paths:
+    entries.append({
+      "request": {"method": "GET", "url": "http://example.com%s" % path,
+                  "httpVersion": "HTTP/1.1",
+                  "headers": [{"name": "Accept", "value": "*/*"}]},
+      "response": {"status": 200, "statusText": "OK",
+                   "httpVersion": "HTTP/1.1",
+                   "headers": [{"name": "Content-Length", "value": "0"}]},
+    })
+  return json.dumps({"log": {"entries": entries}})
+
+
+class TestHarCache(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.cache_dir = os.path.join(self.tmpdir, "cache")
+    self.filename = os.path.join(self.tmpdir, "test.har")
+    self.write_har(["/a", "/b?c=d"])
+    self.parses = 0
+    self.iter_har_file = harfile.iter_har_file
+    def counting_iter_har_file(filename):
+      self.parses += 1
+      return self.iter_har_file(filename)
+    harfile.iter_har_file = counting_iter_har_file
+
+  def tearDown(self):
+    harfile.iter_har_file = self.iter_har_file
+    shutil.rmtree(self.tmpdir)
+
+  def write_har(self, paths):
+    fhandle = open(self.filename, 'wb')
+    try:
+      fhandle.write(make_har(paths))
+    finally:
+      fhandle.close()
+
+  def cache_path(self):
+    return os.path.join(self.cache_dir,
+                        "%s.hdrs" % harcache.cache_key(self.filename))
+
+  def read(self):
+    return list(harcache.iter_cached_har_file(self.filename, self.cache_dir))
+
+  def test_miss_then_hit(self):
+    expected = list(self.iter_har_file(self.filename))
+    self.assertEqual(self.read(), expected)
+    self.assertEqual(self.parses, 1)
+    self.assertTrue(os.path.exists(self.cache_path()))
+    self.assertEqual(self.read(), expected)
+    self.assertEqual(self.parses, 1)
+    self.assertEqual(os.listdir(self.cache_dir),
+                     [os.path.basename(self.cache_path())])
+
+  def test_unfinished_read_isnt_stored(self):
+    messages = harcache.iter_cached_har_file(self.filename, self.cache_dir)
+    messages.next()
+    messages.close()
+    self.assertEqual(os.listdir(self.cache_dir), [])
+
+  def test_changed_file_invalidates(self):
+    self.read()
+    old_path = self.cache_path()
+    self.write_har(["/a", "/e"])
+    self.assertNotEqual(self.cache_path(), old_path)
+    self.assertEqual(self.read()[1][0][":path"], "/e")
+    self.assertEqual(self.parses, 2)
+
+  def test_versions_are_in_key(self):
+    key = harcache.cache_key(self.filename)
+    harfile_version = harcache.harfile_version()
+    harcache._harfile_version = "0" * 40
+    try:
+      self.assertNotEqual(harcache.cache_key(self.filename), key)
+    finally:
+      harcache._harfile_version = harfile_version
+    real_sys = harcache.sys
+    class OtherPython(object):
+      version = real_sys.version + " (other)"
+    harcache.sys = OtherPython
+    try:
+      self.assertNotEqual(harcache.cache_key(self.filename), key)
+    finally:
+      harcache.sys = real_sys
+    self.assertEqual(harcache.cache_key(self.filename), key)
+
+  def test_corrupt_files_are_misses(self):
+    expected = self.read()
+    fhandle = open(self.cache_path(), 'rb')
+    good = fhandle.read()
+    fhandle.close()
+    corruptions = [
+      "",  # empty
+      "not a cache file",
+      good[:len(harcache.CACHE_MAGIC) + 2],  # a truncated length
+      good[:-5],  # a truncated record
+      good[:len(harcache.CACHE_MAGIC) + 4] + "\xff" * 20 + good[-5:],
+      harcache.CACHE_MAGIC + harcache.RECORD_LEN.pack(1) + "i",
+    ]
+    for corrupt in corruptions:
+      fhandle = open(self.cache_path(), 'wb')
+      fhandle.write(corrupt)
+      fhandle.close()
+      self.assertEqual(harcache.read_cache(self.cache_path()), None)
+      parses = self.parses
+      self.assertEqual(self.read(), expected)
+      self.assertEqual(self.parses, parses + 1)
+      # and it has been written again
+      self.assertEqual(harcache.read_cache(self.cache_path()), expected)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -17,17 +17,35 @@ from urlparse import urlsplit
 
 def read_har_file(filename):
   "Read filename and return the header dictionaries for it."
-  fhandle = open(filename)
+  request_headers = []
+  response_headers = []
+  for request, response in iter_har_file(filename):
+    request_headers.append(request)
+    response_headers.append(response)
+  return (request_headers, response_headers)
+
+
+def iter_har_file(filename):
+  """
+  Read filename incrementally, yielding a (request, response) tuple of
+  header dictionaries for each entry in it.
+
+  Only one entry is held in memory at a time, and message bodies are
+  skipped over without being kept, so memory use depends upon the size of
+  the largest entry, not that of the file.
+  """
+  fhandle = open(filename, 'rb')
   try:
-    har = json.loads(fhandle.read(), object_hook=encode_strings)
-    # and now lets convert all strings to utf8.
+    for entry in iter_har_entries(fhandle):
+      hdrs = entry2hdrs(entry)
+      if hdrs is not None:
+        yield hdrs
   except Exception as oops:
     sys.stderr.write("Unable to parse %s\n\n" % filename)
-    sys.stderr.write(oops)
+    sys.stderr.write("%s\n" % oops)
     sys.exit(1)
-  finally: 
+  finally:
     fhandle.close()
-  return har2hdrs(har)
 
 
 def har2hdrs(har):
@@ -40,32 +58,42 @@ def har2hdrs(har):
   request_headers = []
   response_headers = []
   for entry in har["log"]["entries"]:
-    request = entry["request"]
-    url = urlsplit(request["url"])
-    if not url.scheme.lower() in ["http", "https"]:
+    hdrs = entry2hdrs(entry)
+    if hdrs is None:
       continue
-    headers = process_headers(request["headers"])
-    headers[":method"] = request["method"].lower()
-    headers[":path"] = url.path
-    if url.query:
-      headers[":path"] += "?%s" % url.query
-    headers[":scheme"] = url.scheme.lower()
-    headers[":version"] = request["httpVersion"]
-    if not ":host" in request_headers:
-      headers[":host"] = re.sub("^[^:]*://([^/]*)/.*$", "\\1", request["url"])
-    request_headers.append(headers)
-
-    response = entry["response"]
-    headers = process_headers(response["headers"])
-    headers[":status"] = re.sub("^([0-9]*).*", "\\1", str(response["status"]))
-    headers[":status-text"] = response["statusText"].strip() or \
-      STATUS_PHRASES.get(headers[':status'], 'unknown')
-    headers[":version"] = response["httpVersion"]
-    response_headers.append(headers)
-
+    request_headers.append(hdrs[0])
+    response_headers.append(hdrs[1])
   return (request_headers, response_headers)
 
 
+def entry2hdrs(entry):
+  """
+  Convert a har entry dictionary to a tuple of header dictionaries for its
+  request and response, or None if it isn't a HTTP exchange.
+  """
+  request = entry["request"]
+  url = urlsplit(request["url"])
+  if not url.scheme.lower() in ["http", "https"]:
+    return None
+  headers = process_headers(request["headers"])
+  headers[":method"] = request["method"].lower()
+  headers[":path"] = url.path
+  if url.query:
+    headers[":path"] += "?%s" % url.query
+  headers[":scheme"] = url.scheme.lower()
+  headers[":version"] = request["httpVersion"]
+  headers[":host"] = re.sub("^[^:]*://([^/]*)/.*$", "\\1", request["url"])
+  request_headers = headers
+
+  response = entry["response"]
+  headers = process_headers(response["headers"])
+  headers[":status"] = re.sub("^([0-9]*).*", "\\1", str(response["status"]))
+  headers[":status-text"] = response["statusText"].strip() or \
+    STATUS_PHRASES.get(headers[':status'], 'unknown')
+  headers[":version"] = response["httpVersion"]
+  return (request_headers, headers)
+
+
 def process_headers(hdrdicts):
   "Take a har header datastructure and return a normalised dictionary."
   out = {}
@@ -99,6 +127,155 @@ def encode_strings(inobj, encoding="latin-1"):
   return retval
 
 
+def iter_har_entries(fhandle, chunk_size=64 * 1024):
+  """
+  Yield the entries of the HAR log in the file object fhandle one at a
+  time, as dictionaries (with strings encoded as per encode_strings).
+
+  The file is read chunk_size bytes at a time. The values of 'text' and
+  'content' members are passed over without being kept, since
+  encode_strings would throw them away anyway.
+  """
+  reader = JsonReader(fhandle, chunk_size)
+  for key in reader.iter_object():
+    if key != 'log':
+      reader.skip_value()
+      continue
+    for log_key in reader.iter_object():
+      if log_key != 'entries':
+        reader.skip_value()
+        continue
+      for _ in reader.iter_array():
+        entry = []
+        reader.read_value(entry)
+        yield json.loads(''.join(entry), object_hook=encode_strings)
+
+
+class JsonReader(object):
+  """
+  A minimal pull parser that walks the raw text of a JSON document as it is
+  read from a file object, copying (or skipping over) values without
+  decoding them.
+  """
+  whitespace = re.compile(r'[ \t\r\n]*')
+  string_body = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*')
+  scalar = re.compile(r'[^ \t\r\n,:\]}]*')
+  skip_keys = ['text', 'content']
+
+  def __init__(self, fhandle, chunk_size):
+    self.fhandle = fhandle
+    self.chunk_size = chunk_size
+    self.buf = ''
+    self.pos = 0
+
+  def fill(self):
+    "Read more of the file into the buffer. Returns False at EOF."
+    chunk = self.fhandle.read(self.chunk_size)
+    if not chunk:
+      return False
+    self.buf = self.buf[self.pos:] + chunk
+    self.pos = 0
+    return True
+
+  def peek(self):
+    "Skip whitespace and return the next character ('' at EOF)."
+    while True:
+      self.pos = self.whitespace.match(self.buf, self.pos).end()
+      if self.pos < len(self.buf):
+        return self.buf[self.pos]
+      if not self.fill():
+        return ''
+
+  def expect(self, char, out=None):
+    "Consume char, which must be next, appending it to out if given."
+    if self.peek() != char:
+      raise ValueError("expected %r at offset %d of buffer" % (char, self.pos))
+    self.pos += 1
+    if out is not None:
+      out.append(char)
+
+  def iter_object(self, out=None):
+    "Consume an object, yielding each of its keys before its value is read."
+    self.expect('{', out)
+    if self.peek() == '}':
+      self.expect('}', out)
+      return
+    while True:
+      key = []
+      self.read_string(key)
+      if out is not None:
+        out.extend(key)
+      self.expect(':', out)
+      yield json.loads(''.join(key))
+      if self.peek() == ',':
+        self.expect(',', out)
+      else:
+        self.expect('}', out)
+        return
+
+  def iter_array(self, out=None):
+    "Consume an array, yielding before each of its elements is read."
+    self.expect('[', out)
+    if self.peek() == ']':
+      self.expect(']', out)
+      return
+    while True:
+      yield
+      if self.peek() == ',':
+        self.expect(',', out)
+      else:
+        self.expect(']', out)
+        return
+
+  def read_value(self, out):
+    """
+    Consume the next value, appending its text to the list out (or just
+    skipping it if out is None).
+    """
+    char = self.peek()
+    if char == '{':
+      for key in self.iter_object(out):
+        if out is not None and key in self.skip_keys:
+          self.skip_value()
+          out.append('null')
+        else:
+          self.read_value(out)
+    elif char == '[':
+      for _ in self.iter_array(out):
+        self.read_value(out)
+    elif char == '"':
+      self.read_string(out)
+    elif char:
+      # a scalar running to the end of the buffer may continue in the file.
+      while self.scalar.match(self.buf, self.pos).end() == len(self.buf):
+        if not self.fill():
+          break
+      end = self.scalar.match(self.buf, self.pos).end()
+      if out is not None:
+        out.append(self.buf[self.pos:end])
+      self.pos = end
+    else:
+      raise ValueError("unexpected end of file")
+
+  def skip_value(self):
+    "Consume the next value without keeping it."
+    self.read_value(None)
+
+  def read_string(self, out):
+    "Consume a string, appending its text (with quotes) to out if given."
+    self.expect('"', out)
+    while True:
+      end = self.string_body.match(self.buf, self.pos).end()
+      if out is not None:
+        out.append(self.buf[self.pos:end])
+      self.pos = end
+      if end < len(self.buf) and self.buf[end] == '"':
+        self.expect('"', out)
+        return
+      if not self.fill():
+        raise ValueError("unterminated string")
+
+
 STATUS_PHRASES = {
   '200': 'OK',
   '201': 'Created',
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""
+Tests for the incremental HAR reader in harfile.py, which should give the
+same headers as parsing the whole file with the json module, however the
+file is split into chunks.
+"""
+
+# pylint: disable=W0311
+
+from cStringIO import StringIO
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from lib.harfile import JsonReader, encode_strings, har2hdrs, \
+  iter_har_entries, read_har_file
+
+
+def make_entry(url, req_headers, status=200, status_text="OK", body=None):
+  "Return a HAR entry for an exchange with url."
+  return {
+    "startedDateTime": "2012-12-11T23:59:59.000Z",
+    "time": 12.5,
+    "request": {
+      "method": "GET",
+      "url": url,
+      "httpVersion": "HTTP/1.1",
+      "headers": [{"name": name, "value": value}
+                  for name, value in req_headers],
+      "postData": {"mimeType": "text/plain", "text": body or ""},
+    },
+    "response": {
+      "status": status,
+      "statusText": status_text,
+      "httpVersion": "HTTP/1.1",
+      "headers": [{"name": "Content-Type", "value": "text/html"},
+                  {"name": "Set-Cookie", "value": "a=1"},
+                  {"name": "Set-Cookie", "value": "b=2"}],
+      "content": {"size": 3, "text": body or "", "encoding": None},
+      "redirectURL": "",
+      "headersSize": -1,
+      "bodySize": 3,
+      "cached": False,
+    },
+  }
+
+
+# Strings with quotes, backslashes and \u escapes, so that chunks end in
+# the middle of them.
+HAR = {
+  "log": {
+    "version": "1.2",
+    "creator": {"name": "test \"creator\"", "version": "1.0"},
+    "pages": [{"id": "page_1", "title": "a [page] {with} \\ \"things\""}],
+    "entries": [
+      make_entry("http://www.example.com/a?b=c",
+                 [("Host", "www.example.com"),
+                  ("User-Agent", u"Mozilla/5.0 (\u00e9t\u00e9) \"quoted\""),
+                  ("Cookie", "x=\\y\\"), ("Cookie", "z=1")],
+                 body=u"<html>\"}]\\\u00ff</html>" * 5),
+      make_entry("data:text/plain,abc", [("Accept", "*/*")]),
+      make_entry("https://example.com/", [("Accept", "*/*")], status=404,
+                 status_text=""),
+    ],
+  },
+  "trailing": [1, 2.5e3, -3, True, False, None, {}, [], ""],
+}
+
+DOC = json.dumps(HAR, indent=1)
+
+
+def old_read(doc):
+  "Return the headers of doc, as parsed with the json module."
+  return har2hdrs(json.loads(doc, object_hook=encode_strings))
+
+
+def new_read(doc, chunk_size):
+  "Return the headers of doc, as parsed incrementally in chunk_size reads."
+  request_headers = []
+  response_headers = []
+  for entry in iter_har_entries(StringIO(doc), chunk_size):
+    hdrs = har2hdrs({"log": {"entries": [entry]}})
+    request_headers.extend(hdrs[0])
+    response_headers.extend(hdrs[1])
+  return (request_headers, response_headers)
+
+
+class TestHarFile(unittest.TestCase):
+
+  def test_matches_json_module(self):
+    expected = old_read(DOC)
+    self.assertEqual(len(expected[0]), 2)  # the data: URL is dropped
+    for chunk_size in range(1, 100) + [1024, 64 * 1024]:
+      self.assertEqual(new_read(DOC, chunk_size), expected,
+                       "chunk_size %d" % chunk_size)
+
+  def test_compact_json(self):
+    # no whitespace, so that chunks end right after each token
+    doc = json.dumps(HAR, separators=(',', ':'))
+    expected = old_read(doc)
+    for chunk_size in range(1, 100):
+      self.assertEqual(new_read(doc, chunk_size), expected)
+
+  def test_escapes(self):
+    requests = new_read(DOC, 1)[0]
+    self.assertEqual(requests[0]["user-agent"],
+                     "Mozilla/5.0 (\xe9t\xe9) \"quoted\"")
+    self.assertEqual(requests[0]["cookie"], "x=\\y\\\0z=1")
+    self.assertEqual(requests[0][":host"], "www.example.com")
+
+  def test_bodies_are_skipped(self):
+    # (encode_strings drops them anyway)
+    entries = list(iter_har_entries(StringIO(DOC), 7))
+    self.assertFalse("content" in entries[0]["response"])
+    self.assertFalse("text" in entries[0]["request"]["postData"])
+    self.assertEqual(entries[0]["request"]["postData"]["mimeType"],
+                     "text/plain")
+
+  def test_read_value_copies_text(self):
+    doc = '  {"a" : [1, "x\\"y", {"b": null}], "c": true}  '
+    for chunk_size in range(1, len(doc) + 2):
+      reader = JsonReader(StringIO(doc), chunk_size)
+      out = []
+      reader.read_value(out)
+      self.assertEqual(json.loads(''.join(out)), json.loads(doc))
+      self.assertEqual(reader.peek(), '')
+
+  def test_truncated(self):
+    # every prefix of the document is an error, wherever it stops
+    for length in range(0, len(DOC), 7):
+      for chunk_size in [3, 64]:
+        self.assertRaises(ValueError, list,
+                          iter_har_entries(StringIO(DOC[:length]), chunk_size))
+
+  def test_malformed(self):
+    docs = [
+      '[]',
+      '{"log" {"entries": []}}',
+      '{"log": {"entries": [{"request": {}} {"request": {}}]}}',
+      '{"log": {"entries": [{"request": {},}]}}',
+      '{"log": {"entries": ["unterminated]}}',
+      '{"log": {"entries": [{"request": tru}]}}',
+      '{"log": {"entries": [}',
+      '{log: {}}',
+    ]
+    for doc in docs:
+      for chunk_size in [1, 4, 1024]:
+        self.assertRaises(ValueError, list,
+                          iter_har_entries(StringIO(doc), chunk_size))
+
+  def test_read_har_file(self):
+    tmpdir = tempfile.mkdtemp()
+    try:
+      filename = os.path.join(tmpdir, "test.har")
+      with open(filename, "wb") as fhandle:
+        fhandle.write(DOC)
+      self.assertEqual(read_har_file(filename), old_read(DOC))
+      # a malformed file is reported, and exits
+      with open(filename, "wb") as fhandle:
+        fhandle.write(DOC[:-10])
+      stderr = sys.stderr
+      sys.stderr = StringIO()
+      try:
+        self.assertRaises(SystemExit, read_har_file, filename)
+        self.assertTrue(sys.stderr.getvalue().startswith("Unable to parse"))
+      finally:
+        sys.stderr = stderr
+    finally:
+      shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+Reading of the input corpus.
+
+Inputs can be HAR files, directories (searched for .har files) or glob
+patterns. Files are parsed in a pool of worker processes, a few ahead of
+the one being used, so that parsing overlaps with compressing what has
+already been read.
+"""
+
+# pylint: disable=W0311
+
+from collections import deque
+import glob
+import marshal
+import multiprocessing
+import os
+import sys
+
+from .harcache import iter_cached_har_file
+from .harfile import iter_har_file
+
+
+def expand_inputs(args):
+  """
+  Return the list of files named by args, in order. Directories are
+  replaced by the .har files under them, and patterns that aren't files
+  by what they match, both sorted.
+  """
+  filenames = []
+  for arg in args:
+    if os.path.isdir(arg):
+      found = []
+      for dirpath, dirnames, files in os.walk(arg):
+        dirnames.sort()
+        found.extend([os.path.join(dirpath, name) for name in sorted(files)
+                      if name.lower().endswith(".har")])
+      filenames.extend(found)
+    elif not os.path.exists(arg) and glob.has_magic(arg):
+      matches = sorted(glob.glob(arg))
+      if not matches:
+        sys.stderr.write("No files match %s\n" % arg)
+        sys.exit(1)
+      filenames.extend(matches)
+    else:
+      filenames.append(arg)
+  return filenames
+
+
+def read_messages(filename, cache_dir=None):
+  "Return an iterator of (request, response) headers in filename."
+  if cache_dir:
+    return iter_cached_har_file(filename, cache_dir)
+  return iter_har_file(filename)
+
+
+def iter_parsed_files(filenames, cache_dir=None, jobs=1, prefetch=4):
+  """
+  Yield (filename, [(request, response), ...]) for each of filenames, in
+  order.
+
+  If jobs is more than one (and there is more than one file), the files
+  are parsed by that many worker processes, with at most prefetch of them
+  parsed but not yet yielded at any time, to bound memory use.
+  """
+  if jobs <= 1 or len(filenames) <= 1:
+    for filename in filenames:
+      yield filename, list(read_messages(filename, cache_dir))
+    return
+  pool = multiprocessing.Pool(jobs)
+  try:
+    queued = deque() # (filename, AsyncResult), in order
+    todo = iter(filenames)
+    while True:
+      for filename in todo:
+        queued.append((filename, pool.apply_async(_parse_file,
+                                                  (filename, cache_dir))))
+        if len(queued) >= max(prefetch, 1):
+          break
+      if not queued:
+        break
+      filename, result = queued.popleft()
+      messages, exit_code = result.get()
+      if messages is None:
+        sys.exit(exit_code)
+      yield filename, marshal.loads(messages)
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+
+
+def _parse_file(filename, cache_dir):
+  """
+  Parse filename in a pool worker, returning its messages marshalled (as
+  that is much quicker to send back than pickling them), and an exit code.
+  """
+  try:
+    return marshal.dumps(list(read_messages(filename, cache_dir))), None
+  except SystemExit as why:
+    # exiting here would leave the pool waiting forever; let the parent do it.
+    sys.stderr.flush()
+    return None, why.code
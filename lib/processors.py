@@ -3,9 +3,14 @@
 from collections import defaultdict
 from copy import copy
 from importlib import import_module
+from itertools import islice
+import multiprocessing
+from multiprocessing.util import Finalize
 import os
 import sys
 from compressor import format_http1
+from lib import clock
+from lib.profiling import CodecProfiler
 
 # pylint: disable=W0311
 
@@ -42,7 +47,23 @@ class Processors(object):
     self.msg_types = msg_types
     self.output = output
     self.warned = {'http1_gzip': True}  # procs with no decompress support
+    # where warnings are written; pool workers pass theirs to the parent
+    # instead, so that they're only written once
+    self.warn_output = sys.stderr.write
     self.processors = self.get_processors(options.processor_names)
+    self.lookahead = max([p.lookahead for procs in self.processors.values()
+                          for p in procs])
+    self.prepared = {} # session id to {processor name: per-message time}
+    self.shares = {} # the same, for the session being processed
+    self.worker_counters = {} # pool worker's pid to its counters()
+    self.verify_mode = options.verify.split(':')[0]
+    self.verifier = None
+    if self.verify_mode == 'async':
+      self.verifier = AsyncVerifier(options, msg_types)
+    self.profiler = None
+    if options.profile is not None:
+      self.profiler = CodecProfiler(
+        self, [name for name in options.profile.split(',') if name])
 
   def get_processors(self, processor_names):
     """
@@ -63,24 +84,113 @@ class Processors(object):
       procs['res'].append(module.Processor(self.options, False, params))
     return procs
 
-  def process_session(self, session):
+  def process_sessions(self, sessions, jobs, session_done=None):
+    """
+    Process the sessions across a pool of 'jobs' worker processes. Sessions
+    are independent, so each is sent whole to a worker; the largest are
+    scheduled first so that one big stream doesn't hold up the end of the
+    run. Results are copied back onto the sessions, and session_done (if
+    given) is called with each in their original order, as soon as it and
+    those before it are done.
+    """
+    ready = set()
+    next_idx = 0
+    order = sorted(range(len(sessions)),
+                   key=lambda i: sessions[i].num_messages, reverse=True)
+    pool = multiprocessing.Pool(jobs, _init_worker,
+                                (self.options, self.msg_types))
+    try:
+      work = ((idx, sessions[idx]) for idx in order)
+      for idx, results, exit_code, worker in pool.imap_unordered(
+          _process_session, work):
+        if results is None:
+          sys.exit(exit_code)
+        pid, counters, warned = worker
+        self.worker_counters[pid] = counters
+        for name in warned:
+          self.warn_unchecked(name)
+        sessions[idx].set_results(results)
+        sessions[idx].release_messages()
+        ready.add(idx)
+        while next_idx in ready:
+          ready.remove(next_idx)
+          if session_done:
+            session_done(sessions[next_idx])
+          next_idx += 1
+      pool.close()
+    except:
+      pool.terminate()
+      raise
+    finally:
+      pool.join()
+
+  def process_session(self, session, session_idx=0, upcoming=()):
     """
     Process the messages in the session with all processors, and record
-    results.
+    results. session_idx is the session's position in the input, which
+    decides whether it is verified when sampling. upcoming is an iterable
+    of the sessions that will be processed after this one, in order, for
+    processors that can prepare them ahead of time.
     """
     msg_idx = 0
-    msg_tot = len(session.messages)
-    self.processors = self.get_processors(self.options.processor_names)
+    msg_tot = session.num_messages
+    verify = self.should_verify(session_idx)
+    self.reset()
+    if verify and self.verifier:
+      self.verifier.reset()
+    self.prepare_session(session, 0)
+    if self.lookahead:
+      later = (s for s in upcoming if s.msg_type == session.msg_type)
+      for distance, later_session in enumerate(
+          islice(later, self.lookahead), 1):
+        self.prepare_session(later_session, distance)
+    self.shares = self.prepared.pop(id(session))
     for (hdrs, host) in session.messages:
       msg_idx += 1
       results = self.process_message(hdrs, session.msg_type,
-                                     host, msg_idx, msg_tot)
+                                     host, msg_idx, msg_tot, verify)
       for proc_name, resu in results.items():
         if proc_name == self.options.baseline:
           ratio = 1.0
         else:
           ratio = 1.0 * resu['size'] / results[self.options.baseline]['size']
-        session.record_result(proc_name, resu['size'], ratio, resu['time'])
+        session.record_result(proc_name, resu['size'], ratio,
+                              resu['timings'], resu['context'])
+    session.release_messages()
+
+  def prepare_session(self, session, distance):
+    """
+    Let the processors for the session's messages prepare them in bulk,
+    sharing the time that takes between the messages. distance is how
+    many sessions ahead of the one being processed this is; processors
+    are only asked if their lookahead allows, and only once.
+    """
+    prepared = self.prepared.setdefault(id(session), {})
+    messages = None
+    for processor in self.processors[session.msg_type]:
+      if processor.name in prepared or processor.lookahead < distance:
+        continue
+      if messages is None:
+        messages = [(Processors.filter_headers(hdrs), host)
+                    for (hdrs, host) in session.messages]
+      prepared[processor.name] = None
+      start = clock.stamp()
+      if messages and processor.prepare_session(messages):
+        cpu, wall = clock.since(start)
+        prepared[processor.name] = (cpu // len(messages),
+                                    wall // len(messages))
+
+  def should_verify(self, session_idx):
+    """
+    Return whether the decompressed messages in the session at session_idx
+    should be checked, according to the --verify option. Sessions are
+    sampled whole, because decompressing a message needs the ones before.
+    """
+    if self.verify_mode == 'off':
+      return False
+    if self.verify_mode == 'sample':
+      return session_idx % int(self.options.verify.split(':')[1]) == 0
+    return True
 
   @staticmethod
   def filter_headers(hdrs):
@@ -95,7 +205,8 @@ class Processors(object):
       new_hdrs[k] = v
     return new_hdrs
 
-  def process_message(self, hdrs, msg_type, host, msg_idx, msg_tot):
+  def process_message(self, hdrs, msg_type, host, msg_idx, msg_tot,
+                      verify=True):
     """
     message is a HTTP header dictionary in the format described in
     compression.BaseProcessor.
@@ -104,12 +215,16 @@ class Processors(object):
 
     host is the host header of the associated request.
 
+    verify is whether to check that the message decompresses correctly;
+    it is sent to the verifier process to do so when there is one.
+
     Returns a dictionary of processor names mapped to their results.
     """
     if self.options.verbose > 3:
       self.output('#' * 80)
       self.output('\n')
     results = {}
+    frames = []
     for processor in self.processors[msg_type]:
       if self.options.verbose >= 3:
         self.output("# %s %s %d (of %d) for %s\n" %
@@ -118,46 +233,116 @@ class Processors(object):
              msg_idx,
              msg_tot,
              host))
-      start_time = sum(os.times()[:2])
       filtered_hdrs = Processors.filter_headers(hdrs)
 
+      start = clock.stamp()
       compressed = processor.compress(filtered_hdrs, host)
+      timings = {'compress': clock.since(start)}
+      if self.shares.get(processor.name):
+        cpu, wall = timings['compress']
+        cpu_share, wall_share = self.shares[processor.name]
+        timings['compress'] = (cpu + cpu_share, wall + wall_share)
       results[processor.name] = {
         'size': len(compressed),
-        'time': sum(os.times()[:2]) - start_time
+        'timings': timings,
+        'context': (processor.context_bytes(), processor.context_entries())
       }
 
-      decompressed = None
-      try:
-        decompressed = processor.decompress(compressed)
-      except NotImplementedError:
-        if processor.name not in self.warned.keys():
-          sys.stderr.write(
-            "  WARNING: %s decompression not checked.\n" % processor.name
-          )
-          self.warned[processor.name] = True
-        continue
-      if self.options.verbose > 3:
-        if decompressed is not None:
-          txt = format_http1(decompressed)
-        else:
-          txt = unicode(compressed, 'utf-8', 'replace') \
-                .encode('utf-8', 'replace')
-        self.output("%s" % txt)
-        if not txt or txt[-1] != "\n":
-          self.output("\n\n")
-      compare_result = self.compare_headers(filtered_hdrs, "orig",
-                                            decompressed, processor.name)
-      if compare_result:
-        self.output('  - mismatch in %s' % processor.name)
-        if self.options.verbose > 1:
-          self.output(':\n' + compare_result + "\n")
-        self.output("\n")
-        if self.options.debug:
-            sys.exit(1)
+      if verify and self.verifier:
+        frames.append((processor.name, compressed))
+      elif verify:
+        timings.update(self.verify_message(processor, filtered_hdrs,
+                                           compressed, host, msg_idx))
+    if frames:
+      self.verifier.verify(msg_type, filtered_hdrs, frames, host, msg_idx)
     return results
 
+  def verify_message(self, processor, filtered_hdrs, compressed, host,
+                     msg_idx):
+    """
+    Decompress a message that processor compressed, and report it if it
+    doesn't match filtered_hdrs. Returns the (cpu, wall) time taken by
+    the decompress and verify phases, for those that were run.
+    """
+    timings = {}
+    decompressed = None
+    try:
+      start = clock.stamp()
+      decompressed = processor.decompress(compressed)
+      timings['decompress'] = clock.since(start)
+    except NotImplementedError:
+      self.warn_unchecked(processor.name)
+      return timings
+    if self.options.verbose > 3:
+      if decompressed is not None:
+        txt = format_http1(decompressed)
+      else:
+        txt = unicode(compressed, 'utf-8', 'replace') \
+              .encode('utf-8', 'replace')
+      self.output("%s" % txt)
+      if not txt or txt[-1] != "\n":
+        self.output("\n\n")
+    start = clock.stamp()
+    compare_result = self.compare_headers(filtered_hdrs, "orig",
+                                          decompressed, processor.name)
+    timings['verify'] = clock.since(start)
+    if compare_result:
+      self.output('  - mismatch in %s (message %d for %s)' %
+                  (processor.name, msg_idx, host))
+      if self.options.verbose > 1:
+        self.output(':\n' + compare_result + "\n")
+      self.output("\n")
+      if self.options.debug:
+          sys.exit(1)
+    return timings
+
+  def warn_unchecked(self, name):
+    "Warn (once) that the processor name's decompression isn't checked."
+    if name in self.warned:
+      return
+    self.warned[name] = True
+    if self.warn_output:
+      self.warn_output("  WARNING: %s decompression not checked.\n" % name)
+
+  def reset(self):
+    "Give every processor a fresh context, ready for a new session."
+    for processor_kind in self.processors.values():
+      for processor in processor_kind:
+        processor.reset()
+
+  def counters(self):
+    """
+    Return a dictionary of (msg_type, processor name) to the totals of
+    the processor's counters(), including those of any pool workers.
+    """
+    totals = defaultdict(dict)
+    sources = [dict([((msg_type, processor.name), processor.counters())
+                     for msg_type, procs in self.processors.items()
+                     for processor in procs])]
+    sources.extend(self.worker_counters.values())
+    for counters in sources:
+      for key, proc_counters in counters.items():
+        for name, count in proc_counters.items():
+          totals[key][name] = totals[key].get(name, 0) + count
+    return dict(totals)
+
+  def print_counters(self, msg_type, output):
+    "Print the counters() of the processors for msg_type to output, if any."
+    counters = self.counters()
+    procs = self.processors[msg_type]
+    lname = max([len(p.name) for p in procs])
+    lines = []
+    for processor in procs:
+      proc_counters = counters.get((msg_type, processor.name))
+      if proc_counters:
+        lines.append("  %*s %s\n" % (lname, processor.name, "  ".join(
+          ["%s: %d" % item for item in sorted(proc_counters.items())])))
+    if lines:
+      output("".join(lines) + "\n")
+
   def done(self):
+    if self.verifier:
+      self.verifier.done()
     for processor_kind in self.processors.values():
       for processor in processor_kind:
         try:
@@ -191,3 +376,102 @@ class Processors(object):
       for b_item in compare_result['b_only']:
         retval.append("\t%s: %s" % (b_item[0], b_item[1]))
     return '\n'.join(retval)
+
+
+class AsyncVerifier(object):
+  """
+  Checks that messages decompress correctly in a separate process, so that
+  doing so doesn't add to the time taken by compression. The process has
+  its own processors, which are sent the compressed frames along with the
+  original headers over a pipe; its buffer bounds how far behind the
+  process can get.
+  """
+  def __init__(self, options, msg_types):
+    reader, self.conn = multiprocessing.Pipe(False)
+    sys.stdout.flush() # or the process would repeat anything buffered
+    self.process = multiprocessing.Process(target=_verify_frames,
+                                           args=(options, msg_types, reader))
+    self.process.start()
+    reader.close()
+
+  def reset(self):
+    "Start a new session, resetting the verifier's processors."
+    self.send(('reset',))
+
+  def verify(self, msg_type, filtered_hdrs, frames, host, msg_idx):
+    """
+    Check that frames, a list of (processor name, compressed message),
+    decompress to filtered_hdrs.
+    """
+    self.send(('verify', msg_type, filtered_hdrs, frames, host, msg_idx))
+
+  def done(self):
+    "Wait for verification to finish, exiting if it failed."
+    self.send(('done',))
+    self.conn.close()
+    self.process.join()
+    if self.process.exitcode:
+      sys.exit(self.process.exitcode)
+
+  def send(self, item):
+    "Send item to the verifier process, exiting if it has stopped."
+    try:
+      self.conn.send(item)
+    except IOError:
+      # e.g., it stopped on a mismatch in debug mode
+      self.process.join()
+      sys.exit(self.process.exitcode or 1)
+
+
+def _verify_frames(options, msg_types, conn):
+  "Verify the frames sent by an AsyncVerifier, until it is done."
+  options = copy(options)
+  options.verify = 'all'
+  options.profile = None
+  processors = Processors(options, msg_types, sys.stdout.write)
+  by_name = dict([(msg_type, dict([(p.name, p) for p in procs]))
+                  for msg_type, procs in processors.processors.items()])
+  try:
+    while True:
+      try:
+        item = conn.recv()
+      except EOFError:
+        break
+      if item[0] == 'done':
+        break
+      elif item[0] == 'reset':
+        processors.reset()
+      else:
+        msg_type, filtered_hdrs, frames, host, msg_idx = item[1:]
+        for name, compressed in frames:
+          processors.verify_message(by_name[msg_type][name], filtered_hdrs,
+                                    compressed, host, msg_idx)
+  finally:
+    processors.done()
+    sys.stdout.flush()
+
+
+_worker_processors = None
+
+def _init_worker(options, msg_types):
+  "Set up the processors used by a session pool worker."
+  global _worker_processors
+  _worker_processors = Processors(options, msg_types, sys.stdout.write)
+  _worker_processors.warn_output = None # see process_sessions()
+  # e.g., fork's children; the worker exits without returning to any code
+  # of ours.
+  Finalize(None, _worker_processors.done, exitpriority=10)
+
+def _process_session(work):
+  "Process one session in a pool worker and return its results."
+  idx, session = work
+  try:
+    _worker_processors.process_session(session, idx)
+  except SystemExit as why:
+    # exiting here would leave the pool waiting forever; let the parent do it.
+    sys.stdout.flush()
+    return idx, None, why.code, None
+  sys.stdout.flush()
+  return idx, session.results(), None, (os.getpid(),
+                                        _worker_processors.counters(),
+                                        _worker_processors.warned.keys())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+Profiling of codecs.
+
+Each selected processor's compress() and decompress() methods are run
+under a profiler of their own, so that the time they take can be put down
+to the functions they call, without those of other codecs (or of the test
+harness) getting in the way.
+"""
+
+# pylint: disable=W0311
+
+import cProfile
+import pstats
+import re
+import StringIO
+
+DIRECTIONS = ['compress', 'decompress']
+
+
+class CodecProfiler(object):
+  """
+  Profiles the processors in a Processors object whose module name or full
+  name (e.g., 'delta2' or 'delta2 (buffer=8)') is in names; if names is
+  empty, all of them are.
+  """
+  def __init__(self, processors, names):
+    self.profiles = [] # (codec name, msg_type, direction, cProfile.Profile)
+    for msg_type in processors.msg_types:
+      for processor in processors.processors[msg_type]:
+        module_name = processor.name.split(" ")[0]
+        if names and not (module_name in names or processor.name in names):
+          continue
+        for direction in DIRECTIONS:
+          profile = cProfile.Profile()
+          self.profiles.append((processor.name, msg_type, direction, profile))
+          setattr(processor, direction,
+                  profiled(profile, getattr(processor, direction)))
+
+  def dump(self, prefix):
+    """
+    Write the statistics of each profile that was used to a .pstats file,
+    and return a list of the filenames.
+    """
+    filenames = []
+    for name, msg_type, direction, profile in self.profiles:
+      if not self.was_used(profile):
+        continue
+      filename = "%sprofile.%s.%s.%s.pstats" % (
+        prefix, re.sub(r"[^\w.=-]+", "_", name).strip("_"), msg_type,
+        direction)
+      profile.dump_stats(filename)
+      filenames.append(filename)
+    return filenames
+
+  def print_stats(self, output, top):
+    "Print the top functions in each profile by cumulative time."
+    for name, msg_type, direction, profile in self.profiles:
+      if not self.was_used(profile):
+        continue
+      stream = StringIO.StringIO()
+      stats = pstats.Stats(profile, stream=stream)
+      stats.sort_stats('cumulative').print_stats(top)
+      lines = stream.getvalue().strip("\n").split("\n")
+      output("* PROFILE: %s %s %s\n" % (name, msg_type, direction))
+      output("".join([("  %s" % line).rstrip() + "\n" for line in lines]))
+      output("\n")
+
+  @staticmethod
+  def was_used(profile):
+    "Return whether profile recorded anything."
+    profile.create_stats()
+    return bool(profile.stats)
+
+
+def profiled(profile, method):
+  "Return a function calling method under profile."
+  def call(*args, **kwargs):
+    return profile.runcall(method, *args, **kwargs)
+  return call
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+Sampling of streams, for quick runs over part of a corpus.
+
+Whole streams are sampled, since their messages share a compression
+context. So that the sample is representative, streams are stratified by
+direction and by size (in powers of two of messages), and each stratum is
+sampled evenly in input order; there is no randomness, so the same input
+always gives the same sample.
+"""
+
+# pylint: disable=W0311
+
+from collections import defaultdict
+
+
+class StreamSampler(object):
+  """
+  Selects either a fraction of the streams in each stratum, or a total
+  number of streams, shared between the strata in proportion to their size.
+
+  With a fraction, streams can be passed to select() in several batches
+  (e.g., one per input file); with a number, they must all be passed at
+  once, as needs_all says.
+  """
+  def __init__(self, fraction=None, count=None):
+    self.fraction = fraction
+    self.count = count
+    self.needs_all = count is not None
+    self.seen = defaultdict(int) # stratum to streams seen
+    self.streams = [0, 0] # streams seen, selected
+    self.messages = [0, 0] # the same, in messages
+
+  @staticmethod
+  def stratum(session):
+    "Return the stratum that session belongs to."
+    return (session.msg_type, session.num_messages.bit_length())
+
+  def select(self, sessions):
+    "Return the sample of sessions (a list of Streams), in their order."
+    if self.count is not None:
+      selected = self.select_count(sessions)
+    else:
+      selected = self.select_fraction(sessions)
+    self.streams[0] += len(sessions)
+    self.streams[1] += len(selected)
+    self.messages[0] += sum([session.num_messages for session in sessions])
+    self.messages[1] += sum([session.num_messages for session in selected])
+    return selected
+
+  def select_fraction(self, sessions):
+    """
+    Select every 1/fraction'th stream of each stratum, starting with the
+    first, so that even small strata are represented.
+    """
+    selected = []
+    for session in sessions:
+      stratum = self.stratum(session)
+      seen = self.seen[stratum]
+      if seen == 0 or int(seen * self.fraction) > \
+                      int((seen - 1) * self.fraction):
+        selected.append(session)
+      self.seen[stratum] = seen + 1
+    return selected
+
+  def select_count(self, sessions):
+    """
+    Select count streams, allocated to strata in proportion to their size
+    (by largest remainder), and evenly spaced within each.
+    """
+    strata = defaultdict(list) # stratum to indices into sessions
+    for idx, session in enumerate(sessions):
+      strata[self.stratum(session)].append(idx)
+    count = min(self.count, len(sessions))
+    shares = []
+    for stratum, members in sorted(strata.items()):
+      share = 1.0 * count * len(members) / len(sessions)
+      shares.append([int(share), share - int(share), stratum])
+    left = count - sum([share[0] for share in shares])
+    for share in sorted(shares, key=lambda share: -share[1])[:left]:
+      share[0] += 1
+    chosen = set()
+    for allocated, _, stratum in shares:
+      members = strata[stratum]
+      for i in xrange(allocated):
+        chosen.add(members[int((i + 0.5) * len(members) / allocated)])
+    return [session for idx, session in enumerate(sessions) if idx in chosen]
+
+  def print_summary(self, output):
+    "Print how much of the input was sampled to output."
+    output("* SAMPLE: %i of %i streams, %i of %i messages\n\n" %
+           (self.streams[1], self.streams[0],
+            self.messages[1], self.messages[0]))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+Tests for the stream sampling in sampling.py (--sample and
+--sample-streams).
+"""
+
+# pylint: disable=W0311
+
+import math
+import random
+import unittest
+
+from lib.sampling import StreamSampler
+from lib.stream import Stream
+
+
+def make_sessions(seed, count):
+  "Return count Streams of random directions and sizes."
+  rand = random.Random(seed)
+  return [Stream("s%d" % idx, [None] * int(2 ** rand.uniform(0, 10)),
+                 rand.choice(['req', 'res']), ['http1'])
+          for idx in xrange(count)]
+
+
+def by_stratum(sessions):
+  "Return a dictionary of stratum to the sessions in it, in order."
+  strata = {}
+  for session in sessions:
+    strata.setdefault(StreamSampler.stratum(session), []).append(session)
+  return strata
+
+
+class TestStreamSampler(unittest.TestCase):
+
+  def check_in_order(self, selected, sessions):
+    "Check that selected is a subsequence of sessions, without repeats."
+    positions = [sessions.index(session) for session in selected]
+    self.assertEqual(positions, sorted(set(positions)))
+
+  def test_deterministic(self):
+    sessions = make_sessions(0, 300)
+    for fraction, count in [(0.1, None), (0.5, None), (None, 7),
+                            (None, 100)]:
+      first = StreamSampler(fraction, count).select(sessions)
+      again = StreamSampler(fraction, count).select(list(sessions))
+      self.assertEqual(first, again)
+
+  def test_fraction(self):
+    sessions = make_sessions(1, 500)
+    strata = by_stratum(sessions)
+    for fraction in [0.01, 0.1, 0.25, 0.5, 1.0]:
+      sampler = StreamSampler(fraction)
+      selected = sampler.select(sessions)
+      self.check_in_order(selected, sessions)
+      # every stratum gets its share, rounded up, starting with its first
+      for stratum, members in by_stratum(selected).items():
+        self.assertEqual(len(members),
+                         int(math.ceil(len(strata[stratum]) * fraction)))
+        self.assertTrue(members[0] is strata[stratum][0])
+      self.assertEqual(set(by_stratum(selected)), set(strata))
+      self.assertEqual(sampler.streams, [len(sessions), len(selected)])
+      self.assertEqual(sampler.messages,
+                       [sum([s.num_messages for s in sessions]),
+                        sum([s.num_messages for s in selected])])
+
+  def test_fraction_in_batches(self):
+    # one batch per input file gives the same sample as all at once
+    sessions = make_sessions(2, 400)
+    whole = StreamSampler(0.2).select(sessions)
+    sampler = StreamSampler(0.2)
+    batched = []
+    for start in xrange(0, len(sessions), 37):
+      batched.extend(sampler.select(sessions[start:start + 37]))
+    self.assertEqual(batched, whole)
+    self.assertEqual(sampler.streams, [len(sessions), len(whole)])
+
+  def test_count(self):
+    sessions = make_sessions(3, 500)
+    strata = by_stratum(sessions)
+    for count in [1, 5, 50, 499, 500, 1000]:
+      sampler = StreamSampler(count=count)
+      self.assertTrue(sampler.needs_all)
+      selected = sampler.select(sessions)
+      self.check_in_order(selected, sessions)
+      self.assertEqual(len(selected), min(count, len(sessions)))
+      # each stratum's share is in proportion to its size
+      for stratum, members in by_stratum(selected).items():
+        share = 1.0 * len(selected) * len(strata[stratum]) / len(sessions)
+        self.assertTrue(abs(len(members) - share) < 1, (stratum, count))
+
+  def test_empty(self):
+    for sampler in [StreamSampler(0.5), StreamSampler(count=10)]:
+      self.assertEqual(sampler.select([]), [])
+      self.assertEqual(sampler.streams, [0, 0])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+"""
+Summary statistics over result columns (arrays of per-message values).
+
+The TOTAL streams of a large corpus hold millions of values per column, so
+these use NumPy when it is available, viewing the arrays in place; if it
+isn't, they fall back to pure Python, with the same results (but for the
+rounding of sums of floats). stats_test.py checks this where NumPy is
+installed.
+"""
+
+# pylint: disable=W0311
+
+import array
+import math
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
+def percentile(ordered, fraction):
+  """
+  Return the nearest-rank percentile of the sorted list 'ordered', where
+  'fraction' is between 0 and 1; e.g., 0.9 for the 90th percentile.
+  """
+  if not ordered:
+    return 0
+  rank = int(math.ceil(fraction * len(ordered)))
+  return ordered[max(rank, 1) - 1]
+
+
+def as_numpy(values):
+  "Return an ndarray sharing the memory of the array.array values."
+  return numpy.frombuffer(values, dtype=numpy.dtype(values.typecode))
+
+
+def total(values):
+  "Return the sum of the array values."
+  if numpy is not None and len(values):
+    return as_numpy(values).sum().item()
+  return sum(values)
+
+
+def percentiles(values, fractions):
+  """
+  Return a list of the nearest-rank percentiles of the array values, for
+  each of fractions (each between 0 and 1); 0 for each if it is empty.
+  """
+  if not len(values):
+    return [0 for _ in fractions]
+  if numpy is None:
+    ordered = sorted(values)
+    return [percentile(ordered, fraction) for fraction in fractions]
+  ranks = [max(int(numpy.ceil(fraction * len(values))), 1) - 1
+           for fraction in fractions]
+  # a partial sort puts each of the ranks in its place, in linear time
+  parted = numpy.partition(as_numpy(values), sorted(set(ranks)))
+  return [parted[rank].item() for rank in ranks]
+
+
+def histogram(values, width=None, unit=1):
+  """
+  Return a histogram of the array values, each divided by unit, as a list
+  of (low, high, count) for each bin up to the highest non-empty one. With
+  width, bins are that wide, starting from zero; otherwise, they are
+  powers of two (the first holding values below 1, then 1, then 2-3, 4-7
+  and so on). Values must not be negative.
+  """
+  return histogram_bins(bin_counts(values, width, unit), width)
+
+
+def bin_counts(values, width=None, unit=1):
+  """
+  Return the counts of the array values in each of the bins of histogram()
+  (with the same arguments), as a list.
+  """
+  if not len(values):
+    return []
+  if numpy is not None:
+    array = as_numpy(values) / float(unit)
+    if width:
+      bins = (array / width).astype(numpy.int64)
+    else:
+      bins = numpy.frexp(numpy.floor(array))[1] # x < 2 ** e
+    return numpy.bincount(bins).tolist()
+  counts = []
+  for value in values:
+    value /= float(unit)
+    if width:
+      idx = int(value / width)
+    else:
+      idx = int(value).bit_length()
+    if idx >= len(counts):
+      counts.extend([0] * (idx + 1 - len(counts)))
+    counts[idx] += 1
+  return counts
+
+
+def add_counts(counts, more):
+  "Add the bin counts in the list more to those in the list counts."
+  if len(more) > len(counts):
+    counts.extend([0] * (len(more) - len(counts)))
+  for idx, count in enumerate(more):
+    counts[idx] += count
+
+
+def histogram_bins(counts, width=None):
+  "Return the histogram() for a list of bin_counts()."
+  bins = []
+  for idx, count in enumerate(counts):
+    if width:
+      bins.append((idx * width, (idx + 1) * width, count))
+    elif idx == 0:
+      bins.append((0, 1, count))
+    else:
+      bins.append((1 << (idx - 1), 1 << idx, count))
+  return bins
+
+
+ZERO_KEY = -(1 << 40) # Distribution's bucket for zero, below the others
+
+
+class Distribution(object):
+  """
+  A series of numbers (which must not be negative) that percentiles can be
+  read from, in bounded memory.
+
+  The first max_values of them are kept as they are, and percentiles are
+  exact. Past that, they are counted in buckets 1 / 2 ** precision of their
+  magnitude wide, so that memory depends on their range rather than on how
+  many there are, and percentiles are within half of that (0.4%) of the
+  exact ones. Distributions can be merged.
+  """
+  max_values = 10000
+  precision = 7
+
+  def __init__(self, typecode='d'):
+    self.values = array.array(typecode) # or None, once in buckets
+    self.buckets = None # bucket key to count
+    self.count = 0
+
+  def extend(self, values):
+    "Add the array values to the series."
+    if self.values is not None:
+      if len(self.values) + len(values) <= self.max_values:
+        self.values.extend(values)
+        self.count += len(values)
+        return
+      self.to_buckets()
+    self.add_to_buckets(values)
+    self.count += len(values)
+
+  def merge(self, other):
+    "Add the series in the Distribution other to this one."
+    if other.values is not None:
+      self.extend(other.values)
+      return
+    self.to_buckets()
+    for key, count in other.buckets.iteritems():
+      self.buckets[key] = self.buckets.get(key, 0) + count
+    self.count += other.count
+
+  def percentiles(self, fractions):
+    """
+    Return a list of the nearest-rank percentiles of the series, for each
+    of fractions (each between 0 and 1); 0 for each if it is empty.
+    """
+    if self.values is not None:
+      return percentiles(self.values, fractions)
+    ranks = [max(int(math.ceil(fraction * self.count)), 1)
+             for fraction in fractions]
+    results = {}
+    seen = 0
+    for key in sorted(self.buckets):
+      seen += self.buckets[key]
+      for rank in ranks:
+        if rank <= seen and rank not in results:
+          results[rank] = self.bucket_value(key)
+      if len(results) == len(set(ranks)):
+        break
+    return [results[rank] for rank in ranks]
+
+  def to_buckets(self):
+    "Move the values kept so far into buckets."
+    if self.buckets is None:
+      self.buckets = {}
+      self.add_to_buckets(self.values)
+      self.values = None
+
+  def add_to_buckets(self, values):
+    "Count the array values in buckets."
+    if not len(values):
+      return
+    buckets = self.buckets
+    if numpy is not None:
+      keys, counts = numpy.unique(self.bucket_keys(as_numpy(values)),
+                                  return_counts=True)
+      for key, count in zip(keys.tolist(), counts.tolist()):
+        buckets[key] = buckets.get(key, 0) + count
+      return
+    precision = self.precision
+    for value in values:
+      if value > 0:
+        mantissa, exponent = math.frexp(value)
+        key = (exponent << precision) + \
+              int((mantissa * 2 - 1) * (1 << precision))
+      else:
+        key = ZERO_KEY
+      buckets[key] = buckets.get(key, 0) + 1
+
+  def bucket_keys(self, ndarray):
+    "Return the bucket keys of the values in ndarray."
+    mantissas, exponents = numpy.frexp(ndarray.astype(numpy.float64))
+    keys = (exponents.astype(numpy.int64) << self.precision) + \
+           ((mantissas * 2 - 1) * (1 << self.precision)).astype(numpy.int64)
+    keys[ndarray <= 0] = ZERO_KEY
+    return keys
+
+  def bucket_value(self, key):
+    "Return the value in the middle of the bucket with key."
+    if key == ZERO_KEY:
+      return 0
+    exponent = key >> self.precision
+    step = key & ((1 << self.precision) - 1)
+    return math.ldexp(1 + (step + 0.5) / (1 << self.precision),
+                      exponent - 1)
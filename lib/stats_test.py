@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""
+Tests for the summary statistics in stats.py.
+"""
+
+# pylint: disable=W0311
+
+from array import array
+import random
+import unittest
+
+from lib import stats
+from lib.stats import Distribution, add_counts, bin_counts, histogram, \
+  histogram_bins, percentiles
+
+FRACTIONS = [0, 0.01, 0.5, 0.9, 0.99, 1]
+
+
+def random_values(rand, count):
+  "Return an array of count values over a wide range, with some zeros."
+  return array('d', [rand.choice([0, rand.random(), rand.expovariate(1e-4)])
+                     for _ in xrange(count)])
+
+
+class TestDistribution(unittest.TestCase):
+
+  def test_exact_until_max_values(self):
+    rand = random.Random(1)
+    dist = Distribution()
+    values = array('d')
+    while len(values) < Distribution.max_values:
+      more = random_values(rand, rand.randint(0, 1000))
+      more = more[:Distribution.max_values - len(values)]
+      dist.extend(more)
+      values.extend(more)
+      self.assertEqual(dist.percentiles(FRACTIONS),
+                       percentiles(values, FRACTIONS))
+    self.assertEqual(dist.count, Distribution.max_values)
+
+  def test_bounded_and_close(self):
+    rand = random.Random(2)
+    dist = Distribution()
+    values = array('d')
+    for _ in range(30):
+      more = random_values(rand, 1000)
+      dist.extend(more)
+      values.extend(more)
+    self.assertEqual(dist.values, None)
+    self.assertEqual(dist.count, len(values))
+    # the buckets depend on the values' range, not their number
+    self.assertTrue(len(dist.buckets) < len(values) / 3)
+    precision = 0.5 ** (Distribution.precision + 1)
+    for estimate, exact in zip(dist.percentiles(FRACTIONS),
+                               percentiles(values, FRACTIONS)):
+      self.assertTrue(abs(estimate - exact) <= exact * precision,
+                      (estimate, exact))
+
+  def test_integers(self):
+    dist = Distribution('l')
+    values = array('l', range(Distribution.max_values * 2))
+    dist.extend(values)
+    estimates = dist.percentiles([0, 0.5, 1])
+    self.assertEqual(estimates[0], 0)
+    for estimate, exact in zip(estimates[1:], [9999, 19999]):
+      self.assertAlmostEqual(estimate, exact, delta=exact / 256.0)
+
+  def test_merge(self):
+    rand = random.Random(3)
+    for sizes in [(10, 20), (10, 20000), (20000, 10), (20000, 20000)]:
+      first, second, both = Distribution(), Distribution(), Distribution()
+      for dist, size in zip([first, second], sizes):
+        values = random_values(rand, size)
+        dist.extend(values)
+        both.extend(values)
+      first.merge(second)
+      self.assertEqual(first.count, sum(sizes))
+      self.assertEqual(first.percentiles(FRACTIONS),
+                       both.percentiles(FRACTIONS))
+
+  def test_empty(self):
+    self.assertEqual(Distribution().percentiles([0.5, 0.9]), [0, 0])
+
+
+class TestHistogram(unittest.TestCase):
+
+  def test_bins(self):
+    values = array('d', [0, 0.5, 1, 1.5, 2, 3.9, 4, 9])
+    self.assertEqual(histogram(values),
+                     [(0, 1, 2), (1, 2, 2), (2, 4, 2), (4, 8, 1), (8, 16, 1)])
+    self.assertEqual(histogram(values, 2),
+                     [(0, 2, 4), (2, 4, 2), (4, 6, 1), (6, 8, 0),
+                      (8, 10, 1)])
+    self.assertEqual(histogram(array('l', [999, 1000, 5000]), unit=1000),
+                     [(0, 1, 1), (1, 2, 1), (2, 4, 0), (4, 8, 1)])
+    self.assertEqual(histogram(array('d')), [])
+
+  def test_add_counts(self):
+    values = array('d', [0.1, 0.7, 0.3, 0.25, 0.05])
+    counts = []
+    for idx in range(len(values)):
+      add_counts(counts, bin_counts(values[idx:idx + 1], 0.05))
+    self.assertEqual(histogram_bins(counts, 0.05), histogram(values, 0.05))
+
+
+@unittest.skipIf(stats.numpy is None, "NumPy isn't installed")
+class TestNumpy(unittest.TestCase):
+  """
+  The NumPy and pure-Python paths should give the same results; run these
+  where NumPy is installed.
+  """
+
+  def setUp(self):
+    self.numpy = stats.numpy
+
+  def tearDown(self):
+    stats.numpy = self.numpy
+
+  def both(self, func, *args):
+    "Return the results of func(*args) with NumPy, and without it."
+    stats.numpy = self.numpy
+    with_numpy = func(*args)
+    stats.numpy = None
+    without = func(*args)
+    stats.numpy = self.numpy
+    return with_numpy, without
+
+  def assertSame(self, func, *args):
+    with_numpy, without = self.both(func, *args)
+    self.assertEqual(with_numpy, without)
+    # e.g., numpy.float64 would print differently
+    self.assertEqual(map(type, with_numpy) if isinstance(with_numpy, list)
+                     else type(with_numpy),
+                     map(type, without) if isinstance(without, list)
+                     else type(without))
+
+  def test_functions(self):
+    rand = random.Random(4)
+    floats = random_values(rand, 5000)
+    ints = array('l', [int(value) for value in floats])
+    for values in [floats, ints, floats[:1], ints[:0]]:
+      if values.typecode == 'd':
+        # NumPy sums in pairs, so the last bits can differ
+        with_numpy, without = self.both(stats.total, values)
+        self.assertAlmostEqual(with_numpy, without,
+                               delta=abs(without) * 1e-12)
+      else:
+        self.assertSame(stats.total, values)
+      self.assertSame(percentiles, values, FRACTIONS)
+      self.assertSame(bin_counts, values)
+      self.assertSame(bin_counts, values, 2000)
+      self.assertSame(bin_counts, values, None, 1000)
+    ratios = array('d', [rand.random() * 2 for _ in xrange(5000)])
+    self.assertSame(bin_counts, ratios, 0.05)
+    self.assertSame(histogram, ratios, 0.05)
+
+  def test_distribution(self):
+    rand = random.Random(5)
+    values = random_values(rand, 12000)
+    ints = array('l', [int(value) for value in values])
+    def read(values, typecode):
+      dist = Distribution(typecode)
+      dist.extend(values)
+      return dist.buckets, dist.percentiles(FRACTIONS)
+    self.assertSame(read, values, 'd')
+    self.assertSame(read, ints, 'l')
+
+
+if __name__ == "__main__":
+  unittest.main()
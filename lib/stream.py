@@ -1,7 +1,15 @@
 #!/usr/bin/env python
 
-from collections import defaultdict
+from array import array
+from itertools import izip
+import json
 import locale
+import math
+from operator import itemgetter
+import random
+
+from .stats import Distribution, add_counts, bin_counts, histogram_bins, \
+  percentile, percentiles, total
 
 # pylint: disable=W0311
 
@@ -13,105 +21,456 @@ class Stream(object):
   For our purposes, a stream is the unit that gets compressed; i.e., the
   headers in it have a shared context.
   """
+  phases = ['compress', 'decompress', 'verify']
+  bootstrap_reps = 1000 # resamples for the ratio's confidence interval
+  ratio_width = 0.05 # of the bins of the ratio histograms
+
   def __init__(self, name, messages, msg_type, procs):
     self.name = name # identifier for the stream; e.g., "example.com reqs"
-    self.messages = messages
+    self.messages = messages # released by release_messages()
+    self.num_messages = len(messages)
     self.msg_type = msg_type # "req" or "res"
     self.procs = procs # order of processors
     self.lname = max([len(p) for p in procs]) # longest processor name
-    self.sizes = defaultdict(list)
-    self.ratios = defaultdict(list)
-    self.times = defaultdict(list)
+    # The results; made by _ensure_columns() when the first is recorded.
+    self.sizes = None
+    self.ratios = None
+    self.ratio_stats = None
+    self.times = None
+    self.cpu_times = None
+    self.wall_times = None
+    self.context_bytes = None
+    self.context_entries = None
+    self.stream_sizes = None # of each stream added to this
+    if not messages:
+      # nothing will be recorded, but it can be added to, or printed.
+      self._ensure_columns()
+
+  def _ensure_columns(self):
+    """
+    Make the result columns that haven't been made yet. A streamifier can
+    make hundreds of thousands of streams, which wait to be processed, so
+    they aren't made up front.
+    """
+    procs = self.procs
+    if self.sizes is None:
+      self.sizes = columns(procs, 'l')
+      self.ratios = columns(procs, 'd')
+      self.times = columns(procs, 'd')
+      self.cpu_times = dict([(p, columns(procs, 'l')) for p in self.phases])
+      self.wall_times = dict([(p, columns(procs, 'l')) for p in self.phases])
+    if self.ratio_stats is None:
+      self.ratio_stats = dict([(p, RunningStats()) for p in procs])
+      self.context_bytes = dict([(p, RunningStats()) for p in procs])
+      self.context_entries = dict([(p, RunningStats()) for p in procs])
+    if self.stream_sizes is None:
+      self.stream_sizes = columns(procs, 'l')
+
+  def release_results(self):
+    """
+    Drop the per-message results, once they've been written out and added
+    to a total, to save memory. They're made again if more are recorded.
+    """
+    self.sizes = None
+    self.ratios = None
+    self.times = None
+    self.cpu_times = None
+    self.wall_times = None
 
-  def record_result(self, proc_name, size, ratio, time):
-    "Record the results of processing, by proc_name."
+  def release_messages(self):
+    """
+    Drop the stream's headers once they've been processed, to save memory;
+    the results and num_messages are kept.
+    """
+    self.messages = None
+
+  def record_result(self, proc_name, size, ratio, timings,
+                    context=(None, None)):
+    """
+    Record the results of processing, by proc_name. 'timings' maps each
+    phase that was run to a tuple of (cpu, wall) nanoseconds, and
+    'context' is the processor's (context_bytes, context_entries) after
+    the message; either is None if the processor doesn't say.
+    """
+    if self.sizes is None:
+      self._ensure_columns()
     self.sizes[proc_name].append(size)
     self.ratios[proc_name].append(ratio)
-    self.times[proc_name].append(time)
+    self.ratio_stats[proc_name].add(ratio)
+    self.times[proc_name].append(timings['compress'][0] / 1e9)
+    for phase in self.phases:
+      cpu, wall = timings.get(phase, (0, 0))
+      self.cpu_times[phase][proc_name].append(cpu)
+      self.wall_times[phase][proc_name].append(wall)
+    ctx_bytes, ctx_entries = context
+    if ctx_bytes is not None:
+      self.context_bytes[proc_name].add(ctx_bytes)
+    if ctx_entries is not None:
+      self.context_entries[proc_name].add(ctx_entries)
+
+  def results(self):
+    "Return the results recorded so far, in a form taken by set_results."
+    return (self.sizes, self.ratios, self.ratio_stats, self.times,
+            self.cpu_times, self.wall_times, self.context_bytes,
+            self.context_entries)
+
+  def set_results(self, results):
+    "Replace the recorded results with those from results()."
+    (self.sizes, self.ratios, self.ratio_stats, self.times,
+     self.cpu_times, self.wall_times, self.context_bytes,
+     self.context_entries) = results
+    self._ensure_columns()
 
   def print_header(self, output):
     "Print a header for the summary to output."
     output("* %s: %i %s messages\n" %
-      (self.name, len(self.messages), self.msg_type))
+      (self.name, self.num_messages, self.msg_type))
 
-  def print_summary(self, output, baseline):
-    "Print a summary of the stream to output, compared to baseline."
+  def print_summary(self, output, baseline, intervals=False):
+    """
+    Print a summary of the stream to output, compared to baseline. If
+    intervals is true, include 95% confidence intervals for the ratios;
+    see ratio_intervals().
+    """
     lines = []
-    baseline_size = sum(self.sizes[baseline])
+    baseline_size = self.total_size(baseline)
+    if intervals:
+      ratio_intervals = self.ratio_intervals(baseline)
     for proc in self.procs:
-      ttl_size = sum(self.sizes[proc])
-      ttl_time = sum(self.times[proc])
+      ttl_size = self.total_size(proc)
+      ttl_time = self.total_time(proc)
       pretty_size = locale.format("%13d", ttl_size, grouping=True)
       ratio = 1.0 * ttl_size / baseline_size
-      try:
-        std = meanstdv(self.ratios[proc])[1]
-      except ZeroDivisionError:
-        std = 0
-      min_ratio = min(self.ratios[proc])
-      max_ratio = max(self.ratios[proc])
-      lines.append((proc, pretty_size, ttl_time, ratio, min_ratio, max_ratio, std))
-    output('  %%%ds size  time | ratio min   max   std\n' % (self.lname + 9) % '')
-    fmt = '  %%%ds %%s %%5.2f | %%2.2f  %%2.2f  %%2.2f  %%2.2f\n' % self.lname
+      stats = self.ratio_stats[proc]
+      ctx_bytes = self.context_bytes[proc]
+      ctx_entries = self.context_entries[proc]
+      lines.append((proc, pretty_size, ttl_time,
+                    format_stat(ctx_bytes.count, ctx_bytes.max),
+                    format_stat(ctx_bytes.count, ctx_bytes.mean),
+                    format_stat(ctx_entries.count, ctx_entries.max),
+                    ratio, stats.min, stats.max, stats.stdev()) +
+                   tuple(self.ratio_percentiles(proc, [0.5, 0.9, 0.99])))
+      if intervals:
+        lines[-1] += ratio_intervals[proc]
+    header = '  %%%ds size  time  ctx max ctx mean entries | ' \
+             'ratio min   max   std   p50   p90   p99' % (self.lname + 9) % ''
+    fmt = '  %%%ds %%s %%5.2f %%8s %%8s %%7s | ' \
+          '%%2.2f  %%2.2f  %%2.2f  %%2.2f  %%2.2f  %%2.2f  %%2.2f' % self.lname
+    if intervals:
+      header += '  95% ci'
+      fmt += '  %2.2f-%2.2f'
+    output(header + "\n")
+    fmt += "\n"
     for line in lines:
       output(fmt % line)
     output("\n")
 
+  def ratio_intervals(self, baseline, confidence=0.95):
+    """
+    Return a dictionary of processor name to a (low, high) bootstrap
+    confidence interval for the ratio of its total size to baseline's.
+    Streams, not messages, are resampled, as those are what is sampled,
+    and their messages aren't independent.
+    """
+    num_streams = len(self.stream_sizes[baseline])
+    if num_streams < 2: # nothing to resample
+      baseline_size = max(sum(self.stream_sizes[baseline]), 1)
+      return dict([(proc, (1.0 * sum(self.stream_sizes[proc]) /
+                           baseline_size,) * 2) for proc in self.procs])
+    ratios = dict([(proc, []) for proc in self.procs])
+    rand = random.Random(0).random # seeded, so that runs are repeatable
+    for _ in xrange(self.bootstrap_reps):
+      pick = itemgetter(*[int(rand() * num_streams)
+                          for _ in xrange(num_streams)])
+      baseline_size = max(sum(pick(self.stream_sizes[baseline])), 1)
+      for proc in self.procs:
+        ratios[proc].append(1.0 * sum(pick(self.stream_sizes[proc])) /
+                            baseline_size)
+    tail = (1 - confidence) / 2
+    intervals = {}
+    for proc, proc_ratios in ratios.items():
+      proc_ratios.sort()
+      intervals[proc] = (percentile(proc_ratios, tail),
+                         percentile(proc_ratios, 1 - tail))
+    return intervals
+
+  def print_timings(self, output):
+    """
+    Print the total CPU and wall time that each processor took in each
+    phase, along with percentiles of the per-message CPU time.
+    """
+    output('  %%%ds %%-10s   cpu ms  wall ms |  p50 us  p90 us  p99 us\n' %
+           self.lname % ('', ''))
+    fmt = '  %%%ds %%-10s %%8.2f %%8.2f | %%7d %%7d %%7d\n' % self.lname
+    for proc in self.procs:
+      name = proc
+      for phase in self.phases:
+        output(fmt % ((name, phase,
+                       self.cpu_total(phase, proc) / 1e6,
+                       self.wall_total(phase, proc) / 1e6) +
+                      tuple([value / 1000 for value in
+                             self.cpu_percentiles(phase, proc,
+                                                  [0.5, 0.9, 0.99])])))
+        name = ''
+    output("\n")
+
+  def histograms(self):
+    """
+    Return a list of (processor, measure, low, high, count) for the bins
+    of histograms of each processor's per-message compression ratios (in
+    bins ratio_width wide) and compress CPU times (in microseconds, in
+    bins of powers of two).
+    """
+    rows = []
+    for proc in self.procs:
+      for low, high, count in histogram_bins(self.ratio_bin_counts(proc),
+                                             self.ratio_width):
+        rows.append((proc, 'ratio', low, high, count))
+      for low, high, count in histogram_bins(self.compress_bin_counts(proc)):
+        rows.append((proc, 'compress_us', low, high, count))
+    return rows
+
+  # What the summary, timings and histograms report, for each processor;
+  # TotalStream keeps these rather than the per-message results.
+
+  def total_size(self, proc):
+    return total(self.sizes[proc])
+
+  def total_time(self, proc):
+    return total(self.times[proc])
+
+  def ratio_percentiles(self, proc, fractions):
+    return percentiles(self.ratios[proc], fractions)
+
+  def cpu_total(self, phase, proc):
+    return total(self.cpu_times[phase][proc])
+
+  def wall_total(self, phase, proc):
+    return total(self.wall_times[phase][proc])
+
+  def cpu_percentiles(self, phase, proc, fractions):
+    return percentiles(self.cpu_times[phase][proc], fractions)
+
+  def ratio_bin_counts(self, proc):
+    return bin_counts(self.ratios[proc], self.ratio_width)
+
+  def compress_bin_counts(self, proc):
+    return bin_counts(self.cpu_times['compress'][proc], unit=1000)
+
+  def tsv_columns(self):
+    "Return a list of (name, per-message values) for TSV output."
+    columns = [(proc, self.sizes[proc]) for proc in self.procs]
+    for proc in self.procs:
+      for phase in self.phases:
+        columns.append(("%s %s cpu_ns" % (proc, phase),
+                        self.cpu_times[phase][proc]))
+        columns.append(("%s %s wall_ns" % (proc, phase),
+                        self.wall_times[phase][proc]))
+    return columns
+
   def print_tsv_header(self, output):
     "Print a TSV header to output."
-    header = "\t".join(["num", "name"] + self.procs)
+    names = [name for name, _ in self.tsv_columns()]
+    header = "\t".join(["num", "name"] + names)
     output("%s\n" % header)
 
   def print_tsv(self, output, count=0):
     "Print the stream as TSV to output, using count as a counter."
-    lines = apply(zip, [self.sizes[proc] for proc in self.procs])
+    lines = izip(*[values for _, values in self.tsv_columns()])
     for line in lines:
       count += 1
       output("\t".join([str(count), self.name] + [str(j) for j in line]))
       output("\n")
     return count
 
-  def __add__(self, other):
+  def print_ndjson(self, output, count=0):
+    """
+    Print the stream to output as newline-delimited JSON, with an object
+    for each message, using count as a counter.
+    """
+    for idx in xrange(len(self.sizes[self.procs[0]])):
+      count += 1
+      record = {
+        'num': count,
+        'name': self.name,
+        'msg_type': self.msg_type,
+        'sizes': dict([(proc, self.sizes[proc][idx]) for proc in self.procs]),
+        'cpu_ns': dict([(phase, dict([(proc, times[proc][idx])
+                                      for proc in self.procs]))
+                        for phase, times in self.cpu_times.items()]),
+        'wall_ns': dict([(phase, dict([(proc, times[proc][idx])
+                                       for proc in self.procs]))
+                         for phase, times in self.wall_times.items()]),
+      }
+      output(json.dumps(record, sort_keys=True))
+      output("\n")
+    return count
+
+  def __iadd__(self, other):
+    """
+    Add the results of other to this stream, in place. Only the result
+    columns are copied; the messages themselves aren't, so summing the
+    sessions into a total is linear in the number of messages.
+    """
     assert self.msg_type == other.msg_type
-    new = Stream('', self.messages, self.msg_type, self.procs)
-    new.messages.extend(other.messages) # NB: not great for memory
-    new.sizes = merge_dols(self.sizes, other.sizes)
-    new.ratios = merge_dols(self.ratios, other.ratios)
-    new.times = merge_dols(self.times, other.times)
-    new.procs = self.procs
-    new.lname = self.lname
+    self.num_messages += other.num_messages
+    merged = len(other.stream_sizes[self.procs[0]]) > 0
+    for proc in self.procs:
+      if merged:
+        self.stream_sizes[proc].extend(other.stream_sizes[proc])
+      elif other.num_messages:
+        self.stream_sizes[proc].append(sum(other.sizes[proc]))
+      self.sizes[proc].extend(other.sizes[proc])
+      self.ratios[proc].extend(other.ratios[proc])
+      self.ratio_stats[proc].merge(other.ratio_stats[proc])
+      self.context_bytes[proc].merge(other.context_bytes[proc])
+      self.context_entries[proc].merge(other.context_entries[proc])
+      self.times[proc].extend(other.times[proc])
+      for phase in self.phases:
+        self.cpu_times[phase][proc].extend(other.cpu_times[phase][proc])
+        self.wall_times[phase][proc].extend(other.wall_times[phase][proc])
+    return self
+
+  def __add__(self, other):
+    new = Stream('', [], self.msg_type, self.procs)
+    new += self
+    new += other
     return new
-    
+
   def __radd__(self, other):
-    new = Stream('', self.messages, self.msg_type, self.procs)
-    new.sizes = self.sizes
-    new.ratios = self.ratios
-    new.times = self.times
-    new.procs = self.procs
-    new.lname = self.lname
+    new = Stream('', [], self.msg_type, self.procs)
+    new += self
     return new
 
 
-def merge_dols(dol1, dol2):
+class TotalStream(Stream):
   """
-  Merge two dictionaries of lists.
+  The total of the streams added to it with +=, for the summary, timings
+  and histograms of a whole run.
+
+  Rather than every message's results, it keeps only what those report:
+  the sums, the histograms' counts, the size of each stream (for the
+  confidence intervals) and Distributions for the percentiles, so that
+  its memory doesn't grow with the number of messages.
   """
-  result = dict(dol1, **dol2)
-  result.update((k, dol1[k] + dol2[k])
-                for k in set(dol1).intersection(dol2))
-  return result
-    
-def meanstdv(members):
+  def __init__(self, name, msg_type, procs):
+    Stream.__init__(self, name, [], msg_type, procs)
+    def phase_dict(make):
+      return dict([(phase, dict([(p, make()) for p in procs]))
+                   for phase in self.phases])
+    self.size_totals = dict([(p, 0) for p in procs])
+    self.time_totals = dict([(p, 0.0) for p in procs])
+    self.cpu_totals = phase_dict(int)
+    self.wall_totals = phase_dict(int)
+    self.ratio_dists = dict([(p, Distribution('d')) for p in procs])
+    self.cpu_dists = phase_dict(lambda: Distribution('l'))
+    self.ratio_bins = dict([(p, []) for p in procs])
+    self.compress_bins = dict([(p, []) for p in procs])
+
+  def __iadd__(self, other):
+    """
+    Add the results of the stream other (which must have its per-message
+    results) to the total.
+    """
+    assert self.msg_type == other.msg_type
+    self.num_messages += other.num_messages
+    for proc in self.procs:
+      if other.num_messages:
+        self.stream_sizes[proc].append(other.total_size(proc))
+      self.size_totals[proc] += other.total_size(proc)
+      self.time_totals[proc] += other.total_time(proc)
+      self.ratio_dists[proc].extend(other.ratios[proc])
+      self.ratio_stats[proc].merge(other.ratio_stats[proc])
+      self.context_bytes[proc].merge(other.context_bytes[proc])
+      self.context_entries[proc].merge(other.context_entries[proc])
+      add_counts(self.ratio_bins[proc], other.ratio_bin_counts(proc))
+      add_counts(self.compress_bins[proc], other.compress_bin_counts(proc))
+      for phase in self.phases:
+        self.cpu_totals[phase][proc] += other.cpu_total(phase, proc)
+        self.wall_totals[phase][proc] += other.wall_total(phase, proc)
+        self.cpu_dists[phase][proc].extend(other.cpu_times[phase][proc])
+    return self
+
+  def total_size(self, proc):
+    return self.size_totals[proc]
+
+  def total_time(self, proc):
+    return self.time_totals[proc]
+
+  def ratio_percentiles(self, proc, fractions):
+    return self.ratio_dists[proc].percentiles(fractions)
+
+  def cpu_total(self, phase, proc):
+    return self.cpu_totals[phase][proc]
+
+  def wall_total(self, phase, proc):
+    return self.wall_totals[phase][proc]
+
+  def cpu_percentiles(self, phase, proc, fractions):
+    return self.cpu_dists[phase][proc].percentiles(fractions)
+
+  def ratio_bin_counts(self, proc):
+    return self.ratio_bins[proc]
+
+  def compress_bin_counts(self, proc):
+    return self.compress_bins[proc]
+
+
+class RunningStats(object):
   """
-  Calculate mean and standard deviation of data x[]:
-      mean = {\sum_i x_i \over n}
-      std = sqrt(\sum_i (x_i - mean)^2 \over n-1)
+  The count, mean, variance, minimum and maximum of a series of numbers,
+  computed in a single pass with Welford's method, so that the series
+  doesn't need to be kept. Stats for two series can be merged.
   """
-  from math import sqrt
-  num, mean, std = len(members), 0, 0
-  for item in members:
-    mean = mean + item
-  mean = mean / float(num)
-  for item in members:
-    std = std + (item - mean)**2
-  std = sqrt(std / float(num - 1))
-  return mean, std
\ No newline at end of file
+  def __init__(self):
+    self.count = 0
+    self.mean = 0.0
+    self.m2 = 0.0 # sum of squared differences from the mean
+    self.min = 0.0
+    self.max = 0.0
+
+  def add(self, value):
+    "Add value to the series."
+    if self.count == 0:
+      self.min = self.max = value
+    else:
+      self.min = min(self.min, value)
+      self.max = max(self.max, value)
+    self.count += 1
+    delta = value - self.mean
+    self.mean += delta / self.count
+    self.m2 += delta * (value - self.mean)
+
+  def merge(self, other):
+    "Add the series summarised by other to this one."
+    if other.count == 0:
+      return
+    if self.count == 0:
+      self.min, self.max = other.min, other.max
+    else:
+      self.min = min(self.min, other.min)
+      self.max = max(self.max, other.max)
+    count = self.count + other.count
+    delta = other.mean - self.mean
+    self.mean += delta * other.count / count
+    self.m2 += other.m2 + delta * delta * self.count * other.count / count
+    self.count = count
+
+  def stdev(self):
+    "Return the sample standard deviation; 0 if there are fewer than two."
+    if self.count < 2:
+      return 0.0
+    return math.sqrt(self.m2 / (self.count - 1))
+
+
+def columns(procs, typecode):
+  """
+  Return a dictionary of empty arrays of typecode, one for each of procs.
+  """
+  return dict([(proc, array(typecode)) for proc in procs])
+
+def format_stat(count, value):
+  "Format value as a whole number, or '-' if there were no samples of it."
+  if not count:
+    return '-'
+  return '%d' % value
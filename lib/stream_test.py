@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""
+Tests for TotalStream in stream.py, which should report the same summary,
+timings and histograms as a Stream holding every message's results.
+"""
+
+# pylint: disable=W0311
+
+from cStringIO import StringIO
+import random
+import unittest
+
+from lib.stream import Stream, TotalStream
+
+PROCS = ['base', 'other']
+
+
+def make_session(rand, name, count):
+  "Return a Stream of count messages with random results."
+  stream = Stream(name, [None] * count, 'req', PROCS)
+  for _ in xrange(count):
+    size = rand.randint(100, 1000)
+    for proc in PROCS:
+      proc_size = size if proc == 'base' else rand.randint(10, size)
+      timings = dict([(phase, (rand.randint(0, 100000),
+                               rand.randint(0, 100000)))
+                      for phase in Stream.phases])
+      stream.record_result(proc, proc_size, 1.0 * proc_size / size, timings,
+                           (rand.randint(0, 4096), rand.randint(0, 64)))
+  return stream
+
+
+def report(stream):
+  "Return the summary, timings and histograms of stream."
+  out = StringIO()
+  stream.print_header(out.write)
+  stream.print_summary(out.write, 'base', True)
+  stream.print_timings(out.write)
+  return out.getvalue(), stream.histograms()
+
+
+class TestTotalStream(unittest.TestCase):
+
+  def add_sessions(self, counts):
+    "Return a TotalStream and a Stream, each the sum of sessions."
+    rand = random.Random(len(counts))
+    total = TotalStream("TOTAL", 'req', PROCS)
+    everything = Stream("TOTAL", [], 'req', PROCS)
+    for idx, count in enumerate(counts):
+      session = make_session(rand, "session %d" % idx, count)
+      everything += session
+      total += session
+      session.release_results()
+    return total, everything
+
+  def test_matches_stream(self):
+    total, everything = self.add_sessions([5, 0, 1, 40, 17])
+    self.assertEqual(total.num_messages, everything.num_messages)
+    self.assertEqual(report(total), report(everything))
+
+  def test_no_messages_kept(self):
+    total, everything = self.add_sessions([3000] * 4)
+    self.assertEqual(len(total.sizes['base']), 0)
+    self.assertEqual(len(total.ratios['base']), 0)
+    self.assertEqual(len(total.stream_sizes['base']), 4)
+    self.assertEqual(total.total_size('other'),
+                     everything.total_size('other'))
+    self.assertEqual(total.histograms(), everything.histograms())
+    # the percentiles are estimated, once there are enough messages
+    for proc in PROCS:
+      estimates = total.ratio_percentiles(proc, [0.5, 0.9, 0.99])
+      exact = everything.ratio_percentiles(proc, [0.5, 0.9, 0.99])
+      for estimate, value in zip(estimates, exact):
+        self.assertAlmostEqual(estimate, value, delta=value / 256.0)
+
+
+class TestStream(unittest.TestCase):
+
+  def test_columns_made_when_used(self):
+    rand = random.Random(0)
+    stream = Stream("session", [None] * 3, 'req', PROCS)
+    self.assertEqual(stream.sizes, None)
+    self.assertEqual(stream.ratio_stats, None)
+    recorded = make_session(rand, "session", 3)
+    self.assertEqual(len(recorded.sizes['other']), 3)
+    # a copy of the results, as from a pool worker
+    stream.set_results(recorded.results())
+    self.assertEqual(report(stream), report(recorded))
+    self.assertEqual(len(stream.stream_sizes['base']), 0)
+    recorded.release_results()
+    self.assertEqual(recorded.sizes, None)
+    self.assertEqual(recorded.ratio_stats['base'].count, 3)
+    # streams without messages can still be printed, and added to
+    empty = Stream("empty", [], 'req', PROCS)
+    out = StringIO()
+    empty.print_tsv_header(out.write)
+    self.assertTrue(out.getvalue().startswith("num\tname\tbase\tother\t"))
+    self.assertEqual(empty.histograms(), [])
+    empty += stream
+    self.assertEqual(empty.total_size('other'), stream.total_size('other'))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-from collections import defaultdict
+from collections import OrderedDict
 
 from . import BaseStreamifier, Stream
 
@@ -16,18 +16,18 @@ class Streamifier(BaseStreamifier):
     Given a list of messages (each a req, res tuple), return a list of
     Stream objects.
     """
-    reqs = defaultdict(list)
-    ress = defaultdict(list)
-    hosts = []
+    streams = OrderedDict() # host to (reqs, ress), in order of appearance
     for req, res in messages:
       host = req[':host'].lower().strip()
-      if host not in hosts:
-        hosts.append(host)
-      reqs[host].append((req, host))
-      ress[host].append((res, host))
+      try:
+        reqs, ress = streams[host]
+      except KeyError:
+        reqs, ress = streams[host] = ([], [])
+      reqs.append((req, host))
+      ress.append((res, host))
 
-    streams = []
-    for host in hosts:
-      streams.append(Stream(host, reqs[host], 'req', self.procs))
-      streams.append(Stream(host, ress[host], 'res', self.procs))
-    return streams
\ No newline at end of file
+    streams_list = []
+    for host, (reqs, ress) in streams.items():
+      streams_list.append(Stream(host, reqs, 'req', self.procs))
+      streams_list.append(Stream(host, ress, 'res', self.procs))
+    return streams_list
@@ -1,38 +1,62 @@
 #!/usr/bin/env python
 
-from collections import defaultdict
+from collections import OrderedDict
 
 from . import BaseStreamifier, Stream
 
 from publicsuffix import PublicSuffixList
 
+_psl = None
+
+def public_suffix_list():
+  "Return the PublicSuffixList, loading it the first time."
+  global _psl
+  if _psl is None:
+    _psl = PublicSuffixList()
+  return _psl
+
 class Streamifier(BaseStreamifier):
   """
   Use the Public Suffix List <http://publicsuffix.org> to split the messages
   into streams, one per direction per suffix.
   """
+  max_memo = 50000 # hosts whose suffix is remembered
+
   def __init__(self, procs):
     BaseStreamifier.__init__(self, procs)
-    self.psl = PublicSuffixList()
+    self.psl = public_suffix_list()
+    self.memo = {} # host header to suffix
+
+  def get_suffix(self, host):
+    "Return the public suffix of the host header host."
+    try:
+      return self.memo[host]
+    except KeyError:
+      pass
+    if len(self.memo) >= self.max_memo:
+      self.memo.clear()
+    suffix = self.memo[host] = \
+      self.psl.get_public_suffix(host.split(":", 1)[0])
+    return suffix
 
   def streamify(self, messages):
     """
     Given a list of messages (each a req, res tuple), return a list of
     Stream objects.
     """
-    reqs = defaultdict(list)
-    ress = defaultdict(list)
-    suffixes = []
+    streams = OrderedDict() # suffix to (reqs, ress), in order of appearance
     for req, res in messages:
       host = req[':host']
-      suffix = self.psl.get_public_suffix(host.split(":", 1)[0])
-      if suffix not in suffixes:
-        suffixes.append(suffix)
-      reqs[suffix].append((req, host))
-      ress[suffix].append((res, host))
-
-    streams = []
-    for suffix in suffixes:
-      streams.append(Stream(suffix, reqs[suffix], 'req', self.procs))
-      streams.append(Stream(suffix, ress[suffix], 'res', self.procs))
-    return streams
\ No newline at end of file
+      suffix = self.get_suffix(host)
+      try:
+        reqs, ress = streams[suffix]
+      except KeyError:
+        reqs, ress = streams[suffix] = ([], [])
+      reqs.append((req, host))
+      ress.append((res, host))
+
+    streams_list = []
+    for suffix, (reqs, ress) in streams.items():
+      streams_list.append(Stream(suffix, reqs, 'req', self.procs))
+      streams_list.append(Stream(suffix, ress, 'res', self.procs))
+    return streams_list
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+Parameter sweeps.
+
+A sweep spec names a codec and ranges of values for its parameters, e.g.
+'http2:buffer_size=1024..65536*2', and expands to one configuration for
+each combination of values. Each configuration, and the baseline (once),
+is run over the same corpus of sessions, in a pool of worker processes
+that share it, and the total size, time and context memory of each are
+reported.
+"""
+
+# pylint: disable=W0311
+
+from copy import copy
+import csv
+from itertools import product
+import multiprocessing
+import re
+import sys
+
+from lib.processors import Processors
+from lib.stream import Stream, TotalStream
+
+NUMBER = r"[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?"
+RANGE = re.compile(r"^(?P<start>%s)\.\.(?P<stop>%s)"
+                   r"(?:(?P<op>[*+])(?P<step>%s))?$" % (NUMBER, NUMBER, NUMBER))
+
+
+def expand_sweep(spec):
+  """
+  Return the list of codec names (as given to -c) that spec expands to.
+
+  spec is 'codec:param=values,...', where values is a single value, a
+  list of values separated by '|', 'start..stop' (counting up by one),
+  'start..stop+step' or 'start..stop*factor'. Raises ValueError if spec
+  is malformed.
+  """
+  if ":" not in spec:
+    raise ValueError("%s has no ':' after the codec name" % spec)
+  codec, param_str = spec.split(":", 1)
+  grid = []
+  for param in param_str.split(","):
+    param = param.strip()
+    if "=" not in param:
+      grid.append([param])
+      continue
+    name, values = param.split("=", 1)
+    grid.append(["%s=%s" % (name, value) for value in expand_values(values)])
+  return ["%s=%s" % (codec, ",".join(params)) for params in product(*grid)]
+
+
+def expand_values(values):
+  """
+  Return the list of values described by a sweep parameter's values. If
+  the bounds and step of a range are all whole numbers (e.g., '1e3'), so
+  are its values.
+  """
+  if ".." not in values:
+    return values.split("|")
+  match = RANGE.match(values)
+  if not match:
+    raise ValueError("%s isn't a range of numbers (start..stop, "
+                     "start..stop+step or start..stop*factor)" % values)
+  op = match.group('op') or '+'
+  numbers = [float(match.group('start')), float(match.group('stop')),
+             float(match.group('step') or 1)]
+  if all([number == int(number) for number in numbers]):
+    numbers = [int(number) for number in numbers]
+  start, stop, step = numbers
+  if start > stop:
+    raise ValueError("%s counts down" % values)
+  if (op == '+' and step <= 0) or (op == '*' and (step <= 1 or start <= 0)):
+    raise ValueError("%s never reaches its end" % values)
+  # each value is worked out afresh, and a float range's end is allowed
+  # for rounding, so that e.g. 0.1..0.3+0.1 ends with 0.3
+  slack = 0 if isinstance(stop, int) else abs(stop) * 1e-9
+  expanded = []
+  idx = 0
+  while True:
+    if op == '+':
+      value = start + idx * step
+    else:
+      value = start * step ** idx
+    if value > stop + slack:
+      return expanded
+    expanded.append(str(value))
+    idx += 1
+
+
+class Sweep(object):
+  """
+  Runs each of a list of codec configurations over a list of sessions.
+  """
+  columns = ['codec', 'msg_type', 'messages', 'size', 'ratio',
+             'compress_cpu_ms', 'context_max', 'context_mean']
+
+  def __init__(self, options, msg_types, sessions, output):
+    self.options = options
+    self.msg_types = msg_types
+    self.sessions = sessions
+    self.output = output
+
+  def run(self, configs, jobs):
+    """
+    Run each of configs (codec names), and return a list of rows of
+    results; see columns. The baseline is run once, by itself, for their
+    ratios. With jobs > 1, configurations are run by that many worker
+    processes, which get the sessions when they start.
+    """
+    configs = [self.options.baseline] + configs
+    if jobs <= 1:
+      results = [run_config(self.options, self.msg_types, self.sessions,
+                            config) for config in configs]
+    else:
+      pool = multiprocessing.Pool(jobs, _init_worker,
+                                  (self.options, self.msg_types,
+                                   self.sessions))
+      try:
+        results = pool.map(_run_config, configs, chunksize=1)
+        pool.close()
+      except:
+        pool.terminate()
+        raise
+      finally:
+        pool.join()
+    rows = []
+    for result, exit_code in results:
+      if result is None:
+        sys.exit(exit_code)
+      rows.extend(result)
+    baseline_rows = rows[:len(self.msg_types)]
+    rows = rows[len(self.msg_types):]
+    baseline_sizes = dict([(row[1], row[3]) for row in baseline_rows])
+    for row in rows:
+      row[4] = 1.0 * row[3] / max(baseline_sizes[row[1]], 1)
+    return rows
+
+  def print_results(self, rows):
+    "Print the rows returned by run() as a table."
+    lname = max([len(row[0]) for row in rows])
+    self.output("* SWEEP: %i configurations\n" %
+                len(set([row[0] for row in rows])))
+    self.output('  %%-%ds type      size  ratio   cpu ms   ctx max  ctx mean\n'
+                % lname % '')
+    fmt = '  %%-%ds %%-4s %%9d %%6.3f %%8.2f %%9s %%9s\n' % lname
+    for row in rows:
+      codec, msg_type, _, size, ratio, cpu_ms, ctx_max, ctx_mean = row
+      self.output(fmt % (codec, msg_type, size, ratio, cpu_ms,
+                         format_value(ctx_max), format_value(ctx_mean)))
+    self.output("\n")
+
+  def write_csv(self, rows, filename):
+    "Write the rows returned by run() to filename as CSV."
+    fhandle = open(filename, 'wb')
+    try:
+      writer = csv.writer(fhandle)
+      writer.writerow(self.columns)
+      writer.writerows([['' if value is None else value for value in row]
+                        for row in rows])
+    finally:
+      fhandle.close()
+
+
+def format_value(value):
+  "Format value as a whole number, or '-' if it is None."
+  if value is None:
+    return '-'
+  return '%d' % value
+
+
+def run_config(options, msg_types, sessions, config):
+  """
+  Run the codec config over copies of sessions, and return (rows, None),
+  or (None, exit code) if it exited. The rows' ratios are left for run()
+  to fill in.
+  """
+  options = copy(options)
+  options.processor_names = [config]
+  try:
+    processors = Processors(options, msg_types, sys.stdout.write)
+    procs = [p.name for p in processors.processors[msg_types[0]]]
+    # results are keyed by processor name, e.g. 'http2 (buffer_size=1024)'
+    # for 'http2=buffer_size=1024'. (Not the actual baseline; see run().)
+    options.baseline = procs[0]
+    totals = dict([(msg_type, TotalStream("TOTAL", msg_type, procs))
+                   for msg_type in msg_types])
+    for idx, session in enumerate(sessions):
+      # a copy, so that the session is left as it was for other configs
+      stream = Stream(session.name, session.messages, session.msg_type,
+                      procs)
+      processors.process_session(stream, idx)
+      totals[stream.msg_type] += stream
+      stream.release_results()
+    processors.done()
+  except SystemExit as why:
+    sys.stdout.flush()
+    return None, why.code
+  sys.stdout.flush()
+  rows = []
+  name = procs[0]
+  for msg_type in msg_types:
+    total = totals[msg_type]
+    size = total.total_size(name)
+    ctx_bytes = total.context_bytes[name]
+    rows.append([name, msg_type, total.num_messages, size, None,
+                 total.cpu_total('compress', name) / 1e6,
+                 ctx_bytes.max if ctx_bytes.count else None,
+                 ctx_bytes.mean if ctx_bytes.count else None])
+  return rows, None
+
+
+_worker_args = None
+
+def _init_worker(options, msg_types, sessions):
+  "Set up a sweep pool worker."
+  global _worker_args
+  _worker_args = (options, msg_types, sessions)
+
+def _run_config(config):
+  "Run one configuration in a pool worker."
+  options, msg_types, sessions = _worker_args
+  return run_config(options, msg_types, sessions, config)
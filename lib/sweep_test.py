@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+Tests for the expansion of --sweep specs in sweep.py, and for running a
+sweep over a small HAR file.
+"""
+
+# pylint: disable=W0311
+
+import json
+import optparse
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.harfile_test import make_entry
+from lib.ingest import iter_parsed_files
+from lib.streamifiers.host import Streamifier
+from lib.sweep import Sweep, expand_sweep, expand_values
+
+MSG_TYPES = ['req', 'res']
+
+
+class TestExpandValues(unittest.TestCase):
+
+  def test_lists(self):
+    self.assertEqual(expand_values("7"), ["7"])
+    self.assertEqual(expand_values("a|b|1.5"), ["a", "b", "1.5"])
+
+  def test_int_ranges(self):
+    self.assertEqual(expand_values("1..4"), ["1", "2", "3", "4"])
+    self.assertEqual(expand_values("-2..3+2"), ["-2", "0", "2"])
+    self.assertEqual(expand_values("1024..5000*2"),
+                     ["1024", "2048", "4096"])
+    # whole numbers stay whole, however they're written
+    self.assertEqual(expand_values("1e3..4e3*2"), ["1000", "2000", "4000"])
+    self.assertEqual(expand_values("2.0..4"), ["2", "3", "4"])
+
+  def test_float_ranges(self):
+    self.assertEqual(expand_values("0.5..2*2"), ["0.5", "1.0", "2.0"])
+    self.assertEqual(expand_values(".25..1+.25"),
+                     ["0.25", "0.5", "0.75", "1.0"])
+    # the end isn't lost to rounding
+    self.assertEqual(expand_values("0.1..0.3+0.1"), ["0.1", "0.2", "0.3"])
+    self.assertEqual(expand_values("1..3*1.5"), ["1.0", "1.5", "2.25"])
+
+  def test_malformed(self):
+    for values in ["a..b", "1..", "..2", "1..2*", "1..2-1", "1..2*x",
+                   "0.5.5..2", "1..2|3", "5..1", "1..5+0", "1..5*1",
+                   "0..4*2"]:
+      self.assertRaises(ValueError, expand_values, values)
+
+
+class TestExpandSweep(unittest.TestCase):
+
+  def test_grid(self):
+    self.assertEqual(expand_sweep("delta2:max_entries=64..128*2,hg_adjust,"
+                                  "max_byte_size=1024|4096"),
+                     ["delta2=max_entries=64,hg_adjust,max_byte_size=1024",
+                      "delta2=max_entries=64,hg_adjust,max_byte_size=4096",
+                      "delta2=max_entries=128,hg_adjust,max_byte_size=1024",
+                      "delta2=max_entries=128,hg_adjust,max_byte_size=4096"])
+
+  def test_malformed(self):
+    self.assertRaises(ValueError, expand_sweep, "http2")
+    self.assertRaises(ValueError, expand_sweep, "http2:buffer_size=1...")
+
+
+class TestSweep(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    entries = [make_entry("http://%s/%d?q=%d" % (host, idx, idx * 7),
+                          [("Host", host), ("Accept", "*/*"),
+                           ("Cookie", "a=%d; b=xyz" % idx)])
+               for idx in range(20)
+               for host in ["www.example.com", "img.example.com"]]
+    filename = os.path.join(self.dir, "test.har")
+    with open(filename, 'w') as fhandle:
+      json.dump({"log": {"version": "1.2", "entries": entries}}, fhandle)
+    self.options = optparse.Values({
+      'baseline': 'http1', 'processor_names': ['http1'], 'verbose': 0,
+      'debug': True, 'verify': 'all', 'profile': None, 'cache_dir': None,
+    })
+    messages = list(iter_parsed_files([filename]))[0][1]
+    self.sessions = Streamifier(['http1']).streamify(messages)
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_run(self):
+    configs = expand_sweep("http2:buffer_size=1024..4096*2") + \
+      expand_sweep("delta2:max_entries=64|128")
+    for jobs in [1, 2]:
+      sweep = Sweep(self.options, MSG_TYPES, self.sessions, None)
+      rows = sweep.run(configs, jobs)
+      self.assertEqual([(row[0], row[1]) for row in rows],
+                       [(name, msg_type)
+                        for name in ["http2 (buffer_size=1024)",
+                                     "http2 (buffer_size=2048)",
+                                     "http2 (buffer_size=4096)",
+                                     "delta2 (max_entries=64)",
+                                     "delta2 (max_entries=128)"]
+                        for msg_type in MSG_TYPES])
+      for row in rows:
+        self.assertEqual(row[2], 40)
+        self.assertTrue(0 < row[4] < 1, row)
+    # the sessions are left as they were, for each configuration
+    self.assertEqual(sum([s.num_messages for s in self.sessions]), 80)
+
+
+if __name__ == "__main__":
+  unittest.main()
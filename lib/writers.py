@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+"""
+Incremental output of per-message results.
+"""
+
+# pylint: disable=W0311
+
+import gzip
+
+from .stream import Stream
+
+
+class ResultWriter(object):
+  """
+  Writes the per-message results of each session to a file as soon as the
+  session has been processed, and flushes them, so that they don't have to
+  be kept until the end of the run and aren't lost if it doesn't finish.
+
+  fmt is 'tsv' or 'ndjson'; if compress is true, the file is gzipped (and
+  flushed so that what has been written so far can be decompressed).
+  """
+  formats = {
+    'tsv': (Stream.print_tsv_header, Stream.print_tsv),
+    'ndjson': (None, Stream.print_ndjson),
+  }
+
+  def __init__(self, filename, fmt, compress, msg_type, procs):
+    if compress:
+      self.fhandle = gzip.open(filename + ".gz", 'wb')
+    else:
+      self.fhandle = open(filename, 'w')
+    print_header, self.print_rows = self.formats[fmt]
+    self.count = 0
+    if print_header:
+      print_header(Stream('', [], msg_type, procs), self.fhandle.write)
+
+  def write(self, session):
+    "Write the results of session."
+    self.count = self.print_rows(session, self.fhandle.write, self.count)
+    self.fhandle.flush()
+
+  def close(self):
+    self.fhandle.close()
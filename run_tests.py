@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""
+run_tests.py
+
+Runs the tests (the *_test.py files in lib and compressor), or the given
+ones, each in its own process. They're run as modules from the top of the
+tree (e.g., 'python -m compressor.delta2.bit_bucket_test'), so that they
+import the code they test as part of its package.
+"""
+
+# pylint: disable=W0311
+
+import optparse
+import os
+import subprocess
+import sys
+
+TOP = os.path.dirname(os.path.abspath(__file__))
+
+
+def find_tests():
+  "Return the module names of all of the tests, in order."
+  tests = []
+  for top in ['lib', 'compressor']:
+    for dirpath, dirnames, filenames in os.walk(os.path.join(TOP, top)):
+      dirnames.sort()
+      for filename in sorted(filenames):
+        if filename.endswith('_test.py'):
+          path = os.path.relpath(os.path.join(dirpath, filename[:-3]), TOP)
+          tests.append(path.replace(os.sep, '.'))
+  return tests
+
+
+def module_name(test):
+  "Return the module name of test, given as a module name or a path."
+  if test.endswith('.py'):
+    test = os.path.relpath(os.path.abspath(test), TOP)[:-3]
+  return test.replace(os.sep, '.')
+
+
+def main():
+  parser = optparse.OptionParser(usage="%prog [options] [test ...]")
+  parser.add_option("-v", "--verbose", action="store_true", default=False,
+                    help="Show the output of the tests that pass, too.")
+  options, args = parser.parse_args()
+  tests = [module_name(test) for test in args] or find_tests()
+  failed = []
+  for test in tests:
+    proc = subprocess.Popen([sys.executable, '-m', test], cwd=TOP,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = proc.communicate()[0]
+    if proc.returncode:
+      failed.append(test)
+      print "FAIL %s" % test
+    else:
+      print "ok   %s" % test
+    if proc.returncode or options.verbose:
+      sys.stdout.write(output)
+  print "%d of %d tests failed" % (len(failed), len(tests))
+  sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+  main()
@@ -1,8 +1,12 @@
 #!/usr/bin/env python
 
+import struct
 import sys
 import os
 
+# see main_batch()
+FRAME = struct.Struct(">cI")
+
 def main():
   while True:
     headers = []
@@ -13,6 +17,8 @@ def main():
       name = "%d" % os.getpid()
     while True:
       line = sys.stdin.readline()
+      if not line: # EOF; we're done.
+        return
       if line.strip() == "":
         break
       headers.append(line)
@@ -24,4 +30,47 @@ def main():
     except IOError: # done
       break
 
-main()
+def main_batch():
+  """
+  The framed protocol, used when the fork codec has the 'batch' parameter.
+
+  Every frame is a one-byte type and a four-byte big-endian length,
+  followed by that many bytes of payload. We're sent:
+    'R' - reset; forget the compression context, for a new session
+    'H' - a message to compress, as HTTP/1 headers
+    'F' - flush; the end of a batch
+  and reply to each 'H' frame, in order, with:
+    'C' - the compressed message
+    'D' - the message decompressed again, as HTTP/1 headers; or empty, if
+          we can't decompress
+  Replies can be buffered until the next 'F' frame.
+  """
+  stdin = getattr(sys.stdin, 'buffer', sys.stdin) # binary, on Python 3 too
+  stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+  while True:
+    header = stdin.read(FRAME.size)
+    if len(header) < FRAME.size: # EOF; we're done.
+      return
+    kind, length = FRAME.unpack(header)
+    payload = stdin.read(length)
+    if kind == b'H':
+      compressed = payload # a real codec would compress here...
+      decompressed = compressed # ...and decompress its output here.
+      write_frame(stdout, b'C', compressed)
+      write_frame(stdout, b'D', decompressed)
+    elif kind == b'R':
+      pass # we don't keep any context.
+    elif kind == b'F':
+      try:
+        stdout.flush()
+      except IOError: # done
+        return
+
+def write_frame(stdout, kind, payload):
+  stdout.write(FRAME.pack(kind, len(payload)))
+  stdout.write(payload)
+
+if "--batch" in sys.argv[1:]:
+  main_batch()
+else:
+  main()